@@ -1,66 +1,174 @@
 """
 Case 0: Population Analysis - Blind Study (Approach Two)
-Loads anonymized data and computes descriptive statistics for each column.
+Loads anonymized data and computes descriptive statistics for each column,
+in one fused pass over all of them (see descriptive_stats), from the raw
+records or from their count cube (see count_cube), or with
+--memory-limit from a chunked scan of the records in bounded memory (see
+chunked_scan), which gives the same results.
 Outputs results to output/case_0_results.json.
 """
 
+import argparse
 import json
 import os
-import pandas as pd
 import numpy as np
 
+from chunked_scan import block_rows_for, parse_memory_limit, scan_records
+from count_cube import median as counted_median
+from data_store import load_record_columns, load_records
+from descriptive_stats import describe
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_0_results.json')
 
 
 def load_data(path=DATA_PATH):
-    return pd.read_csv(path)
+    return load_records(path)
+
+
+def compute_column_stats(df, columns):
+    """Descriptive statistics of each of columns, all from one fused pass over
+    their stacked values (see descriptive_stats)."""
+    stats = describe(df, columns)
+    return [{
+        "column_name": col,
+        "total_count": stats[col]['count'],
+        "min": stats[col]['min'],
+        "max": stats[col]['max'],
+        "mean": round(stats[col]['mean'], 4),
+        "median": stats[col]['median'],
+        "std_dev": round(stats[col]['std'], 4),
+        "missing_count": stats[col]['missing']
+    } for col in columns]
 
 
-def compute_column_stats(df, col):
+def counted_column_stats(col, values, counts):
+    """compute_column_stats entry of a column given as sorted distinct values and their counts."""
+    counts = np.asarray(counts)
+    values = np.asarray(values, dtype=float)[counts > 0]
+    counts = counts[counts > 0]
+    n = int(counts.sum())
+    mean = float(np.sum(values * counts) / n)
     return {
         "column_name": col,
-        "total_count": int(df[col].count()),
-        "min": float(df[col].min()),
-        "max": float(df[col].max()),
-        "mean": round(float(df[col].mean()), 4),
-        "median": float(df[col].median()),
-        "std_dev": round(float(df[col].std()), 4),
-        "missing_count": int(df[col].isna().sum())
+        "total_count": n,
+        "min": float(values[0]),
+        "max": float(values[-1]),
+        "mean": round(mean, 4),
+        "median": counted_median(values, counts),
+        "std_dev": round(float(np.sqrt(np.sum(counts * (values - mean) ** 2) / (n - 1))), 4),
+        "missing_count": 0
     }
 
 
-def main():
-    df = load_data()
-    columns = ['a_val', 'v_val', 'x_val', 'y_val', 'z_val']
+def cube_column_stats(cube, col):
+    """compute_column_stats entry from a CountCube: a_val and v_val from their code
+    counts, the binned variables from the cube's moments, extrema and median."""
+    if col == 'a_val':
+        return counted_column_stats(col, cube.a_values, cube.a_counts())
+    if col == 'v_val':
+        return counted_column_stats(col, cube.v_values, cube.v_counts())
+    n, mean, m2 = cube.moments(col)
+    min_val, max_val = cube.extrema(col)
+    return {
+        "column_name": col,
+        "total_count": n,
+        "min": float(min_val),
+        "max": float(max_val),
+        "mean": round(mean, 4),
+        "median": cube.median(col),
+        "std_dev": round(float(np.sqrt(m2 / (n - 1))), 4),
+        "missing_count": 0
+    }
+
+
+def scan_column_stats(scan, col):
+    """compute_column_stats entry from a RecordScan (see chunked_scan): the same values."""
+    min_val, max_val = scan.extrema(col)
+    return {
+        "column_name": col,
+        "total_count": scan.count(col),
+        "min": min_val,
+        "max": max_val,
+        "mean": round(float(scan.mean(col)), 4),
+        "median": scan.median(col),
+        "std_dev": round(float(scan.std(col)), 4),
+        "missing_count": scan.missing(col)
+    }
+
 
-    column_stats = [compute_column_stats(df, col) for col in columns]
+def run(df=None, cube=None, memory_limit=None):
+    """Compute the Case 0 population description and return the results dict.
+    With a CountCube the records themselves are never read. With memory_limit
+    (bytes) they are scanned block by block within it (df's columns, or the
+    memory-mapped columnar cache)."""
+    columns = ['a_val', 'v_val', 'x_val', 'y_val', 'z_val']
+    if memory_limit is not None and cube is None:
+        record_columns = load_record_columns(DATA_PATH) if df is None else {col: df[col].values for col in columns}
+        scan = scan_records(record_columns, block_rows_for(memory_limit), bin_columns=(), medians=True,
+                            value_counts=('a_val',))
+        column_stats = [scan_column_stats(scan, col) for col in columns]
+        a_values, a_counts = scan.value_counts('a_val')
+        unique_a_vals = a_values.tolist()
+        a_val_counts = {str(a): int(c) for a, c in zip(a_values.tolist(), a_counts)}
+        total_records = scan.n_records
+    elif cube is not None:
+        column_stats = [cube_column_stats(cube, col) for col in columns]
+        a_counts = cube.a_counts()
+        unique_a_vals = [int(a) for a, c in zip(cube.a_values, a_counts) if c > 0]
+        a_val_counts = {str(int(a)): int(c) for a, c in zip(cube.a_values, a_counts) if c > 0}
+        total_records = cube.n_records
+    else:
+        if df is None:
+            df = load_data()
+        column_stats = compute_column_stats(df, columns)
 
-    unique_a_vals = sorted(df['a_val'].dropna().unique().tolist())
-    a_val_counts = df['a_val'].value_counts().sort_index().to_dict()
-    a_val_counts = {str(k): int(v) for k, v in a_val_counts.items()}
+        unique_a_vals = sorted(df['a_val'].dropna().unique().tolist())
+        a_val_counts = df['a_val'].value_counts().sort_index().to_dict()
+        a_val_counts = {str(k): int(v) for k, v in a_val_counts.items()}
+        total_records = len(df)
 
-    results = {
+    return {
         "case": "Case 0: Population Description",
         "approach": "Blind Study (Approach Two)",
-        "total_records": len(df),
+        "total_records": total_records,
         "column_statistics": column_stats,
         "unique_a_values": unique_a_vals,
         "a_val_group_counts": a_val_counts
     }
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, 'w') as f:
+
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
         json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
 
-    print(f"Results written to {OUTPUT_PATH}")
-    print(f"Total records: {len(df)}")
-    for stat in column_stats:
+
+def print_summary(results):
+    print(f"Total records: {results['total_records']}")
+    for stat in results['column_statistics']:
         print(f"  {stat['column_name']}: min={stat['min']}, max={stat['max']}, "
               f"mean={stat['mean']}, median={stat['median']}, std={stat['std_dev']}, "
               f"missing={stat['missing_count']}")
+    unique_a_vals = results['unique_a_values']
     print(f"Unique a_val values ({len(unique_a_vals)}): {unique_a_vals}")
-    print(f"a_val group counts: {a_val_counts}")
+    print(f"a_val group counts: {results['a_val_group_counts']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Case 0 population description (blind study)")
+    parser.add_argument('--memory-limit', type=parse_memory_limit, metavar='SIZE',
+                        help="scan the records in blocks sized to stay within SIZE (e.g. 512M, 2G) "
+                             "instead of loading them whole; results are identical")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(memory_limit=args.memory_limit)
+    write_results(results)
+    print_summary(results)
 
 
 if __name__ == '__main__':
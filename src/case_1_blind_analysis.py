@@ -2,16 +2,22 @@
 Case 1: Distribution Uniformity Testing - Blind Study (Approach Two)
 Tests whether x_val, y_val, z_val show uniform or non-uniform distributions
 across 16 equal-width bins using chi-square goodness-of-fit, Rayleigh test,
-and Cramer's V effect size.
+and Cramer's V effect size. Runs on the raw records or on their count cube
+(see count_cube), which holds the bin counts and Rayleigh sums directly, or
+with --memory-limit on a chunked scan of the records in bounded memory (see
+chunked_scan), which answers the same queries with the in-memory results.
 Outputs results to output/case_1_results_blind.json.
 """
 
+import argparse
 import json
 import os
 import numpy as np
-import pandas as pd
 from scipy import stats
 
+from chunked_scan import BIN_VARIABLES, block_rows_for, parse_memory_limit, scan_records
+from data_store import load_record_columns, load_records
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_1_results_blind.json')
 
@@ -19,7 +25,7 @@ N_BINS = 16
 
 
 def load_data(path=DATA_PATH):
-    return pd.read_csv(path)
+    return load_records(path)
 
 
 def bin_observations(series, n_bins=N_BINS):
@@ -53,9 +59,11 @@ def rayleigh_test(series):
     if max_val == min_val:
         return 0.0, 1.0
     theta = 2 * np.pi * (series.values - min_val) / (max_val - min_val)
-    n = len(theta)
-    C = np.sum(np.cos(theta))
-    S = np.sum(np.sin(theta))
+    return rayleigh_statistic(np.sum(np.cos(theta)), np.sum(np.sin(theta)), len(theta))
+
+
+def rayleigh_statistic(C, S, n):
+    """Rayleigh Z and p-value from the sums of cos(theta) and sin(theta) over n angles."""
     R_bar = np.sqrt(C**2 + S**2) / n
     Z = n * R_bar**2
     # Approximation valid for large n
@@ -74,11 +82,28 @@ def cramers_v(chi2_stat, n, k):
 def analyze_variable(series):
     """Run full uniformity analysis on a single variable."""
     counts, bin_edges = bin_observations(series)
-    n = int(series.count())
+    return analyze_counts(counts, bin_edges, int(series.count()), rayleigh_test(series))
+
+
+def analyze_cube_variable(cube, var):
+    """analyze_variable from a CountCube's (or a RecordScan's) [min, max] bin
+    counts and Rayleigh sums."""
+    min_val, max_val = cube.extrema(var)
+    counts = cube.bin_counts(var, binning='range')
+    if max_val == min_val:
+        rayleigh = (0.0, 1.0)
+    else:
+        C, S, n = cube.rayleigh_sums(var)
+        rayleigh = rayleigh_statistic(C, S, int(n))
+    return analyze_counts(counts, np.linspace(min_val, max_val, N_BINS + 1), int(counts.sum()), rayleigh)
+
+
+def analyze_counts(counts, bin_edges, n, rayleigh):
+    """Uniformity analysis of one variable from its bin counts and (Z, p) Rayleigh result."""
     k = N_BINS
 
     chi2_stat, chi2_p, dof = chi_square_uniformity(counts)
-    rayleigh_z, rayleigh_p = rayleigh_test(series)
+    rayleigh_z, rayleigh_p = rayleigh
     v = cramers_v(chi2_stat, n, k)
 
     return {
@@ -100,20 +125,34 @@ def analyze_variable(series):
     }
 
 
-def main():
-    df = load_data()
+def run(df=None, cube=None, memory_limit=None):
+    """Run the Case 1 uniformity tests and return the results dict.
+    With a CountCube the records themselves are never read. With memory_limit
+    (bytes) they are scanned block by block within it (df's columns, or the
+    memory-mapped columnar cache), and the scan stands in for the cube."""
+    if memory_limit is not None and cube is None:
+        columns = load_record_columns(DATA_PATH, BIN_VARIABLES) if df is None else \
+            {var: df[var].values for var in BIN_VARIABLES}
+        cube = scan_records(columns, block_rows_for(memory_limit))
+    if df is None and cube is None:
+        df = load_data()
     variables = ['x_val', 'y_val', 'z_val']
 
     results = {}
     for var in variables:
-        results[var] = analyze_variable(df[var])
+        results[var] = analyze_cube_variable(cube, var) if cube is not None else analyze_variable(df[var])
+    return results
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, 'w') as f:
+
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
         json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
 
-    print(f"Results written to {OUTPUT_PATH}")
-    for var in variables:
+
+def print_summary(results):
+    for var in ['x_val', 'y_val', 'z_val']:
         r = results[var]
         chi = r['chi_square']
         ray = r['rayleigh']
@@ -125,5 +164,20 @@ def main():
         print(f"    Bin counts: {r['bin_counts']}")
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Case 1 uniformity tests (blind study)")
+    parser.add_argument('--memory-limit', type=parse_memory_limit, metavar='SIZE',
+                        help="scan the records in blocks sized to stay within SIZE (e.g. 512M, 2G) "
+                             "instead of loading them whole; results are identical")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(memory_limit=args.memory_limit)
+    write_results(results)
+    print_summary(results)
+
+
 if __name__ == '__main__':
     main()
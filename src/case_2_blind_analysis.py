@@ -9,19 +9,20 @@ Outputs results to output/case_2_results_blind.json.
 import json
 import os
 import numpy as np
-import pandas as pd
 from scipy import stats
 
+from data_store import load_timestamps
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'timestamp_vals.csv')
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_2_results_blind.json')
 
 N_BINS = 16
 
 
-def load_and_preprocess(path=DATA_PATH):
+def load_and_preprocess(path=DATA_PATH, df=None):
     """Load timestamp data, sort chronologically, calculate inter-event intervals in days."""
-    df = pd.read_csv(path)
-    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    if df is None:
+        df = load_timestamps(path)
     df = df.sort_values('timestamp').reset_index(drop=True)
 
     # Calculate inter-event intervals
@@ -129,11 +130,13 @@ def clustering_analysis(intervals):
     }
 
 
-def main():
+def run(df=None):
+    """Run the interval analysis and return the results dict.
+    df is the raw timestamp table; it is loaded from the data store if omitted."""
     print("Case 2: Inter-Event Interval Analysis (Blind Study)")
     print("=" * 55)
 
-    intervals, total_records, date_start, date_end = load_and_preprocess()
+    intervals, total_records, date_start, date_end = load_and_preprocess(df=df)
 
     ist = interval_statistics(intervals)
     print(f"\n  Interval stats: mean={ist['mean_days']:.4f} days, "
@@ -164,12 +167,18 @@ def main():
         "exponential_baseline_test": exp_test,
         "clustering_analysis": clust
     }
+    return results
+
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, 'w') as f:
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
         json.dump(results, f, indent=2)
+    print(f"\nResults written to {path}")
 
-    print(f"\nResults written to {OUTPUT_PATH}")
+
+def main():
+    write_results(run())
 
 
 if __name__ == '__main__':
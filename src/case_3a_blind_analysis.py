@@ -3,25 +3,41 @@ Case 3A: Clustering Patterns - Full Population (Blind Study - Approach Two)
 Tests whether x_val, y_val, z_val show clustering patterns across 16 equal bins
 using chi-square goodness-of-fit, Rayleigh test, Cramér's V effect size,
 standardized residuals, and 1000 synthetic null hypothesis catalogs.
+Runs on the raw records or on their count cube (see count_cube): the bin
+counts, Rayleigh sums and the null's parameters (n, max) are all in the cube.
+The null depends on n only, so it can also be looked up in a persistent
+NullLibrary shared by the three variables and by later runs (see null_library).
+With --memory-limit the records are scanned block by block in bounded memory
+(see chunked_scan); the scan answers the cube's queries with the in-memory results.
 Outputs results to output/case_3a_results_blind.json.
 """
 
+import argparse
 import json
 import os
+from functools import partial
 import numpy as np
-import pandas as pd
 from scipy import stats
 
+from catalog_store import INLINE_SYNTHETIC_LIMIT, CatalogStore
+from chunked_scan import BIN_VARIABLES, block_rows_for, parse_memory_limit, scan_records
+from data_store import load_record_columns, load_records
+from null_library import LIBRARY_DIR, NullLibrary
+from rng_streams import CATALOG_CHUNK_SIZE, FULL_POPULATION, catalog_chunks, chunk_rng
+from sequential_mc import CONFIDENCE, STOPPING_RULES, rank_summary, sequential_rank
+from synthetic_ranks import exceedances, log10_p_value, p_values
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_3a_results_blind.json')
 
 N_BINS = 16
 N_SYNTHETIC = 1000
 ALPHA = 0.05
+CASE_KEY = 'case_3a'
 
 
 def load_data(path=DATA_PATH):
-    df = pd.read_csv(path)
+    df = load_records(path)
     print(f"  Loaded {len(df)} records from {path}")
     return df
 
@@ -56,9 +72,11 @@ def rayleigh_test(values):
     if max_val == min_val:
         return 0.0, 1.0
     theta = 2 * np.pi * (values - min_val) / (max_val - min_val)
-    n = len(theta)
-    C = np.sum(np.cos(theta))
-    S = np.sum(np.sin(theta))
+    return rayleigh_statistic(np.sum(np.cos(theta)), np.sum(np.sin(theta)), len(theta))
+
+
+def rayleigh_statistic(C, S, n):
+    """Rayleigh Z and p-value from the sums of cos(theta) and sin(theta) over n angles."""
     R_bar = np.sqrt(C**2 + S**2) / n
     Z = n * R_bar**2
     # Approximation with correction (Greenwood & Durand, 1955)
@@ -89,12 +107,31 @@ def identify_significant_bins(residuals, threshold=2.0):
 
 def analyze_variable(values):
     """Run full clustering analysis on a single variable."""
-    n = len(values)
     counts, bin_edges, bin_size = bin_observations(values)
+    return analyze_counts(counts, bin_edges, bin_size, rayleigh_test(values))
+
+
+def analyze_cube_variable(cube, var):
+    """analyze_variable from a CountCube's (or a RecordScan's) [0, max] bin
+    counts and Rayleigh sums."""
+    min_val, max_val = cube.extrema(var)
+    bin_size = max_val / N_BINS
+    bin_edges = np.array([i * bin_size for i in range(N_BINS + 1)])
+    if max_val == min_val:
+        rayleigh = (0.0, 1.0)
+    else:
+        C, S, n = cube.rayleigh_sums(var)
+        rayleigh = rayleigh_statistic(C, S, int(n))
+    return analyze_counts(cube.bin_counts(var), bin_edges, bin_size, rayleigh)
+
+
+def analyze_counts(counts, bin_edges, bin_size, rayleigh):
+    """Clustering analysis of one variable from its bin counts and (Z, p) Rayleigh result."""
+    n = int(counts.sum())
     expected = n / N_BINS
 
     chi2_stat, chi2_p, dof = chi_square_uniformity(counts)
-    rayleigh_z, rayleigh_p = rayleigh_test(values)
+    rayleigh_z, rayleigh_p = rayleigh
     v = cramers_v(chi2_stat, n, N_BINS)
 
     residuals = standardized_residuals(counts.astype(float), expected)
@@ -104,6 +141,7 @@ def analyze_variable(values):
         "chi_square": {
             "statistic": round(chi2_stat, 4),
             "p_value": chi2_p,
+            "log10_p_value": round(log10_p_value(chi2_stat, dof), 4),
             "degrees_of_freedom": dof,
             "interpretation": "significant" if chi2_p < ALPHA else "not significant"
         },
@@ -124,59 +162,211 @@ def analyze_variable(values):
     }
 
 
-def run_synthetic_catalogs(df, n_synthetic=N_SYNTHETIC):
+def bin_observations_batch(values, n_bins=N_BINS):
+    """Batched bin_observations for a (n_catalogs, n_records) block.
+    Each row is binned from 0 to its own max, exactly as bin_observations does,
+    using a single offset bincount. Returns (n_catalogs, n_bins) counts."""
+    n_catalogs = values.shape[0]
+    bin_size = np.max(values, axis=1) / n_bins
+    bin_indices = np.minimum(np.floor(values / bin_size[:, None]).astype(np.intp), n_bins - 1)
+    bin_indices += np.arange(n_catalogs, dtype=np.intp)[:, None] * n_bins
+    counts = np.bincount(bin_indices.ravel(), minlength=n_catalogs * n_bins)
+    return counts.reshape(n_catalogs, n_bins)
+
+
+def chi_square_uniformity_batch(counts):
+    """Row-wise chi-square statistic against the uniform distribution for a
+    (n_catalogs, n_bins) count array. No p-values: synthetic catalogs are
+    ranked on the statistic (see synthetic_ranks)."""
+    k = counts.shape[1]
+    expected = counts.sum(axis=1) / k
+    return np.sum((counts - expected[:, None]) ** 2 / expected[:, None], axis=1)
+
+
+def synthetic_chunk_statistics(max_val, n_records, n_catalogs, rng, engine='batch'):
+    """Chi-square statistics of n_catalogs uniform-null catalogs for one variable.
+
+    engine='batch' draws a (n_catalogs, n_records) block of uniforms and bins it
+    with one offset bincount; engine='loop' is the original one-catalog-at-a-time
+    implementation and consumes rng identically, so both give the same catalogs.
+
+    engine='multinomial' draws bin count vectors directly, O(n_bins) per catalog.
+    The uniform engines bin each catalog against its own maximum, so given that
+    maximum the other n_records - 1 values are uniform over the 16 equal bins
+    and the maximum itself always lands in the last bin. Counts are therefore
+    Multinomial(n_records - 1, 1/16) plus one in the last bin, which is exactly
+    the distribution produced by the batch and loop engines."""
+    if engine == 'loop':
+        chi2_stats = np.empty(n_catalogs)
+        for i in range(n_catalogs):
+            # Generate uniform random values in [0, max(variable)]
+            synthetic_values = rng.uniform(0, max_val, size=n_records)
+            counts, _, _ = bin_observations(synthetic_values)
+            chi2_stats[i], _, _ = chi_square_uniformity(counts)
+        return chi2_stats
+    if engine == 'batch':
+        counts = bin_observations_batch(max_val * rng.random((n_catalogs, n_records)))
+    elif engine == 'multinomial':
+        counts = rng.multinomial(n_records - 1, np.full(N_BINS, 1.0 / N_BINS), size=n_catalogs)
+        counts[:, -1] += 1
+    else:
+        raise ValueError(f"Unknown synthetic engine: {engine}")
+    chi2_stats = chi_square_uniformity_batch(counts)
+    return chi2_stats
+
+
+def null_parameters(df=None, cube=None):
+    """({variable: max}, number of records): all the uniform null depends on."""
+    variables = ['x_val', 'y_val', 'z_val']
+    if cube is not None:
+        return {var: cube.extrema(var)[1] for var in variables}, cube.n_records
+    return {var: np.max(df[var].values) for var in variables}, len(df)
+
+
+def run_synthetic_catalogs(max_vals, n_records, n_synthetic=N_SYNTHETIC, engine='batch', chunk_size=CATALOG_CHUNK_SIZE):
     """Generate n_synthetic null hypothesis catalogs.
     For each variable, generates N uniform random values in [0, max(variable)]
     and runs identical chi-square analysis. This tests whether the observed
     distribution differs from true uniformity (the null hypothesis).
     Note: Simple permutation of existing values preserves the marginal distribution
-    and would yield identical bin counts, so uniform random generation is used instead."""
+    and would yield identical bin counts, so uniform random generation is used instead.
+
+    Each chunk of chunk_size catalogs per variable draws from its own keyed
+    stream (see rng_streams), so chunks can be generated in any order.
+    See synthetic_chunk_statistics for the engines.
+    max_vals and n_records come from null_parameters.
+    Returns {variable: chi-square statistics}; p-values are derived only for reporting."""
     variables = ['x_val', 'y_val', 'z_val']
-    rng = np.random.default_rng(seed=42)
 
-    synthetic_p_values = {var: [] for var in variables}
-    synthetic_cramers_v = {var: [] for var in variables}
+    synthetic_stats = {}
+    for var in variables:
+        synthetic_stats[var] = np.concatenate([
+            synthetic_chunk_statistics(max_vals[var], n_records, stop - start,
+                                       chunk_rng(CASE_KEY, FULL_POPULATION, var, k), engine)
+            for k, start, stop in catalog_chunks(n_synthetic, chunk_size)
+        ])
+        print(f"    {var}: {n_synthetic} synthetic catalogs complete")
 
-    # Cache max values for each variable
-    max_vals = {var: np.max(df[var].values) for var in variables}
-    n_records = len(df)
+    return synthetic_stats
 
-    for i in range(n_synthetic):
-        for var in variables:
-            # Generate uniform random values in [0, max(variable)]
-            synthetic_values = rng.uniform(0, max_vals[var], size=n_records)
-            counts, _, _ = bin_observations(synthetic_values)
-            chi2_stat, chi2_p, _ = chi_square_uniformity(counts)
-            synthetic_p_values[var].append(chi2_p)
-            n = n_records
-            v = cramers_v(chi2_stat, n, N_BINS)
-            synthetic_cramers_v[var].append(v)
-
-        if (i + 1) % 200 == 0:
-            print(f"    Synthetic catalog {i + 1}/{n_synthetic} complete")
 
+def store_synthetic_catalogs(max_vals, n_records, n_synthetic, store, engine='batch',
+                             chunk_size=CATALOG_CHUNK_SIZE):
+    """Stream the synthetic catalogs of run_synthetic_catalogs to an on-disk
+    CatalogStore under store, one unit per variable, resuming any chunks
+    already there. Returns {variable: CatalogStore}."""
+    variables = ['x_val', 'y_val', 'z_val']
+    units = {}
+    for var in variables:
+        max_val = float(max_vals[var])
+        config = {"engine": engine, "n_records": n_records, "max_val": max_val}
+        units[var] = CatalogStore(store, CASE_KEY, FULL_POPULATION, var, config, chunk_size)
+        generated = units[var].fill(n_synthetic, partial(synthetic_chunk_statistics, max_val, n_records,
+                                                         engine=engine))
+        print(f"    {var}: {n_synthetic} synthetic catalogs in {units[var].path} "
+              f"({generated} chunks generated)")
+    return units
+
+
+def adaptive_synthetic_catalogs(max_vals, n_records, n_synthetic, real_stats, rule, engine='batch',
+                                store=None, chunk_size=CATALOG_CHUNK_SIZE):
+    """Sequential version of run_synthetic_catalogs: per variable, catalog chunks
+    are generated only until the stopping rule settles the percentile rank of
+    the real statistic real_stats[var], with n_synthetic as the cap (see sequential_mc).
+    With store set, chunks are read from or written to a CatalogStore.
+    Returns {variable: sequential_rank result}."""
+    variables = ['x_val', 'y_val', 'z_val']
+    ranks = {}
+    for var in variables:
+        max_val = float(max_vals[var])
+        chunk_statistics = partial(synthetic_chunk_statistics, max_val, n_records, engine=engine)
+        if store is None:
+            chunks = (chunk_statistics(stop - start, chunk_rng(CASE_KEY, FULL_POPULATION, var, k))
+                      for k, start, stop in catalog_chunks(n_synthetic, chunk_size))
+        else:
+            config = {"engine": engine, "n_records": n_records, "max_val": max_val}
+            unit = CatalogStore(store, CASE_KEY, FULL_POPULATION, var, config, chunk_size)
+            chunks = (unit.chunk(k, stop - start, chunk_statistics)
+                      for k, start, stop in catalog_chunks(n_synthetic, chunk_size))
+        ranks[var] = sequential_rank(chunks, real_stats[var], alpha=ALPHA, rule=rule)
+        print(f"    {var}: stopped after {ranks[var]['n_catalogs']} synthetic catalogs "
+              f"({'settled' if ranks[var]['settled'] else 'cap reached'})")
+    return ranks
+
+
+def synthetic_values(chi2_stats, n_records):
+    """Synthetic p-value and Cramér's V lists from {variable: chi-square statistics}."""
+    synthetic_p_values = {}
+    synthetic_cramers_v = {}
+    for var, var_stats in chi2_stats.items():
+        synthetic_p_values[var] = p_values(var_stats, N_BINS - 1).tolist()
+        synthetic_cramers_v[var] = np.sqrt(var_stats / (n_records * (N_BINS - 1))).tolist()
     return synthetic_p_values, synthetic_cramers_v
 
 
-def percentile_rank(real_value, synthetic_values):
-    """Calculate percentile rank of real_value in synthetic distribution."""
-    arr = np.array(synthetic_values)
-    return float(np.sum(arr <= real_value) / len(arr) * 100)
-
-
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Case 3A clustering analysis (blind study)")
+    parser.add_argument('--n-synthetic', type=int, default=N_SYNTHETIC,
+                        help=f"number of synthetic null catalogs per variable (default {N_SYNTHETIC})")
+    parser.add_argument('--engine', choices=['batch', 'multinomial', 'loop'], default='batch',
+                        help="synthetic catalog engine (default batch)")
+    parser.add_argument('--store', metavar='DIR',
+                        help="stream synthetic catalogs to a resumable on-disk store under DIR")
+    parser.add_argument('--adaptive', choices=STOPPING_RULES,
+                        help="stop generating catalogs per variable once the percentile is settled; "
+                             "--n-synthetic becomes the cap")
+    parser.add_argument('--library', metavar='DIR', nargs='?', const=LIBRARY_DIR,
+                        help="rank against the shared null distribution of a persistent null library "
+                             f"(default DIR {LIBRARY_DIR}) instead of per-variable catalogs")
+    parser.add_argument('--memory-limit', type=parse_memory_limit, metavar='SIZE',
+                        help="scan the records in blocks sized to stay within SIZE (e.g. 512M, 2G) "
+                             "instead of loading them whole; results are identical")
+    args = parser.parse_args(argv)
+    if args.library and (args.store or args.adaptive):
+        parser.error("--library replaces --store and --adaptive")
+    return args
+
+
+def run(df=None, n_synthetic=N_SYNTHETIC, engine='batch', store=None, adaptive=None, cube=None, library=None,
+        memory_limit=None):
+    """Run the Case 3A clustering analysis and return the results dict.
+    With a CountCube the records themselves are never read; the synthetic
+    catalogs depend only on (n, max) and are the same either way.
+    With store set, synthetic catalogs are streamed to (and resumed from) a
+    CatalogStore under that directory and percentiles are counted from it.
+    With adaptive set to a sequential_mc stopping rule, each variable draws
+    catalogs only until its percentile rank is settled, up to n_synthetic.
+    With library set to a null library directory, the three variables are
+    ranked against its one sorted null for n, generated there only if missing.
+    With memory_limit (bytes) the records are scanned block by block within it
+    (df's columns, or the memory-mapped columnar cache), and the scan stands in
+    for the cube."""
     print("Case 3A: Clustering Patterns - Full Population (Blind Study)")
     print("=" * 72)
 
-    df = load_data()
-    n = len(df)
+    if memory_limit is not None and cube is None:
+        columns = load_record_columns(DATA_PATH, BIN_VARIABLES) if df is None else \
+            {var: df[var].values for var in BIN_VARIABLES}
+        cube = scan_records(columns, block_rows_for(memory_limit))
+        print(f"  Scanned {cube.n_records} records in blocks of up to {block_rows_for(memory_limit)}")
+    if df is None and cube is None:
+        df = load_data()
+    max_vals, n = null_parameters(df, cube)
     variables = ['x_val', 'y_val', 'z_val']
 
     # Analyze each variable
     print("\n  Analyzing variables...")
     var_results = {}
+    real_stats = {}
     for var in variables:
-        var_results[var] = analyze_variable(df[var].values)
+        if cube is not None:
+            var_results[var] = analyze_cube_variable(cube, var)
+            counts = cube.bin_counts(var)
+        else:
+            var_results[var] = analyze_variable(df[var].values)
+            counts = bin_observations(df[var].values)[0]
+        # Unrounded statistic, for ranking against the synthetic catalogs
+        real_stats[var], _, _ = chi_square_uniformity(counts)
         chi = var_results[var]['chi_square']
         ray = var_results[var]['rayleigh']
         print(f"\n  {var}:")
@@ -187,43 +377,98 @@ def main():
               f"deficit: {var_results[var]['significant_bins']['deficit']}")
 
     # Generate synthetic null hypothesis catalogs
-    print(f"\n  Generating {N_SYNTHETIC} synthetic null hypothesis catalogs...")
-    synthetic_p_values, synthetic_cramers_v = run_synthetic_catalogs(df, N_SYNTHETIC)
-
-    # Percentile rank analysis
+    cap = f"up to {n_synthetic}, {adaptive} stopping" if adaptive else f"{n_synthetic}"
+    source = f"null library {library}" if library is not None else f"{engine} engine"
+    print(f"\n  Generating {cap} synthetic null hypothesis catalogs ({source})...")
+    units = None
+    ranks = None
+    synthetic_stats = None
+    library_null = None
+    if library is not None:
+        # One null for all three variables, read from the library when it is already there
+        library_null = NullLibrary(library).null(n, N_BINS, n_synthetic, 'own_max')
+        if n_synthetic <= INLINE_SYNTHETIC_LIMIT:
+            synthetic_stats = {var: library_null.statistics for var in variables}
+    elif adaptive is not None:
+        ranks = adaptive_synthetic_catalogs(max_vals, n, n_synthetic, real_stats, adaptive, engine=engine, store=store)
+        synthetic_stats = {var: ranks[var]['statistics'] for var in variables}
+    elif store is None:
+        synthetic_stats = run_synthetic_catalogs(max_vals, n, n_synthetic, engine=engine)
+    else:
+        units = store_synthetic_catalogs(max_vals, n, n_synthetic, store, engine=engine)
+        if n_synthetic <= INLINE_SYNTHETIC_LIMIT:
+            synthetic_stats = {var: units[var].statistics(n_synthetic) for var in variables}
+
+    # Percentile rank analysis on the chi-square statistics (see synthetic_ranks),
+    # with the Monte Carlo error of each percentile
     print("\n  Percentile rank analysis:")
     percentile_results = {}
     for var in variables:
-        real_p = var_results[var]['chi_square']['p_value']
-        pct = percentile_rank(real_p, synthetic_p_values[var])
+        if ranks is not None:
+            rank = ranks[var]
+        elif library_null is not None:
+            rank = rank_summary(library_null.exceedances(real_stats[var]), n_synthetic)
+        elif units is None:
+            rank = rank_summary(exceedances(synthetic_stats[var], real_stats[var]), n_synthetic)
+        else:
+            rank = rank_summary(units[var].exceedances(real_stats[var], n_synthetic), n_synthetic)
+        pct = rank['percentile']
         percentile_results[f"{var}_real_p_percentile"] = round(pct, 2)
-        print(f"    {var}: real p-value at {pct:.1f}th percentile of synthetic distribution")
+        percentile_results[f"{var}_real_p_percentile_mc_error"] = round(rank['mc_error'], 2)
+        percentile_results[f"{var}_real_p_percentile_ci"] = [round(c, 2) for c in rank['ci']]
+        if ranks is not None:
+            percentile_results[f"{var}_synthetic_catalogs_used"] = rank['n_catalogs']
+        print(f"    {var}: real p-value at {pct:.1f}th percentile of synthetic distribution "
+              f"(MC error {rank['mc_error']:.2f}, {CONFIDENCE:.0%} CI "
+              f"[{rank['ci'][0]:.2f}, {rank['ci'][1]:.2f}])")
 
     # Assemble results
+    synthetic = {
+        "synthetic_catalogs_generated": n_synthetic,
+        "shuffling_method": "Uniform random values in [0, max(variable)] for x_val, y_val, z_val; tests observed distribution against true uniform null",
+    }
+    # Unrounded statistics the percentiles are counted on
+    for var in variables:
+        synthetic[f"{var}_real_chi_square"] = float(real_stats[var])
+    if synthetic_stats is not None:
+        synthetic_p_values, synthetic_cramers_v = synthetic_values(synthetic_stats, n)
+        for var in variables:
+            synthetic[f"{var}_synthetic_chi_square"] = np.asarray(synthetic_stats[var], dtype=float).tolist()
+        for var in variables:
+            synthetic[f"{var}_synthetic_p_values"] = [round(p, 6) for p in synthetic_p_values[var]]
+        for var in variables:
+            synthetic[f"{var}_synthetic_cramers_v"] = [round(v, 6) for v in synthetic_cramers_v[var]]
+    elif library_null is None:
+        synthetic["synthetic_store"] = store
+    if library_null is not None:
+        synthetic["null_library"] = library_null.path
+    if ranks is not None:
+        synthetic["sequential_stopping"] = {"rule": adaptive, "max_catalogs": n_synthetic}
+    synthetic["percentile_rank_analysis"] = percentile_results
+
     results = {
         "sample_size": n,
         "binning_approach": "max(variable) / 16",
         "x_val": var_results['x_val'],
         "y_val": var_results['y_val'],
         "z_val": var_results['z_val'],
-        "synthetic_null_hypothesis": {
-            "synthetic_catalogs_generated": N_SYNTHETIC,
-            "shuffling_method": "Uniform random values in [0, max(variable)] for x_val, y_val, z_val; tests observed distribution against true uniform null",
-            "x_val_synthetic_p_values": [round(p, 6) for p in synthetic_p_values['x_val']],
-            "y_val_synthetic_p_values": [round(p, 6) for p in synthetic_p_values['y_val']],
-            "z_val_synthetic_p_values": [round(p, 6) for p in synthetic_p_values['z_val']],
-            "x_val_synthetic_cramers_v": [round(v, 6) for v in synthetic_cramers_v['x_val']],
-            "y_val_synthetic_cramers_v": [round(v, 6) for v in synthetic_cramers_v['y_val']],
-            "z_val_synthetic_cramers_v": [round(v, 6) for v in synthetic_cramers_v['z_val']],
-            "percentile_rank_analysis": percentile_results
-        }
+        "synthetic_null_hypothesis": synthetic
     }
+    return results
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, 'w') as f:
+
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
         json.dump(results, f, indent=2)
+    print(f"\nResults written to {path}")
+
 
-    print(f"\nResults written to {OUTPUT_PATH}")
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(n_synthetic=args.n_synthetic, engine=args.engine, store=args.store, adaptive=args.adaptive,
+                  library=args.library, memory_limit=args.memory_limit)
+    write_results(results)
 
 
 if __name__ == '__main__':
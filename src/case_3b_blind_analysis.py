@@ -1,45 +1,140 @@
 """
 Case 3B: Clustering Patterns - Stratified Population (Blind Study - Approach Two)
 Tests whether clustering patterns from Case 3A persist when data is stratified
-by v_val quartiles. Uses chi-square goodness-of-fit, Cramér's V effect size,
-and 100 synthetic null hypothesis catalogs per stratum.
+by v_val quartiles, or by any quantile, edge or composite stratification (see
+stratification). Uses chi-square goodness-of-fit, Cramér's V effect size,
+and 100 synthetic null hypothesis catalogs per stratum, or the exact
+multinomial null of the stratum size (see exact_null), or the synthetic null
+of the stratum size shared through a persistent NullLibrary (see
+null_library). Runs on the raw
+records or on their count cube (see count_cube), where a stratum is a slice of
+v_val codes. With --quantiles sketch the records are scanned block by block
+from the columnar cache and the quantile edges come from mergeable KLL
+sketches built in the scan (see quantile_sketch), with their rank error bound;
+exact quantiles remain the default.
 Outputs results to output/case_3b_results_blind.json.
 """
 
+import argparse
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
-import pandas as pd
 from scipy import stats
 
+from catalog_store import INLINE_SYNTHETIC_LIMIT, CatalogStore
+from data_store import load_record_columns, load_records
+from exact_null import NULL_MODES, exact_feasible, exact_null
+from histogram_kernels import bin_index_block, stratified_bincount
+from null_library import LIBRARY_DIR, NullLibrary
+from quantile_sketch import RANK_CONFIDENCE, SKETCH_BLOCK_ROWS, SKETCH_K, KLLSketch
+from rng_streams import CATALOG_CHUNK_SIZE, catalog_chunks, chunk_rng
+from sequential_mc import CONFIDENCE, STOPPING_RULES, rank_summary, sequential_rank
+from stratification import DEFAULT_SPEC, parse_spec, sketch_strata, stratify
+from synthetic_ranks import exceedances, log10_p_value, p_values
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_3b_results_blind.json')
 
 N_BINS = 16
 N_SYNTHETIC = 100
 ALPHA = 0.05
+CASE_KEY = 'case_3b'
+QUANTILE_MODES = ('exact', 'sketch')
 
 
 def load_data(path=DATA_PATH):
-    df = pd.read_csv(path)
+    df = load_records(path)
     print(f"  Loaded {len(df)} records from {path}")
     return df
 
 
-def create_strata(df):
-    """Stratify by v_val quartiles (4 groups)."""
-    quartiles = df['v_val'].quantile([0.25, 0.50, 0.75]).values
-    conditions = [
-        df['v_val'] <= quartiles[0],
-        (df['v_val'] > quartiles[0]) & (df['v_val'] <= quartiles[1]),
-        (df['v_val'] > quartiles[1]) & (df['v_val'] <= quartiles[2]),
-        df['v_val'] > quartiles[2],
-    ]
-    labels = ['group_1_0_25pct', 'group_2_25_50pct', 'group_3_50_75pct', 'group_4_75_100pct']
-    strata = {}
-    for label, cond in zip(labels, conditions):
-        strata[label] = df[cond].copy()
-    return strata, quartiles
+def create_strata(df, spec=DEFAULT_SPEC):
+    """Stratify the records by spec, v_val quartiles (4 groups) by default
+    (see stratification): the Strata holding each record's stratum index."""
+    return stratify(df, spec)
+
+
+def create_cube_strata(cube, spec=DEFAULT_SPEC):
+    """create_strata on a CountCube: quantiles from the v_val code counts, each
+    record being a v_val code. Cube strata select v_val codes, so only v_val keys apply."""
+    if any(column != 'v_val' for column, *_ in parse_spec(spec)):
+        raise ValueError(f"Strata of a count cube can only use v_val keys, not {spec!r}")
+    return stratify({'v_val': cube.v_values}, spec, counts=cube.v_counts())
+
+
+def stratum_summaries(df, strata, max_vals):
+    """Size, v_val range and [0, max] bin counts per variable of every stratum,
+    keyed by label. All counts come from one stratified_bincount over the
+    records; strata are index arrays into df, never copies of it."""
+    variables = list(max_vals)
+    bin_block = bin_index_block([df[var].values for var in variables], [max_vals[var] for var in variables], N_BINS)
+    counts, _ = stratified_bincount(strata.codes, bin_block, strata.n_strata, N_BINS)
+    v_vals = df['v_val'].values
+    summaries = {}
+    for s_idx, (label, members) in enumerate(zip(strata.labels, strata.members())):
+        stratum_v = v_vals[members]
+        summaries[label] = {
+            "n": len(members),
+            "v_range": (float(stratum_v.min()), float(stratum_v.max())) if len(members) else (np.nan, np.nan),
+            "counts": {var: counts[s_idx, j] for j, var in enumerate(variables)},
+        }
+    return summaries
+
+
+def scan_stratum_summaries(columns, spec, variables, block_rows=SKETCH_BLOCK_ROWS, k=SKETCH_K):
+    """stratum_summaries of the records given by columns (arrays or memory maps),
+    read block by block and never whole. The first pass takes the variable
+    maxima and a KLLSketch of each key column per block, merged across blocks as
+    across workers; the strata are laid out from the sketches (see
+    sketch_strata). The second pass assigns and bins each block.
+    Returns (strata, max_vals, summaries, n_records)."""
+    key_columns = [column for column, *_ in parse_spec(spec)]
+    n_rows = len(columns[variables[0]])
+    blocks = [(start, min(start + block_rows, n_rows)) for start in range(0, n_rows, block_rows)]
+    max_vals = {var: -np.inf for var in variables}
+    sketches = {}
+    for block, (start, stop) in enumerate(blocks):
+        for var in variables:
+            max_vals[var] = max(max_vals[var], float(np.max(columns[var][start:stop])))
+        for column in key_columns:
+            block_sketch = KLLSketch(k, stream=block).update(columns[column][start:stop])
+            sketches[column] = sketches[column].merge(block_sketch) if column in sketches else block_sketch
+    strata = sketch_strata(sketches, spec)
+
+    n_strata = strata.n_strata
+    counts = np.zeros((n_strata, len(variables), N_BINS), dtype=np.int64)
+    v_min = np.full(n_strata, np.inf)
+    v_max = np.full(n_strata, -np.inf)
+    for start, stop in blocks:
+        codes = strata.assign({column: columns[column][start:stop] for column in {*key_columns, 'v_val'}})
+        bin_block = bin_index_block([np.asarray(columns[var][start:stop]) for var in variables],
+                                    [max_vals[var] for var in variables], N_BINS)
+        counts += stratified_bincount(codes, bin_block, n_strata, N_BINS)[0]
+        v_block = np.asarray(columns['v_val'][start:stop], dtype=float)
+        valid = codes >= 0
+        np.minimum.at(v_min, codes[valid], v_block[valid])
+        np.maximum.at(v_max, codes[valid], v_block[valid])
+    summaries = {}
+    for s_idx, label in enumerate(strata.labels):
+        n = int(counts[s_idx, 0].sum())
+        summaries[label] = {
+            "n": n,
+            "v_range": (float(v_min[s_idx]), float(v_max[s_idx])) if n else (np.nan, np.nan),
+            "counts": {var: counts[s_idx, j] for j, var in enumerate(variables)},
+        }
+    return strata, max_vals, summaries, n_rows
+
+
+def cube_stratum_summary(cube, v_select, max_vals):
+    """stratum_summary for the v_val codes selected from a CountCube."""
+    present = cube.v_values[cube.v_counts(v_select) > 0]
+    return {
+        "n": int(cube.v_counts(v_select).sum()),
+        "v_range": (float(present.min()), float(present.max())) if len(present) else (np.nan, np.nan),
+        "counts": {var: cube.bin_counts(var, v_select) for var in max_vals},
+    }
 
 
 def bin_observations(values, max_val, n_bins=N_BINS):
@@ -79,8 +174,14 @@ def identify_significant_bins(residuals, threshold=2.0):
 
 def analyze_variable_in_stratum(values, max_val):
     """Run clustering analysis on a single variable within a stratum."""
-    n = len(values)
-    counts, bin_edges, bin_size = bin_observations(values, max_val)
+    return analyze_counts_in_stratum(bin_observations(values, max_val)[0], max_val)
+
+
+def analyze_counts_in_stratum(counts, max_val):
+    """analyze_variable_in_stratum from the variable's [0, max_val] bin counts."""
+    n = int(counts.sum())
+    bin_size = max_val / N_BINS
+    bin_edges = np.array([i * bin_size for i in range(N_BINS + 1)])
     expected = n / N_BINS
 
     chi2_stat, chi2_p, dof = chi_square_uniformity(counts)
@@ -94,6 +195,7 @@ def analyze_variable_in_stratum(values, max_val):
     return {
         "chi_square": round(chi2_stat, 4),
         "p_value": chi2_p,
+        "log10_p_value": round(log10_p_value(chi2_stat, dof), 4),
         "degrees_of_freedom": dof,
         "cramers_v": round(v, 6),
         "verdict": verdict,
@@ -109,99 +211,277 @@ def analyze_variable_in_stratum(values, max_val):
     }
 
 
-def run_synthetic_catalogs_stratum(stratum_df, max_vals, n_synthetic=N_SYNTHETIC):
+def bin_observations_batch(values, max_val, n_bins=N_BINS):
+    """Batched bin_observations for a (n_catalogs, n_records) block, using the
+    FULL DATASET max, with a single offset bincount. Returns (n_catalogs, n_bins) counts."""
+    n_catalogs = values.shape[0]
+    bin_size = max_val / n_bins
+    bin_indices = np.minimum(np.floor(values / bin_size).astype(np.intp), n_bins - 1)
+    bin_indices += np.arange(n_catalogs, dtype=np.intp)[:, None] * n_bins
+    counts = np.bincount(bin_indices.ravel(), minlength=n_catalogs * n_bins)
+    return counts.reshape(n_catalogs, n_bins)
+
+
+def chi_square_uniformity_batch(counts):
+    """Row-wise chi-square statistic against the uniform distribution for a
+    (n_catalogs, n_bins) count array. No p-values: synthetic catalogs are
+    ranked on the statistic (see synthetic_ranks)."""
+    k = counts.shape[1]
+    expected = counts.sum(axis=1) / k
+    return np.sum((counts - expected[:, None]) ** 2 / expected[:, None], axis=1)
+
+
+def synthetic_chunk_statistics(max_val, n_records, n_catalogs, rng):
+    """Chi-square statistics of n_catalogs catalogs of uniform random values in [0, max_val]."""
+    counts = bin_observations_batch(rng.uniform(0, max_val, size=(n_catalogs, n_records)), max_val)
+    chi2_stats = chi_square_uniformity_batch(counts)
+    return chi2_stats
+
+
+def run_synthetic_unit(n_records, max_val, n_synthetic, stratum, var, store=None, adaptive=None,
+                       real_stat=None, chunk_size=CATALOG_CHUNK_SIZE):
+    """Synthetic null chi-square statistics for one (stratum, variable) unit.
+    Each chunk of catalogs draws from its own keyed stream (see rng_streams),
+    so the result does not depend on which other units run, where, or in what order.
+
+    With store set, the catalogs are streamed to (and resumed from) a
+    CatalogStore under that directory, which is returned instead of the array.
+    With adaptive set to a sequential_mc stopping rule, chunks are drawn only
+    until the percentile rank of the real statistic real_stat is settled, and the sequential_rank
+    result is returned instead."""
+    chunk_statistics = partial(synthetic_chunk_statistics, max_val, n_records)
+    unit = None
+    if store is not None:
+        unit = CatalogStore(store, CASE_KEY, stratum, var,
+                            {"n_records": n_records, "max_val": float(max_val)}, chunk_size)
+    if adaptive is not None:
+        if unit is None:
+            chunks = (chunk_statistics(stop - start, chunk_rng(CASE_KEY, stratum, var, k))
+                      for k, start, stop in catalog_chunks(n_synthetic, chunk_size))
+        else:
+            chunks = (unit.chunk(k, stop - start, chunk_statistics)
+                      for k, start, stop in catalog_chunks(n_synthetic, chunk_size))
+        return sequential_rank(chunks, real_stat, alpha=ALPHA, rule=adaptive)
+    if unit is not None:
+        unit.fill(n_synthetic, chunk_statistics)
+        return unit
+    return np.concatenate([
+        chunk_statistics(stop - start, chunk_rng(CASE_KEY, stratum, var, k))
+        for k, start, stop in catalog_chunks(n_synthetic, chunk_size)
+    ])
+
+
+def run_synthetic_units(units, workers=1):
+    """Run run_synthetic_unit for each argument tuple in units, in a process pool
+    when workers > 1. Results come back in the order of units."""
+    if workers <= 1:
+        return [run_synthetic_unit(*unit) for unit in units]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_synthetic_unit, *unit) for unit in units]
+        return [future.result() for future in futures]
+
+
+def run_synthetic_catalogs_stratum(stratum_df, max_vals, n_synthetic=N_SYNTHETIC, stratum=1):
     """Generate synthetic null catalogs for a single stratum.
     Generates uniform random values in [0, max(variable)] for each variable."""
-    variables = ['x_val', 'y_val', 'z_val']
-    rng = np.random.default_rng(seed=42)
     n_records = len(stratum_df)
-
-    synthetic_p_values = {var: [] for var in variables}
-
-    for i in range(n_synthetic):
-        for var in variables:
-            synthetic_values = rng.uniform(0, max_vals[var], size=n_records)
-            counts, _, _ = bin_observations(synthetic_values, max_vals[var])
-            _, chi2_p, _ = chi_square_uniformity(counts)
-            synthetic_p_values[var].append(chi2_p)
-
-    return synthetic_p_values
-
-
-def percentile_rank(real_value, synthetic_values):
-    """Percentile rank of real_value in synthetic distribution."""
-    arr = np.array(synthetic_values)
-    return float(np.sum(arr <= real_value) / len(arr) * 100)
+    return {
+        var: run_synthetic_unit(n_records, max_vals[var], n_synthetic, stratum, var)
+        for var in max_vals
+    }
 
 
-def main():
+def run(df=None, n_synthetic=N_SYNTHETIC, workers=1, store=None, adaptive=None, cube=None, null='synthetic',
+        library=None, strata=DEFAULT_SPEC, quantiles='exact'):
+    """Run the Case 3B stratified clustering analysis and return the results dict.
+    strata is the stratification spec (see stratification), v_val quartiles by default.
+    With quantiles='sketch' the records (df's columns, or the memory-mapped
+    columnar cache) are read block by block and the quantile edges are those of
+    mergeable KLL sketches (see scan_stratum_summaries); the results then
+    record the edges and their rank error bound.
+    Synthetic catalogs for the (stratum, variable) units run on up to
+    workers processes; results are identical for any worker count.
+    With store set, they are streamed to a resumable CatalogStore under that directory.
+    With adaptive set to a sequential_mc stopping rule, each unit draws catalogs
+    only until its percentile rank is settled, up to n_synthetic.
+    With null='exact', percentiles come from the exact null distribution of
+    each stratum size instead (see exact_null); strata too large for it fall
+    back to synthetic catalogs.
+    With library set to a null library directory, synthetic catalogs are not
+    drawn per unit: the three variables of a stratum are ranked against the
+    library's one sorted null for the stratum size, generated there only if missing.
+    With a CountCube the records themselves are never read."""
     print("Case 3B: Clustering Patterns - Stratified Population (Blind Study)")
     print("=" * 72)
 
-    df = load_data()
-    n_total = len(df)
     variables = ['x_val', 'y_val', 'z_val']
+    if quantiles == 'sketch':
+        if cube is not None:
+            raise ValueError("Sketched quantiles scan the records; a count cube has exact ones")
+        columns = load_record_columns() if df is None else {col: df[col].values for col in df.columns}
+        stratification, max_vals, summaries, n_total = scan_stratum_summaries(
+            columns, strata, variables, SKETCH_BLOCK_ROWS)
+    elif cube is not None:
+        n_total = cube.n_records
+        max_vals = {var: float(cube.extrema(var)[1]) for var in variables}
+        stratification = create_cube_strata(cube, strata)
+        summaries = {label: cube_stratum_summary(cube, stratification.codes == s_idx, max_vals)
+                     for s_idx, label in enumerate(stratification.labels)}
+    else:
+        if df is None:
+            df = load_data()
+        n_total = len(df)
 
-    # Get full-dataset max values for consistent binning
-    max_vals = {var: float(np.max(df[var].values)) for var in variables}
+        # Get full-dataset max values for consistent binning
+        max_vals = {var: float(np.max(df[var].values)) for var in variables}
 
-    # Create strata
-    strata, quartiles = create_strata(df)
+        # Create strata, binning all strata and variables in one pass
+        stratification = create_strata(df, strata)
+        summaries = stratum_summaries(df, stratification, max_vals)
 
     print(f"\n  Total records: {n_total}")
-    print(f"  v_val quartiles: {[round(float(q), 4) for q in quartiles]}")
+    print(f"  Stratification: {stratification.description}")
+    for column, edges in stratification.edges.items():
+        print(f"  {column} edges: {[round(float(e), 4) for e in edges]}")
     stratum_sizes = {}
-    for label, sdf in strata.items():
-        stratum_sizes[label] = len(sdf)
-        print(f"  {label}: {len(sdf)} records")
+    for label, summary in summaries.items():
+        stratum_sizes[label] = summary['n']
+        print(f"  {label}: {summary['n']} records")
 
     # Verify group sizes
     for label, size in stratum_sizes.items():
         assert size >= 100, f"Stratum {label} has only {size} records (< 100)"
 
     results = {
-        "stratification": "v_val quartiles (4 groups)",
+        "stratification": stratification.description,
         "total_sample_size": n_total,
-        "v_val_quartiles": [round(float(q), 4) for q in quartiles],
-        "full_dataset_max_values": {var: round(max_vals[var], 4) for var in variables},
-        "stratum_sizes": stratum_sizes,
     }
-
-    stratum_labels = list(strata.keys())
-    stratum_nums = ['stratum_1', 'stratum_2', 'stratum_3', 'stratum_4']
-
-    for s_num, s_label in zip(stratum_nums, stratum_labels):
-        sdf = strata[s_label]
-        v_min = float(sdf['v_val'].min())
-        v_max = float(sdf['v_val'].max())
-
-        print(f"\n  Analyzing {s_num} ({s_label}, n={len(sdf)})...")
+    if strata == DEFAULT_SPEC and quantiles == 'exact':
+        results["v_val_quartiles"] = [round(float(q), 4) for q in stratification.edges['v_val']]
+    else:
+        results["strata_spec"] = strata
+        results["stratum_labels"] = stratification.labels
+        results["stratum_edges"] = {column: [round(float(e), 4) for e in edges]
+                                    for column, edges in stratification.edges.items()}
+    if quantiles == 'sketch':
+        results["stratum_boundaries"] = {"method": "kll_sketch", "sketch_k": SKETCH_K,
+                                         "rank_error": round(stratification.rank_error, 6)}
+        print(f"  Sketched quantile edges: rank error within {stratification.rank_error:.4%} "
+              f"of the records at {RANK_CONFIDENCE:.0%} confidence")
+    results["full_dataset_max_values"] = {var: round(max_vals[var], 4) for var in variables}
+    results["stratum_sizes"] = stratum_sizes
+
+    stratum_labels = stratification.labels
+    stratum_nums = [f"stratum_{i + 1}" for i in range(stratification.n_strata)]
+    units = []
+    unit_keys = []
+    library_nulls = []
+    null_library = NullLibrary(library) if library is not None else None
+    real_stats = {}
+    exact_tail_mass = {}
+
+    for s_idx, (s_num, s_label) in enumerate(zip(stratum_nums, stratum_labels)):
+        summary = summaries[s_label]
+        v_min, v_max = summary['v_range']
+
+        print(f"\n  Analyzing {s_num} ({s_label}, n={summary['n']})...")
 
         stratum_result = {
             "v_val_range": [round(v_min, 4), round(v_max, 4)],
-            "sample_size": len(sdf),
+            "sample_size": summary['n'],
         }
 
+        # The exact null depends on the stratum size only: one for all three variables
+        stratum_null = None
+        if null == 'exact':
+            if exact_feasible(summary['n'], N_BINS):
+                stratum_null = exact_null(summary['n'], N_BINS)
+                exact_tail_mass[s_num] = stratum_null.tail_mass
+            else:
+                print(f"    n={summary['n']} is too large for the exact null; using synthetic catalogs")
+        if null_library is not None and stratum_null is None:
+            stratum_library_null = null_library.null(summary['n'], N_BINS, n_synthetic, 'fixed_max')
+
         # Analyze each variable
         for var in variables:
-            var_result = analyze_variable_in_stratum(sdf[var].values, max_vals[var])
+            var_result = analyze_counts_in_stratum(summary['counts'][var], max_vals[var])
             print(f"    {var}: χ²={var_result['chi_square']}, "
                   f"p={var_result['p_value']:.6e}, V={var_result['cramers_v']}, "
                   f"verdict={var_result['verdict']}")
             stratum_result[var] = var_result
+            # Unrounded statistic, for ranking against the synthetic catalogs
+            real_stats[(s_num, var)], _, _ = chi_square_uniformity(summary['counts'][var])
+            var_result['real_chi_square'] = float(real_stats[(s_num, var)])
+            if stratum_null is not None:
+                pct = stratum_null.percentile(real_stats[(s_num, var)])
+                var_result['synthetic_percentile'] = round(pct, 2)
+                print(f"    {var}: real p at {pct:.1f}th percentile of the exact null")
+                continue
+            unit_keys.append((s_num, var))
+            if null_library is not None:
+                library_nulls.append(stratum_library_null)
+                continue
+            units.append((summary['n'], max_vals[var], n_synthetic, s_idx + 1, var, store, adaptive,
+                          real_stats[(s_num, var)]))
 
-        # Synthetic catalogs for this stratum
-        print(f"    Generating {N_SYNTHETIC} synthetic catalogs...")
-        synthetic_p = run_synthetic_catalogs_stratum(sdf, max_vals)
+        results[s_num] = stratum_result
 
-        for var in variables:
-            real_p = stratum_result[var]['p_value']
-            pct = percentile_rank(real_p, synthetic_p[var])
-            stratum_result[var]['synthetic_percentile'] = round(pct, 2)
-            stratum_result[var]['synthetic_p_values'] = [round(p, 6) for p in synthetic_p[var]]
-            print(f"    {var}: real p at {pct:.1f}th percentile of synthetic")
+    if null == 'exact':
+        results["null_model"] = "exact: multinomial distribution of the chi-square statistic per stratum size"
+        results["exact_null_tail_mass"] = exact_tail_mass
+    if null_library is not None:
+        results["null_library"] = library
 
-        results[s_num] = stratum_result
+    # Synthetic catalogs for every remaining (stratum, variable) unit
+    if null_library is not None:
+        unit_results = library_nulls
+        print(f"\n  Ranking against {n_synthetic} synthetic catalogs per stratum size from null library {library}")
+    else:
+        if units:
+            cap = f"up to {n_synthetic} ({adaptive} stopping)" if adaptive else f"{n_synthetic}"
+            print(f"\n  Generating {cap} synthetic catalogs per stratum and variable "
+                  f"({len(units)} units, {workers} worker{'s' if workers != 1 else ''})...")
+        unit_results = run_synthetic_units(units, workers)
+
+    # Percentile ranks are counted on the chi-square statistics (see synthetic_ranks)
+    for (s_num, var), unit_result in zip(unit_keys, unit_results):
+        stratum_result = results[s_num]
+        real_stat = real_stats[(s_num, var)]
+        synthetic_stats = None
+        if null_library is not None:
+            # A SortedNull shared by the stratum's variables; its path stands in for the store
+            unit = unit_result
+            rank = rank_summary(unit.exceedances(real_stat), n_synthetic)
+            if n_synthetic <= INLINE_SYNTHETIC_LIMIT:
+                synthetic_stats = unit.statistics
+        elif adaptive is not None:
+            rank = unit_result
+            synthetic_stats = rank['statistics']
+        elif store is None:
+            synthetic_stats = unit_result
+            rank = rank_summary(exceedances(synthetic_stats, real_stat), n_synthetic)
+        else:
+            unit = unit_result
+            rank = rank_summary(unit.exceedances(real_stat, n_synthetic), n_synthetic)
+            if n_synthetic <= INLINE_SYNTHETIC_LIMIT:
+                synthetic_stats = unit.statistics(n_synthetic)
+        pct = rank['percentile']
+        synthetic_p = None
+        if synthetic_stats is not None:
+            synthetic_p = p_values(synthetic_stats, N_BINS - 1).tolist()
+        stratum_result[var]['synthetic_percentile'] = round(pct, 2)
+        stratum_result[var]['synthetic_percentile_mc_error'] = round(rank['mc_error'], 2)
+        stratum_result[var]['synthetic_percentile_ci'] = [round(c, 2) for c in rank['ci']]
+        if adaptive is not None:
+            stratum_result[var]['synthetic_catalogs_used'] = rank['n_catalogs']
+        if synthetic_p is not None:
+            stratum_result[var]['synthetic_chi_square'] = np.asarray(synthetic_stats, dtype=float).tolist()
+            stratum_result[var]['synthetic_p_values'] = [round(p, 6) for p in synthetic_p]
+        else:
+            stratum_result[var]['synthetic_store'] = unit.path
+        print(f"    {s_num} {var}: real p at {pct:.1f}th percentile of synthetic "
+              f"(MC error {rank['mc_error']:.2f}, {CONFIDENCE:.0%} CI "
+              f"[{rank['ci'][0]:.2f}, {rank['ci'][1]:.2f}], {rank['n_catalogs']} catalogs)")
 
     # Comparative summary
     print("\n  Comparative Summary:")
@@ -231,12 +511,50 @@ def main():
 
     results["comparative_summary"] = comparative
     print(f"    Interpretation: {comparative['interpretation']}")
+    return results
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, 'w') as f:
-        json.dump(results, f, indent=2)
 
-    print(f"\nResults written to {OUTPUT_PATH}")
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {path}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Case 3B stratified clustering analysis (blind study)")
+    parser.add_argument('--n-synthetic', type=int, default=N_SYNTHETIC,
+                        help=f"number of synthetic null catalogs per stratum (default {N_SYNTHETIC})")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes for the (stratum, variable) synthetic units (default 1)")
+    parser.add_argument('--store', metavar='DIR',
+                        help="stream synthetic catalogs to a resumable on-disk store under DIR")
+    parser.add_argument('--adaptive', choices=STOPPING_RULES,
+                        help="stop generating catalogs per unit once the percentile is settled; "
+                             "--n-synthetic becomes the cap")
+    parser.add_argument('--null', choices=NULL_MODES, default='synthetic',
+                        help="synthetic: rank against synthetic catalogs (default); exact: exact "
+                             "multinomial null per stratum size, synthetic catalogs only where it is too large")
+    parser.add_argument('--library', metavar='DIR', nargs='?', const=LIBRARY_DIR,
+                        help="rank against the shared null distribution per stratum size of a persistent "
+                             f"null library (default DIR {LIBRARY_DIR}) instead of per-unit catalogs")
+    parser.add_argument('--strata', default=DEFAULT_SPEC, metavar='SPEC',
+                        help=f"stratification spec, e.g. v_val:q10, v_val:e6.0,6.5 or v_val:q4*a_val:e1980,2000 "
+                             f"(default {DEFAULT_SPEC}, v_val quartiles; see stratification)")
+    parser.add_argument('--quantiles', choices=QUANTILE_MODES, default='exact',
+                        help="exact: stratum edges from the quantiles of all records (default); sketch: "
+                             "scan the records block by block and take them from mergeable KLL sketches")
+    args = parser.parse_args(argv)
+    if args.library and (args.store or args.adaptive):
+        parser.error("--library replaces --store and --adaptive")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    write_results(run(n_synthetic=args.n_synthetic, workers=args.workers, store=args.store,
+                      adaptive=args.adaptive, null=args.null, library=args.library, strata=args.strata,
+                      quantiles=args.quantiles))
 
 
 if __name__ == '__main__':
@@ -2,16 +2,28 @@
 Case 4A: Energy-Weighted Clustering Patterns - Full Population (Blind Study - Approach Two)
 Replicates Case 3A analysis but weights by energy proxy (10^(1.5 * v_val))
 instead of event count. Tests whether clustering patterns are robust
-to different analytical metrics.
+to different analytical metrics. Runs on the raw records or on their count
+cube (see count_cube): energy depends on v_val only, so energy per bin and the
+weighted Rayleigh sums are reductions of the cube with one weight per v_val code.
 Outputs results to output/case_4a_results_blind.json.
 """
 
+import argparse
 import json
 import os
+from functools import partial
 import numpy as np
-import pandas as pd
 from scipy import stats
 
+from catalog_store import INLINE_SYNTHETIC_LIMIT, CatalogStore, array_digest
+from contingency_tables import level_table, patefield_tables, weighted_column_sums
+from data_store import load_records
+from energy_null import NULL_MODES, analytic_null
+from histogram_kernels import equal_width_bin_indices, weighted_bincount
+from rng_streams import CATALOG_CHUNK_SIZE, FULL_POPULATION, catalog_chunks, chunk_rng
+from sequential_mc import CONFIDENCE, STOPPING_RULES, rank_summary, sequential_rank
+from synthetic_ranks import exceedances, log10_p_value, p_values
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_4a_results_blind.json')
 CASE_3A_RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_3a_results_blind.json')
@@ -19,10 +31,11 @@ CASE_3A_RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', '
 N_BINS = 16
 N_SYNTHETIC = 1000
 ALPHA = 0.05
+CASE_KEY = 'case_4a'
 
 
 def load_data(path=DATA_PATH):
-    df = pd.read_csv(path)
+    df = load_records(path)
     print(f"  Loaded {len(df)} records from {path}")
     return df
 
@@ -32,18 +45,15 @@ def calculate_energy(v_vals):
     return np.power(10, 1.5 * v_vals)
 
 
-def bin_energy(values, energy, n_bins=N_BINS):
+def bin_energy(values, energy, n_bins=N_BINS, summation='kahan'):
     """Bin values into n_bins equal-width bins from 0 to max(values).
-    Returns energy sum per bin instead of count."""
+    Returns energy sum per bin instead of count, accumulated in one pass
+    with compensated summation by default."""
     max_val = np.max(values)
     bin_size = max_val / n_bins
     bin_edges = np.array([i * bin_size for i in range(n_bins + 1)])
-    bin_indices = np.minimum(np.floor(values / bin_size).astype(int), n_bins - 1)
-
-    energy_per_bin = np.zeros(n_bins)
-    for i in range(n_bins):
-        mask = bin_indices == i
-        energy_per_bin[i] = np.sum(energy[mask])
+    bin_indices = equal_width_bin_indices(values, max_val, n_bins)
+    energy_per_bin = weighted_bincount(bin_indices, energy, n_bins, summation=summation)
 
     return energy_per_bin, bin_edges, bin_size, bin_indices
 
@@ -57,6 +67,14 @@ def chi_square_energy(observed_energy):
     return float(stat), float(p_value), dof
 
 
+def chi_square_energy_batch(observed_energy):
+    """Row-wise chi-square statistic on a (n_catalogs, n_bins) energy array.
+    No p-values: synthetic catalogs are ranked on the statistic (see synthetic_ranks)."""
+    k = observed_energy.shape[1]
+    expected = observed_energy.sum(axis=1) / k
+    return np.sum((observed_energy - expected[:, None]) ** 2 / expected[:, None], axis=1)
+
+
 def rayleigh_test(values, weights=None):
     """Energy-weighted Rayleigh test for circular concentration.
     Maps data to [0, 2*pi] and tests for directional clustering,
@@ -68,10 +86,13 @@ def rayleigh_test(values, weights=None):
     theta = 2 * np.pi * (values - min_val) / (max_val - min_val)
     if weights is None:
         weights = np.ones_like(theta)
-    n = len(theta)
     w_total = np.sum(weights)
-    C = np.sum(weights * np.cos(theta)) / w_total
-    S = np.sum(weights * np.sin(theta)) / w_total
+    return rayleigh_statistic(np.sum(weights * np.cos(theta)) / w_total,
+                              np.sum(weights * np.sin(theta)) / w_total, len(theta))
+
+
+def rayleigh_statistic(C, S, n):
+    """Rayleigh Z and p-value from the weighted mean cos(theta) and sin(theta) of n events."""
     R_bar = np.sqrt(C**2 + S**2)
     Z = n * R_bar**2
     # Approximation (Greenwood & Durand, 1955)
@@ -102,12 +123,33 @@ def identify_significant_bins(residuals, threshold=2.0):
 
 def analyze_variable_energy(values, energy, n_events):
     """Run energy-weighted clustering analysis on a single variable."""
-    energy_per_bin, bin_edges, bin_size, bin_indices = bin_energy(values, energy)
+    energy_per_bin, bin_edges, bin_size, _ = bin_energy(values, energy)
+    return analyze_energy_bins(energy_per_bin, bin_edges, bin_size, rayleigh_test(values, weights=energy),
+                               n_events)
+
+
+def analyze_cube_variable_energy(cube, var, v_energy):
+    """analyze_variable_energy from a CountCube, v_energy being the energy of each v_val code."""
+    min_val, max_val = cube.extrema(var)
+    bin_size = max_val / N_BINS
+    bin_edges = np.array([i * bin_size for i in range(N_BINS + 1)])
+    if max_val == min_val:
+        rayleigh = (0.0, 1.0)
+    else:
+        C, S, w_total = cube.rayleigh_sums(var, v_weights=v_energy)
+        rayleigh = rayleigh_statistic(C / w_total, S / w_total, cube.n_records)
+    return analyze_energy_bins(cube.weighted_bin_sums(var, v_energy), bin_edges, bin_size, rayleigh,
+                               cube.n_records)
+
+
+def analyze_energy_bins(energy_per_bin, bin_edges, bin_size, rayleigh, n_events):
+    """Energy-weighted clustering analysis of one variable from its energy per bin
+    and (Z, p) Rayleigh result."""
     total_energy = np.sum(energy_per_bin)
     expected_energy = total_energy / N_BINS
 
     chi2_stat, chi2_p, dof = chi_square_energy(energy_per_bin)
-    rayleigh_z, rayleigh_p = rayleigh_test(values, weights=energy)
+    rayleigh_z, rayleigh_p = rayleigh
     v = cramers_v(chi2_stat, n_events, N_BINS)
 
     residuals = standardized_residuals_energy(energy_per_bin, expected_energy)
@@ -117,6 +159,7 @@ def analyze_variable_energy(values, energy, n_events):
         "chi_square_energy": {
             "statistic": round(chi2_stat, 4),
             "p_value": chi2_p,
+            "log10_p_value": round(log10_p_value(chi2_stat, dof), 4),
             "degrees_of_freedom": dof,
             "interpretation": "significant" if chi2_p < ALPHA else "not significant"
         },
@@ -145,68 +188,343 @@ def load_case_3a_results(path=CASE_3A_RESULTS_PATH):
         return None
 
 
-def run_synthetic_catalogs(df, energy, n_synthetic=N_SYNTHETIC):
+def variable_bins(df):
+    """{variable: (values, [0, max] bin indices)} of the records, for the synthetic engines."""
+    return {var: (df[var].values, equal_width_bin_indices(df[var].values, np.max(df[var].values), N_BINS))
+            for var in ['x_val', 'y_val', 'z_val']}
+
+
+def cube_variable_bins(cube):
+    """variable_bins rebuilt from a CountCube, plus the v_val code of every record.
+    The records come out in (a_val, v_val) cell order, the same for every
+    variable, so one energy array pairs with all three; each variable keeps its
+    (bin, v_val) pairing, which is all the permutation null depends on. Raw
+    values are not available, so the entries hold None in their place."""
+    bins = {}
+    for var in ['x_val', 'y_val', 'z_val']:
+        bin_indices, v_codes = cube.expand(var)
+        bins[var] = (None, bin_indices)
+    return bins, v_codes
+
+
+def synthetic_chunk_statistics(values, bin_indices, energy, n_catalogs, rng, engine='permute',
+                               table=None):
+    """Energy-weighted chi-square statistics of n_catalogs shuffled catalogs for one variable.
+
+    A value's bin does not change under a permutation, only its pairing with
+    energy does, so engine='permute' (default) permutes the precomputed
+    bin_indices against the fixed energies with one weighted bincount per
+    catalog, and engine='batch' builds a (n_catalogs, n_records) matrix of
+    permuted index arrays and bins it in a single weighted_bincount call.
+    engine='loop' is the original implementation that rebins every shuffled
+    column; it draws the same permutations as engine='permute', and needs the
+    raw values.
+
+    engine='patefield' samples the catalog's (energy level, bin) table directly
+    from its fixed margins (see contingency_tables): same null distribution,
+    cost per catalog independent of n_records. table is the observed
+    level_table(energy, bin_indices), computed here if not given."""
+    n_records = len(energy)
+    if engine == 'patefield':
+        levels, observed = table if table is not None else level_table(energy, bin_indices, N_BINS)
+        tables = patefield_tables(observed.sum(axis=1), observed.sum(axis=0), n_catalogs, rng)
+        return chi_square_energy_batch(weighted_column_sums(tables, levels))
+    if engine == 'loop':
+        if values is None:
+            raise ValueError("engine='loop' rebins the raw values and cannot run on a count cube")
+        chi2_stats = np.empty(n_catalogs)
+        for i in range(n_catalogs):
+            # Shuffle the variable values randomly
+            shuffled_values = rng.permutation(values)
+            # Compute energy-weighted bins using original energy (v_val unchanged)
+            energy_per_bin, _, _, _ = bin_energy(shuffled_values, energy)
+            chi2_stats[i], _, _ = chi_square_energy(energy_per_bin)
+        return chi2_stats
+    if engine == 'permute':
+        energy_per_bin = np.empty((n_catalogs, N_BINS))
+        for i in range(n_catalogs):
+            perm = rng.permutation(n_records)
+            energy_per_bin[i] = weighted_bincount(bin_indices[perm], energy, N_BINS)
+    elif engine == 'batch':
+        perms = rng.permuted(np.tile(np.arange(n_records), (n_catalogs, 1)), axis=1)
+        energy_per_bin = weighted_bincount(bin_indices[perms], energy, N_BINS)
+    else:
+        raise ValueError(f"Unknown synthetic engine: {engine}")
+    return chi_square_energy_batch(energy_per_bin)
+
+
+def bind_chunk_statistics(values, bin_indices, energy, engine):
+    """synthetic_chunk_statistics for one variable as a function of
+    (n_catalogs, rng), with the level table precomputed for engine='patefield'."""
+    table = level_table(energy, bin_indices, N_BINS) if engine == 'patefield' else None
+    return partial(synthetic_chunk_statistics, values, bin_indices, energy, engine=engine, table=table)
+
+
+def run_synthetic_catalogs(bins, energy, n_synthetic=N_SYNTHETIC, engine='permute',
+                           chunk_size=CATALOG_CHUNK_SIZE):
     """Generate n_synthetic null hypothesis catalogs with energy weighting.
     Shuffles x_val, y_val, z_val randomly while keeping a_val and v_val
-    (and thus energy) in original order."""
+    (and thus energy) in original order.
+
+    Each chunk of chunk_size catalogs per variable draws from its own keyed
+    stream (see rng_streams), so chunks can be generated in any order.
+    See synthetic_chunk_statistics for the engines; bins comes from
+    variable_bins or cube_variable_bins.
+    Returns {variable: chi-square statistics}; p-values are derived only for reporting."""
     variables = ['x_val', 'y_val', 'z_val']
-    rng = np.random.default_rng(seed=42)
 
-    synthetic_p_values = {var: [] for var in variables}
-    synthetic_cramers_v = {var: [] for var in variables}
+    synthetic_stats = {}
+    for var in variables:
+        chunk_statistics = bind_chunk_statistics(*bins[var], energy, engine)
+        synthetic_stats[var] = np.concatenate([
+            chunk_statistics(stop - start, chunk_rng(CASE_KEY, FULL_POPULATION, var, k))
+            for k, start, stop in catalog_chunks(n_synthetic, chunk_size)
+        ])
+        print(f"    {var}: {n_synthetic} synthetic catalogs complete")
 
-    n_records = len(df)
+    return synthetic_stats
 
-    for i in range(n_synthetic):
-        for var in variables:
-            # Shuffle the variable values randomly
-            shuffled_values = rng.permutation(df[var].values)
-            # Compute energy-weighted bins using original energy (v_val unchanged)
-            energy_per_bin, _, _, _ = bin_energy(shuffled_values, energy)
-            chi2_stat, chi2_p, _ = chi_square_energy(energy_per_bin)
-            synthetic_p_values[var].append(chi2_p)
-            v = cramers_v(chi2_stat, n_records, N_BINS)
-            synthetic_cramers_v[var].append(v)
 
-        if (i + 1) % 200 == 0:
-            print(f"    Synthetic catalog {i + 1}/{n_synthetic} complete")
+def store_digest(values, bin_indices, energy):
+    """Data digest of a store unit: the raw values, or the bins of a count cube."""
+    return array_digest(values if values is not None else bin_indices, energy)
 
+
+def store_synthetic_catalogs(bins, energy, n_synthetic, store, engine='permute', chunk_size=CATALOG_CHUNK_SIZE):
+    """Stream the synthetic catalogs of run_synthetic_catalogs to an on-disk
+    CatalogStore under store, one unit per variable, resuming any chunks
+    already there. Returns {variable: CatalogStore}."""
+    variables = ['x_val', 'y_val', 'z_val']
+    units = {}
+    for var in variables:
+        values, bin_indices = bins[var]
+        config = {"engine": engine, "n_records": len(energy),
+                  "data_sha256": store_digest(values, bin_indices, energy)}
+        units[var] = CatalogStore(store, CASE_KEY, FULL_POPULATION, var, config, chunk_size)
+        generated = units[var].fill(n_synthetic, bind_chunk_statistics(values, bin_indices, energy, engine))
+        print(f"    {var}: {n_synthetic} synthetic catalogs in {units[var].path} "
+              f"({generated} chunks generated)")
+    return units
+
+
+def adaptive_synthetic_catalogs(bins, energy, n_synthetic, real_stats, rule, engine='permute', store=None,
+                                chunk_size=CATALOG_CHUNK_SIZE):
+    """Sequential version of run_synthetic_catalogs: per variable, catalog chunks
+    are generated only until the stopping rule settles the percentile rank of
+    the real statistic real_stats[var], with n_synthetic as the cap (see sequential_mc).
+    With store set, chunks are read from or written to a CatalogStore.
+    Returns {variable: sequential_rank result}."""
+    variables = ['x_val', 'y_val', 'z_val']
+    ranks = {}
+    for var in variables:
+        values, bin_indices = bins[var]
+        chunk_statistics = bind_chunk_statistics(values, bin_indices, energy, engine)
+        if store is None:
+            chunks = (chunk_statistics(stop - start, chunk_rng(CASE_KEY, FULL_POPULATION, var, k))
+                      for k, start, stop in catalog_chunks(n_synthetic, chunk_size))
+        else:
+            config = {"engine": engine, "n_records": len(energy),
+                      "data_sha256": store_digest(values, bin_indices, energy)}
+            unit = CatalogStore(store, CASE_KEY, FULL_POPULATION, var, config, chunk_size)
+            chunks = (unit.chunk(k, stop - start, chunk_statistics)
+                      for k, start, stop in catalog_chunks(n_synthetic, chunk_size))
+        ranks[var] = sequential_rank(chunks, real_stats[var], alpha=ALPHA, rule=rule)
+        print(f"    {var}: stopped after {ranks[var]['n_catalogs']} synthetic catalogs "
+              f"({'settled' if ranks[var]['settled'] else 'cap reached'})")
+    return ranks
+
+
+def synthetic_values(chi2_stats, n_records):
+    """Synthetic p-value and Cramér's V lists from {variable: chi-square statistics}."""
+    synthetic_p_values = {}
+    synthetic_cramers_v = {}
+    for var, var_stats in chi2_stats.items():
+        synthetic_p_values[var] = p_values(var_stats, N_BINS - 1).tolist()
+        synthetic_cramers_v[var] = np.sqrt(var_stats / (n_records * (N_BINS - 1))).tolist()
     return synthetic_p_values, synthetic_cramers_v
 
 
-def percentile_rank(real_value, synthetic_values):
-    """Calculate percentile rank of real_value in synthetic distribution."""
-    arr = np.array(synthetic_values)
-    return float(np.sum(arr <= real_value) / len(arr) * 100)
+def permutation_null_hypothesis(bins, energy, real_stats, n_synthetic, engine='permute', store=None,
+                                adaptive=None):
+    """Rank the real statistics against synthetic null catalogs; returns the
+    synthetic_null_hypothesis section of the results."""
+    variables = ['x_val', 'y_val', 'z_val']
+    n = len(energy)
 
+    # Generate synthetic null hypothesis catalogs
+    cap = f"up to {n_synthetic}, {adaptive} stopping" if adaptive else f"{n_synthetic}"
+    print(f"\n  Generating {cap} synthetic null hypothesis catalogs "
+          f"(energy-weighted, {engine} engine)...")
+    units = None
+    ranks = None
+    synthetic_stats = None
+    if adaptive is not None:
+        ranks = adaptive_synthetic_catalogs(bins, energy, n_synthetic, real_stats, adaptive,
+                                            engine=engine, store=store)
+        synthetic_stats = {var: ranks[var]['statistics'] for var in variables}
+    elif store is None:
+        synthetic_stats = run_synthetic_catalogs(bins, energy, n_synthetic, engine=engine)
+    else:
+        units = store_synthetic_catalogs(bins, energy, n_synthetic, store, engine=engine)
+        if n_synthetic <= INLINE_SYNTHETIC_LIMIT:
+            synthetic_stats = {var: units[var].statistics(n_synthetic) for var in variables}
+
+    # Percentile rank analysis on the chi-square statistics (see synthetic_ranks),
+    # with the Monte Carlo error of each percentile
+    print("\n  Percentile rank analysis:")
+    percentile_results = {}
+    for var in variables:
+        if ranks is not None:
+            rank = ranks[var]
+        elif units is None:
+            rank = rank_summary(exceedances(synthetic_stats[var], real_stats[var]), n_synthetic)
+        else:
+            rank = rank_summary(units[var].exceedances(real_stats[var], n_synthetic), n_synthetic)
+        pct = rank['percentile']
+        percentile_results[f"{var}_real_p_percentile"] = round(pct, 2)
+        percentile_results[f"{var}_real_p_percentile_mc_error"] = round(rank['mc_error'], 2)
+        percentile_results[f"{var}_real_p_percentile_ci"] = [round(c, 2) for c in rank['ci']]
+        if ranks is not None:
+            percentile_results[f"{var}_synthetic_catalogs_used"] = rank['n_catalogs']
+        print(f"    {var}: real p-value at {pct:.1f}th percentile of synthetic distribution "
+              f"(MC error {rank['mc_error']:.2f}, {CONFIDENCE:.0%} CI "
+              f"[{rank['ci'][0]:.2f}, {rank['ci'][1]:.2f}])")
 
-def main():
+    # Assemble results
+    synthetic = {
+        "synthetic_catalogs_generated": n_synthetic,
+        "shuffling_method": "x_val, y_val, z_val randomized; a_val, v_val preserved",
+        "energy_weighting_applied": True,
+    }
+    # Unrounded statistics the percentiles are counted on
+    for var in variables:
+        synthetic[f"{var}_real_chi_square"] = float(real_stats[var])
+    if synthetic_stats is not None:
+        synthetic_p_values, synthetic_cramers_v = synthetic_values(synthetic_stats, n)
+        for var in variables:
+            synthetic[f"{var}_synthetic_chi_square"] = np.asarray(synthetic_stats[var], dtype=float).tolist()
+        for var in variables:
+            synthetic[f"{var}_synthetic_p_values"] = [round(p, 6) for p in synthetic_p_values[var]]
+        for var in variables:
+            synthetic[f"{var}_synthetic_cramers_v"] = [round(v, 6) for v in synthetic_cramers_v[var]]
+    else:
+        synthetic["synthetic_store"] = store
+    if ranks is not None:
+        synthetic["sequential_stopping"] = {"rule": adaptive, "max_catalogs": n_synthetic}
+    synthetic["percentile_rank_analysis"] = percentile_results
+    return synthetic
+
+
+def analytic_null_hypothesis(real_stats, bin_counts, energy):
+    """Rank the real statistics against the closed-form permutation null
+    (see energy_null); returns the synthetic_null_hypothesis section of the results."""
+    print("\n  Percentile rank analysis (analytic permutation null):")
+    percentile_results = {}
+    for var, real_stat in real_stats.items():
+        fit = analytic_null(real_stat, bin_counts[var], energy)
+        percentile_results[f"{var}_real_chi_square"] = float(real_stat)
+        percentile_results[f"{var}_real_p_percentile"] = round(fit['percentile'], 2)
+        percentile_results[f"{var}_real_p_log10_percentile"] = (
+            round(fit['log10_percentile'], 4) if fit['log10_percentile'] is not None else None)
+        percentile_results[f"{var}_null_fit"] = {
+            "mean": fit['mean'], "variance": fit['variance'], "scale": fit['scale'], "dof": fit['dof']}
+        print(f"    {var}: real p-value at {fit['percentile']:.1f}th percentile of the permutation null "
+              f"(moment-matched scaled chi-square)")
+    return {
+        "null_model": "analytic",
+        "approximation": "scaled chi-square matched to the exact permutation mean and variance",
+        "shuffling_method": "x_val, y_val, z_val randomized; a_val, v_val preserved",
+        "energy_weighting_applied": True,
+        "percentile_rank_analysis": percentile_results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Case 4A energy-weighted clustering analysis (blind study)")
+    parser.add_argument('--n-synthetic', type=int, default=N_SYNTHETIC,
+                        help=f"number of synthetic null catalogs per variable (default {N_SYNTHETIC})")
+    parser.add_argument('--engine', choices=['permute', 'batch', 'patefield', 'loop'], default='permute',
+                        help="synthetic catalog engine (default permute)")
+    parser.add_argument('--store', metavar='DIR',
+                        help="stream synthetic catalogs to a resumable on-disk store under DIR")
+    parser.add_argument('--adaptive', choices=STOPPING_RULES,
+                        help="stop generating catalogs per variable once the percentile is settled; "
+                             "--n-synthetic becomes the cap")
+    parser.add_argument('--null', choices=NULL_MODES, default='permutation',
+                        help="permutation: rank against synthetic catalogs (default); analytic: "
+                             "moment-matched closed-form permutation null, no catalogs generated; "
+                             "approximate: on the real population 5-13 percentile points above the "
+                             "Monte Carlo rank mid-distribution, up to 2 points below it (anti-conservative) "
+                             "in the 10%%-1%% tail")
+    args = parser.parse_args(argv)
+    if args.null == 'analytic' and (args.store or args.adaptive):
+        parser.error("--store and --adaptive apply to the permutation null only")
+    return args
+
+
+def run(df=None, case_3a=None, n_synthetic=N_SYNTHETIC, engine='permute', store=None, adaptive=None,
+        null='permutation', cube=None):
+    """Run the Case 4A energy-weighted analysis and return the results dict.
+    case_3a is the Case 3A results dict; it is read from output/ if omitted.
+    With store set, synthetic catalogs are streamed to (and resumed from) a
+    CatalogStore under that directory and percentiles are counted from it.
+    With adaptive set to a sequential_mc stopping rule, each variable draws
+    catalogs only until its percentile rank is settled, up to n_synthetic.
+    With null='analytic', no catalogs are generated: percentiles come from the
+    moment-matched closed-form permutation null (see energy_null).
+    With a CountCube the records themselves are never read; the permutation
+    null then shuffles the cube's (bin, v_val) records, which are not in file
+    order, so its catalogs differ from the raw run's while following the same
+    null distribution."""
     print("Case 4A: Energy-Weighted Clustering Patterns - Full Population (Blind Study)")
     print("=" * 78)
 
-    df = load_data()
-    n = len(df)
     variables = ['x_val', 'y_val', 'z_val']
+    if cube is not None:
+        n = cube.n_records
+        v_vals = cube.v_values[cube.v_counts() > 0]
+    else:
+        if df is None:
+            df = load_data()
+        n = len(df)
+        v_vals = df['v_val'].values
 
     # Verify all v_val > 0
-    assert (df['v_val'] > 0).all(), "All v_val values must be > 0 for energy calculation"
+    assert (v_vals > 0).all(), "All v_val values must be > 0 for energy calculation"
     print(f"  All {n} v_val values > 0: verified")
 
-    # Calculate energy
-    energy = calculate_energy(df['v_val'].values)
+    # Calculate energy; on the cube, once per v_val code
+    if cube is not None:
+        v_energy = calculate_energy(cube.v_values)
+        bins, v_codes = cube_variable_bins(cube)
+        energy = v_energy[v_codes]
+    else:
+        energy = calculate_energy(v_vals)
+        bins = variable_bins(df)
     total_energy = float(np.sum(energy))
     print(f"  Total energy: {total_energy:.4e}")
     print(f"  Mean energy per event: {total_energy / n:.4e}")
     print(f"  Energy range: {np.min(energy):.4e} to {np.max(energy):.4e}")
 
     # Load Case 3A results for comparison
-    case_3a = load_case_3a_results()
+    if case_3a is None:
+        case_3a = load_case_3a_results()
 
     # Analyze each variable
     print("\n  Analyzing variables (energy-weighted)...")
     var_results = {}
+    real_stats = {}
+    bin_counts = {}
     for var in variables:
-        result = analyze_variable_energy(df[var].values, energy, n)
+        # Unrounded statistic and bin counts, for ranking against the null
+        if cube is not None:
+            result = analyze_cube_variable_energy(cube, var, v_energy)
+            energy_per_bin = cube.weighted_bin_sums(var, v_energy)
+        else:
+            result = analyze_variable_energy(df[var].values, energy, n)
+            energy_per_bin, _, _, _ = bin_energy(df[var].values, energy)
+        real_stats[var], _, _ = chi_square_energy(energy_per_bin)
+        bin_counts[var] = np.bincount(bins[var][1], minlength=N_BINS)
         # Add Case 3A comparison
         if case_3a and var in case_3a:
             result["comparison_to_case_3a"] = {
@@ -225,20 +543,11 @@ def main():
         print(f"    Significant bins - excess: {result['significant_bins_excess']}, "
               f"deficit: {result['significant_bins_deficit']}")
 
-    # Generate synthetic null hypothesis catalogs
-    print(f"\n  Generating {N_SYNTHETIC} synthetic null hypothesis catalogs (energy-weighted)...")
-    synthetic_p_values, synthetic_cramers_v = run_synthetic_catalogs(df, energy, N_SYNTHETIC)
-
-    # Percentile rank analysis
-    print("\n  Percentile rank analysis:")
-    percentile_results = {}
-    for var in variables:
-        real_p = var_results[var]['chi_square_energy']['p_value']
-        pct = percentile_rank(real_p, synthetic_p_values[var])
-        percentile_results[f"{var}_real_p_percentile"] = round(pct, 2)
-        print(f"    {var}: real p-value at {pct:.1f}th percentile of synthetic distribution")
+    if null == 'analytic':
+        synthetic = analytic_null_hypothesis(real_stats, bin_counts, energy)
+    else:
+        synthetic = permutation_null_hypothesis(bins, energy, real_stats, n_synthetic, engine, store, adaptive)
 
-    # Assemble results
     results = {
         "sample_size": n,
         "total_energy": round(total_energy, 4),
@@ -247,25 +556,23 @@ def main():
         "x_val": var_results['x_val'],
         "y_val": var_results['y_val'],
         "z_val": var_results['z_val'],
-        "synthetic_null_hypothesis": {
-            "synthetic_catalogs_generated": N_SYNTHETIC,
-            "shuffling_method": "x_val, y_val, z_val randomized; a_val, v_val preserved",
-            "energy_weighting_applied": True,
-            "x_val_synthetic_p_values": [round(p, 6) for p in synthetic_p_values['x_val']],
-            "y_val_synthetic_p_values": [round(p, 6) for p in synthetic_p_values['y_val']],
-            "z_val_synthetic_p_values": [round(p, 6) for p in synthetic_p_values['z_val']],
-            "x_val_synthetic_cramers_v": [round(v, 6) for v in synthetic_cramers_v['x_val']],
-            "y_val_synthetic_cramers_v": [round(v, 6) for v in synthetic_cramers_v['y_val']],
-            "z_val_synthetic_cramers_v": [round(v, 6) for v in synthetic_cramers_v['z_val']],
-            "percentile_rank_analysis": percentile_results
-        }
+        "synthetic_null_hypothesis": synthetic
     }
+    return results
+
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, 'w') as f:
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
         json.dump(results, f, indent=2)
+    print(f"\nResults written to {path}")
+
 
-    print(f"\nResults written to {OUTPUT_PATH}")
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(n_synthetic=args.n_synthetic, engine=args.engine, store=args.store, adaptive=args.adaptive,
+                  null=args.null)
+    write_results(results)
 
 
 if __name__ == '__main__':
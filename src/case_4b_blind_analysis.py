@@ -2,16 +2,30 @@
 Case 4B: Energy-Weighted Clustering Patterns - Stratified Population (Blind Study - Approach Two)
 Replicates Case 3B stratified analysis but weights by energy proxy (10^(1.5 * v_val))
 instead of event count. Tests whether energy-based clustering patterns persist
-across v_val subpopulations.
+across v_val subpopulations: v_val quartiles, or any quantile, edge or
+composite stratification (see stratification). Runs on the raw records or on their count cube
+(see count_cube), where a stratum is a slice of v_val codes.
 Outputs results to output/case_4b_results_blind.json.
 """
 
+import argparse
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
-import pandas as pd
 from scipy import stats
 
+from catalog_store import INLINE_SYNTHETIC_LIMIT, CatalogStore, array_digest
+from contingency_tables import level_table, patefield_tables, weighted_column_sums
+from data_store import load_records
+from energy_null import NULL_MODES, analytic_null
+from histogram_kernels import bin_index_block, equal_width_bin_indices, stratified_bincount, weighted_bincount
+from rng_streams import CATALOG_CHUNK_SIZE, catalog_chunks, chunk_rng
+from sequential_mc import CONFIDENCE, STOPPING_RULES, rank_summary, sequential_rank
+from stratification import DEFAULT_SPEC, parse_spec, stratify
+from synthetic_ranks import exceedances, log10_p_value, p_values
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_4b_results_blind.json')
 CASE_3B_RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_3b_results_blind.json')
@@ -20,10 +34,11 @@ CASE_4A_RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', '
 N_BINS = 16
 N_SYNTHETIC = 100
 ALPHA = 0.05
+CASE_KEY = 'case_4b'
 
 
 def load_data(path=DATA_PATH):
-    df = pd.read_csv(path)
+    df = load_records(path)
     print(f"  Loaded {len(df)} records from {path}")
     return df
 
@@ -33,33 +48,72 @@ def calculate_energy(v_vals):
     return np.power(10, 1.5 * v_vals)
 
 
-def create_strata(df):
-    """Stratify by v_val quartiles (4 groups), same as Case 3B."""
-    quartiles = df['v_val'].quantile([0.25, 0.50, 0.75]).values
-    conditions = [
-        df['v_val'] <= quartiles[0],
-        (df['v_val'] > quartiles[0]) & (df['v_val'] <= quartiles[1]),
-        (df['v_val'] > quartiles[1]) & (df['v_val'] <= quartiles[2]),
-        df['v_val'] > quartiles[2],
-    ]
-    labels = ['group_1_0_25pct', 'group_2_25_50pct', 'group_3_50_75pct', 'group_4_75_100pct']
-    strata = {}
-    for label, cond in zip(labels, conditions):
-        strata[label] = df[cond].copy()
-    return strata, quartiles
+def create_strata(df, spec=DEFAULT_SPEC):
+    """Stratify the records by spec, v_val quartiles (4 groups) by default, same
+    as Case 3B (see stratification): the Strata holding each record's stratum index."""
+    return stratify(df, spec)
+
+
+def create_cube_strata(cube, spec=DEFAULT_SPEC):
+    """create_strata on a CountCube: quantiles from the v_val code counts, each
+    record being a v_val code. Cube strata select v_val codes, so only v_val keys apply."""
+    if any(column != 'v_val' for column, *_ in parse_spec(spec)):
+        raise ValueError(f"Strata of a count cube can only use v_val keys, not {spec!r}")
+    return stratify({'v_val': cube.v_values}, spec, counts=cube.v_counts())
+
+
+def stratum_summaries(df, energy, strata, max_vals):
+    """Size, v_val range, record energies, and per variable the (values, bin
+    indices) pair and energy per bin of every stratum, keyed by label. The
+    energy per bin of all strata and variables comes from one
+    stratified_bincount over the records, with the same compensated sums as
+    binning each stratum alone; strata are index arrays into df, never copies of it."""
+    variables = list(max_vals)
+    columns = [df[var].values for var in variables]
+    bin_block = bin_index_block(columns, [max_vals[var] for var in variables], N_BINS)
+    _, energy_per_bin = stratified_bincount(strata.codes, bin_block, strata.n_strata, N_BINS,
+                                            weights=energy, summation='kahan')
+    v_vals = df['v_val'].values
+    summaries = {}
+    for s_idx, (label, members) in enumerate(zip(strata.labels, strata.members())):
+        stratum_v = v_vals[members]
+        summaries[label] = {
+            "n": len(members),
+            "v_range": (float(stratum_v.min()), float(stratum_v.max())) if len(members) else (np.nan, np.nan),
+            "energy": energy[members],
+            "bins": {var: (columns[j][members], bin_block[j, members]) for j, var in enumerate(variables)},
+            "energy_per_bin": {var: energy_per_bin[s_idx, j] for j, var in enumerate(variables)},
+        }
+    return summaries
+
+
+def cube_stratum_summary(cube, v_select, v_energy, max_vals):
+    """stratum_summary for the v_val codes selected from a CountCube. The
+    records are rebuilt from the cube in (a_val, v_val) cell order, the same
+    for every variable, so one energy array pairs with all three; raw values
+    are not available and are None."""
+    bins = {}
+    for var in max_vals:
+        bin_indices, v_codes = cube.expand(var, v_select)
+        bins[var] = (None, bin_indices)
+    present = cube.v_values[cube.v_counts(v_select) > 0]
+    return {
+        "n": int(cube.v_counts(v_select).sum()),
+        "v_range": (float(present.min()), float(present.max())) if len(present) else (np.nan, np.nan),
+        "energy": v_energy[v_codes],
+        "bins": bins,
+        "energy_per_bin": {var: cube.weighted_bin_sums(var, v_energy, v_select) for var in max_vals},
+    }
 
 
-def bin_energy(values, energy, max_val, n_bins=N_BINS):
+def bin_energy(values, energy, max_val, n_bins=N_BINS, summation='kahan'):
     """Bin values into n_bins equal-width bins using FULL DATASET max for consistency.
-    Returns energy sum per bin instead of count."""
+    Returns energy sum per bin instead of count, accumulated in one pass
+    with compensated summation by default."""
     bin_size = max_val / n_bins
     bin_edges = np.array([i * bin_size for i in range(n_bins + 1)])
-    bin_indices = np.minimum(np.floor(values / bin_size).astype(int), n_bins - 1)
-
-    energy_per_bin = np.zeros(n_bins)
-    for i in range(n_bins):
-        mask = bin_indices == i
-        energy_per_bin[i] = np.sum(energy[mask])
+    bin_indices = equal_width_bin_indices(values, max_val, n_bins)
+    energy_per_bin = weighted_bincount(bin_indices, energy, n_bins, summation=summation)
 
     return energy_per_bin, bin_edges, bin_size, bin_indices
 
@@ -73,6 +127,14 @@ def chi_square_energy(observed_energy):
     return float(stat), float(p_value), dof
 
 
+def chi_square_energy_batch(observed_energy):
+    """Row-wise chi-square statistic on a (n_catalogs, n_bins) energy array.
+    No p-values: synthetic catalogs are ranked on the statistic (see synthetic_ranks)."""
+    k = observed_energy.shape[1]
+    expected = observed_energy.sum(axis=1) / k
+    return np.sum((observed_energy - expected[:, None]) ** 2 / expected[:, None], axis=1)
+
+
 def cramers_v(chi2_stat, n, k):
     """Cramér's V = sqrt(chi2 / (n * (k - 1))).
     Based on COUNT (n = number of events), not energy, for comparability."""
@@ -93,7 +155,13 @@ def identify_significant_bins(residuals, threshold=2.0):
 
 def analyze_variable_energy_in_stratum(values, energy, max_val, n_events):
     """Run energy-weighted clustering analysis on a single variable within a stratum."""
-    energy_per_bin, bin_edges, bin_size, bin_indices = bin_energy(values, energy, max_val)
+    return analyze_energy_in_stratum(bin_energy(values, energy, max_val)[0], max_val, n_events)
+
+
+def analyze_energy_in_stratum(energy_per_bin, max_val, n_events):
+    """analyze_variable_energy_in_stratum from the variable's energy per [0, max_val] bin."""
+    bin_size = max_val / N_BINS
+    bin_edges = np.array([i * bin_size for i in range(N_BINS + 1)])
     total_energy = float(np.sum(energy_per_bin))
     expected_energy = total_energy / N_BINS
 
@@ -108,6 +176,7 @@ def analyze_variable_energy_in_stratum(values, energy, max_val, n_events):
     return {
         "chi_square": round(chi2_stat, 4),
         "p_value": chi2_p,
+        "log10_p_value": round(log10_p_value(chi2_stat, dof), 4),
         "degrees_of_freedom": dof,
         "cramers_v": round(v, 6),
         "verdict": verdict,
@@ -141,92 +210,258 @@ def load_comparison_results():
     return case_3b, case_4a
 
 
-def run_synthetic_catalogs_stratum(stratum_df, energy, max_vals, n_synthetic=N_SYNTHETIC):
+def synthetic_chunk_statistics(values, bin_indices, energy, max_val, n_catalogs, rng, engine='permute',
+                               table=None):
+    """Energy-weighted chi-square statistics of n_catalogs shuffled catalogs for one variable.
+
+    A value's bin does not change under a permutation, only its pairing with
+    energy does, so engine='permute' (default) permutes the precomputed
+    bin_indices against the fixed energies with one weighted bincount per
+    catalog, and engine='batch' builds a (n_catalogs, n_records) matrix of
+    permuted index arrays and bins it in a single weighted_bincount call.
+    engine='loop' is the original implementation that rebins every shuffled
+    column; it draws the same permutations as engine='permute', and needs the
+    raw values.
+
+    engine='patefield' samples the catalog's (energy level, bin) table directly
+    from its fixed margins (see contingency_tables): same null distribution,
+    cost per catalog independent of n_records. table is the observed
+    level_table(energy, bin_indices), computed here if not given."""
+    n_records = len(energy)
+    if engine == 'patefield':
+        levels, observed = table if table is not None else level_table(energy, bin_indices, N_BINS)
+        tables = patefield_tables(observed.sum(axis=1), observed.sum(axis=0), n_catalogs, rng)
+        return chi_square_energy_batch(weighted_column_sums(tables, levels))
+    if engine == 'loop':
+        if values is None:
+            raise ValueError("engine='loop' rebins the raw values and cannot run on a count cube")
+        chi2_stats = np.empty(n_catalogs)
+        for i in range(n_catalogs):
+            shuffled_values = rng.permutation(values)
+            energy_per_bin, _, _, _ = bin_energy(shuffled_values, energy, max_val)
+            chi2_stats[i], _, _ = chi_square_energy(energy_per_bin)
+        return chi2_stats
+    if engine == 'permute':
+        energy_per_bin = np.empty((n_catalogs, N_BINS))
+        for i in range(n_catalogs):
+            perm = rng.permutation(n_records)
+            energy_per_bin[i] = weighted_bincount(bin_indices[perm], energy, N_BINS)
+    elif engine == 'batch':
+        perms = rng.permuted(np.tile(np.arange(n_records), (n_catalogs, 1)), axis=1)
+        energy_per_bin = weighted_bincount(bin_indices[perms], energy, N_BINS)
+    else:
+        raise ValueError(f"Unknown synthetic engine: {engine}")
+    return chi_square_energy_batch(energy_per_bin)
+
+
+def run_synthetic_unit(values, energy, max_val, n_synthetic, stratum, var, engine='permute',
+                       store=None, adaptive=None, real_stat=None, chunk_size=CATALOG_CHUNK_SIZE,
+                       bin_indices=None):
+    """Synthetic null chi-square statistics for one (stratum, variable) unit. Each chunk of
+    catalogs draws from its own keyed stream (see rng_streams), so the result
+    does not depend on which other units run, where, or in what order.
+
+    With store set, the catalogs are streamed to (and resumed from) a
+    CatalogStore under that directory, which is returned instead of the array.
+    With adaptive set to a sequential_mc stopping rule, chunks are drawn only
+    until the percentile rank of the real statistic real_stat is settled, and the sequential_rank
+    result is returned instead.
+    bin_indices are computed from values unless given; on a count cube values
+    is None and the unit runs on bin_indices alone."""
+    if bin_indices is None:
+        bin_indices = equal_width_bin_indices(values, max_val, N_BINS)
+    table = level_table(energy, bin_indices, N_BINS) if engine == 'patefield' else None
+    chunk_statistics = partial(synthetic_chunk_statistics, values, bin_indices, energy, max_val, engine=engine,
+                               table=table)
+    unit = None
+    if store is not None:
+        config = {"engine": engine, "n_records": len(energy), "max_val": float(max_val),
+                  "data_sha256": array_digest(values if values is not None else bin_indices, energy)}
+        unit = CatalogStore(store, CASE_KEY, stratum, var, config, chunk_size)
+    if adaptive is not None:
+        if unit is None:
+            chunks = (chunk_statistics(stop - start, chunk_rng(CASE_KEY, stratum, var, k))
+                      for k, start, stop in catalog_chunks(n_synthetic, chunk_size))
+        else:
+            chunks = (unit.chunk(k, stop - start, chunk_statistics)
+                      for k, start, stop in catalog_chunks(n_synthetic, chunk_size))
+        return sequential_rank(chunks, real_stat, alpha=ALPHA, rule=adaptive)
+    if unit is not None:
+        unit.fill(n_synthetic, chunk_statistics)
+        return unit
+    return np.concatenate([
+        chunk_statistics(stop - start, chunk_rng(CASE_KEY, stratum, var, k))
+        for k, start, stop in catalog_chunks(n_synthetic, chunk_size)
+    ])
+
+
+def run_synthetic_units(units, workers=1):
+    """Run run_synthetic_unit for each (args, kwargs) pair in units, in a process
+    pool when workers > 1. Results come back in the order of units."""
+    if workers <= 1:
+        return [run_synthetic_unit(*args, **kwargs) for args, kwargs in units]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_synthetic_unit, *args, **kwargs) for args, kwargs in units]
+        return [future.result() for future in futures]
+
+
+def run_synthetic_catalogs_stratum(stratum_df, energy, max_vals, n_synthetic=N_SYNTHETIC,
+                                   engine='permute', stratum=1):
     """Generate synthetic null catalogs for a single stratum (energy-weighted).
     Shuffles x_val, y_val, z_val within the stratum while keeping
     a_val and v_val (and thus energy) in original order."""
-    variables = ['x_val', 'y_val', 'z_val']
-    rng = np.random.default_rng(seed=42)
-    n_records = len(stratum_df)
-
-    synthetic_p_values = {var: [] for var in variables}
+    return {
+        var: run_synthetic_unit(stratum_df[var].values, energy, max_vals[var], n_synthetic,
+                                stratum, var, engine=engine)
+        for var in max_vals
+    }
 
-    for i in range(n_synthetic):
-        for var in variables:
-            shuffled_values = rng.permutation(stratum_df[var].values)
-            energy_per_bin, _, _, _ = bin_energy(shuffled_values, energy, max_vals[var])
-            _, chi2_p, _ = chi_square_energy(energy_per_bin)
-            synthetic_p_values[var].append(chi2_p)
 
-    return synthetic_p_values
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Case 4B energy-weighted stratified clustering analysis (blind study)")
+    parser.add_argument('--n-synthetic', type=int, default=N_SYNTHETIC,
+                        help=f"number of synthetic null catalogs per stratum (default {N_SYNTHETIC})")
+    parser.add_argument('--engine', choices=['permute', 'batch', 'patefield', 'loop'], default='permute',
+                        help="synthetic catalog engine (default permute)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes for the (stratum, variable) synthetic units (default 1)")
+    parser.add_argument('--store', metavar='DIR',
+                        help="stream synthetic catalogs to a resumable on-disk store under DIR")
+    parser.add_argument('--adaptive', choices=STOPPING_RULES,
+                        help="stop generating catalogs per unit once the percentile is settled; "
+                             "--n-synthetic becomes the cap")
+    parser.add_argument('--null', choices=NULL_MODES, default='permutation',
+                        help="permutation: rank against synthetic catalogs (default); analytic: "
+                             "moment-matched closed-form permutation null, no catalogs generated; "
+                             "approximate: on the real population 5-13 percentile points above the "
+                             "Monte Carlo rank mid-distribution, up to 2 points below it (anti-conservative) "
+                             "in the 10%%-1%% tail")
+    parser.add_argument('--strata', default=DEFAULT_SPEC, metavar='SPEC',
+                        help=f"stratification spec, e.g. v_val:q10, v_val:e6.0,6.5 or v_val:q4*a_val:e1980,2000 "
+                             f"(default {DEFAULT_SPEC}, v_val quartiles; see stratification)")
+    args = parser.parse_args(argv)
+    if args.null == 'analytic' and (args.store or args.adaptive):
+        parser.error("--store and --adaptive apply to the permutation null only")
+    return args
+
+
+def run(df=None, case_3b=None, case_4a=None, n_synthetic=N_SYNTHETIC, engine='permute', workers=1,
+        store=None, adaptive=None, null='permutation', cube=None, strata=DEFAULT_SPEC):
+    """Run the Case 4B energy-weighted stratified analysis and return the results dict.
+    case_3b and case_4a are the upstream results dicts; any omitted are read from output/.
+    strata is the stratification spec (see stratification), v_val quartiles by
+    default; strata are compared to Case 3B's only if it used the same spec.
+    Synthetic catalogs for the (stratum, variable) units run on up to
+    workers processes; results are identical for any worker count.
+    With store set, they are streamed to a resumable CatalogStore under that directory.
+    With adaptive set to a sequential_mc stopping rule, each unit draws catalogs
+    only until its percentile rank is settled, up to n_synthetic.
+    With null='analytic', no catalogs are generated: percentiles come from the
+    moment-matched closed-form permutation null (see energy_null).
+    With a CountCube the records themselves are never read; the permutation
+    null then shuffles the cube's (bin, v_val) records, which are not in file
+    order, so its catalogs differ from the raw run's while following the same
+    null distribution."""
+    print("Case 4B: Energy-Weighted Clustering Patterns - Stratified Population (Blind Study)")
+    print("=" * 82)
 
+    variables = ['x_val', 'y_val', 'z_val']
+    if cube is not None:
+        n_total = cube.n_records
 
-def percentile_rank(real_value, synthetic_values):
-    """Percentile rank of real_value in synthetic distribution."""
-    arr = np.array(synthetic_values)
-    return float(np.sum(arr <= real_value) / len(arr) * 100)
+        # Verify all v_val > 0
+        assert (cube.v_values[cube.v_counts() > 0] > 0).all(), \
+            "All v_val values must be > 0 for energy calculation"
 
+        # Get full-dataset max values for consistent binning (same as Case 3B)
+        max_vals = {var: float(cube.extrema(var)[1]) for var in variables}
 
-def main():
-    print("Case 4B: Energy-Weighted Clustering Patterns - Stratified Population (Blind Study)")
-    print("=" * 82)
+        # Calculate energy once per v_val code
+        v_energy = calculate_energy(cube.v_values)
+        total_energy_all = float(np.sum(v_energy * cube.v_counts()))
 
-    df = load_data()
-    n_total = len(df)
-    variables = ['x_val', 'y_val', 'z_val']
+        # Create strata
+        stratification = create_cube_strata(cube, strata)
+        summaries = {label: cube_stratum_summary(cube, stratification.codes == s_idx, v_energy, max_vals)
+                     for s_idx, label in enumerate(stratification.labels)}
+    else:
+        if df is None:
+            df = load_data()
+        n_total = len(df)
 
-    # Verify all v_val > 0
-    assert (df['v_val'] > 0).all(), "All v_val values must be > 0 for energy calculation"
+        # Verify all v_val > 0
+        assert (df['v_val'] > 0).all(), "All v_val values must be > 0 for energy calculation"
 
-    # Get full-dataset max values for consistent binning (same as Case 3B)
-    max_vals = {var: float(np.max(df[var].values)) for var in variables}
+        # Get full-dataset max values for consistent binning (same as Case 3B)
+        max_vals = {var: float(np.max(df[var].values)) for var in variables}
 
-    # Calculate energy for ALL records
-    df['energy'] = calculate_energy(df['v_val'].values)
-    total_energy_all = float(df['energy'].sum())
+        # Calculate energy for ALL records
+        energy = calculate_energy(df['v_val'].values)
+        total_energy_all = float(np.sum(energy))
 
-    # Create strata
-    strata, quartiles = create_strata(df)
+        # Create strata, binning all strata and variables in one pass
+        stratification = create_strata(df, strata)
+        summaries = stratum_summaries(df, energy, stratification, max_vals)
 
     print(f"\n  Total records: {n_total}")
     print(f"  Total energy: {total_energy_all:.4e}")
-    print(f"  v_val quartiles: {[round(float(q), 4) for q in quartiles]}")
+    print(f"  Stratification: {stratification.description}")
+    for column, edges in stratification.edges.items():
+        print(f"  {column} edges: {[round(float(e), 4) for e in edges]}")
     print(f"  Full dataset max values: {max_vals}")
 
     stratum_sizes = {}
     stratum_energies = {}
-    for label, sdf in strata.items():
-        stratum_sizes[label] = len(sdf)
-        stratum_energies[label] = round(float(sdf['energy'].sum()), 4)
-        print(f"  {label}: {len(sdf)} records, energy={sdf['energy'].sum():.4e}")
+    for label, summary in summaries.items():
+        stratum_sizes[label] = summary['n']
+        stratum_energies[label] = round(float(summary['energy'].sum()), 4)
+        print(f"  {label}: {summary['n']} records, energy={summary['energy'].sum():.4e}")
 
     # Verify group sizes
     for label, size in stratum_sizes.items():
         assert size >= 100, f"Stratum {label} has only {size} records (< 100)"
 
     # Load comparison results
-    case_3b, case_4a = load_comparison_results()
+    if case_3b is None or case_4a is None:
+        loaded_3b, loaded_4a = load_comparison_results()
+        case_3b = case_3b if case_3b is not None else loaded_3b
+        case_4a = case_4a if case_4a is not None else loaded_4a
+    if case_3b and case_3b.get('strata_spec', DEFAULT_SPEC) != strata:
+        print(f"  Case 3B used strata {case_3b.get('strata_spec', DEFAULT_SPEC)}, not {strata}: "
+              f"no per-stratum comparison")
+        case_3b = None
+    elif case_3b and 'stratum_boundaries' in case_3b:
+        print("  Case 3B used sketched stratum edges: no per-stratum comparison")
+        case_3b = None
 
     results = {
-        "stratification": "v_val quartiles (4 groups)",
+        "stratification": stratification.description,
         "total_sample_size": n_total,
         "energy_calculation": "energy = 10^(1.5 * v_val)",
-        "v_val_quartiles": [round(float(q), 4) for q in quartiles],
-        "full_dataset_max_values": {var: round(max_vals[var], 4) for var in variables},
-        "stratum_sizes": stratum_sizes,
-        "stratum_total_energies": stratum_energies,
     }
-
-    stratum_labels = list(strata.keys())
-    stratum_nums = ['stratum_1', 'stratum_2', 'stratum_3', 'stratum_4']
+    if strata == DEFAULT_SPEC:
+        results["v_val_quartiles"] = [round(float(q), 4) for q in stratification.edges['v_val']]
+    else:
+        results["strata_spec"] = strata
+        results["stratum_labels"] = stratification.labels
+        results["stratum_edges"] = {column: [round(float(e), 4) for e in edges]
+                                    for column, edges in stratification.edges.items()}
+    results["full_dataset_max_values"] = {var: round(max_vals[var], 4) for var in variables}
+    results["stratum_sizes"] = stratum_sizes
+    results["stratum_total_energies"] = stratum_energies
+
+    stratum_labels = stratification.labels
+    stratum_nums = [f"stratum_{i + 1}" for i in range(stratification.n_strata)]
+    units = []
+    real_stats = {}
 
     for s_num, s_label in zip(stratum_nums, stratum_labels):
-        sdf = strata[s_label]
-        v_min = float(sdf['v_val'].min())
-        v_max = float(sdf['v_val'].max())
-        stratum_energy = sdf['energy'].values
+        summary = summaries[s_label]
+        v_min, v_max = summary['v_range']
+        stratum_energy = summary['energy']
         stratum_total_energy = float(np.sum(stratum_energy))
-        n_stratum = len(sdf)
+        n_stratum = summary['n']
 
         print(f"\n  Analyzing {s_num} ({s_label}, n={n_stratum}, energy={stratum_total_energy:.4e})...")
 
@@ -243,9 +478,7 @@ def main():
 
         # Analyze each variable (energy-weighted)
         for var in variables:
-            var_result = analyze_variable_energy_in_stratum(
-                sdf[var].values, stratum_energy, max_vals[var], n_stratum
-            )
+            var_result = analyze_energy_in_stratum(summary['energy_per_bin'][var], max_vals[var], n_stratum)
 
             # Comparison to Case 4A (full population)
             if case_4a and var in case_4a:
@@ -270,20 +503,74 @@ def main():
                   f"p={var_result['p_value']:.6e}, V={var_result['cramers_v']}, "
                   f"verdict={var_result['verdict']}")
             stratum_result[var] = var_result
-
-        # Synthetic catalogs for this stratum (energy-weighted)
-        print(f"    Generating {N_SYNTHETIC} synthetic catalogs (energy-weighted)...")
-        synthetic_p = run_synthetic_catalogs_stratum(sdf, stratum_energy, max_vals)
-
-        for var in variables:
-            real_p = stratum_result[var]['p_value']
-            pct = percentile_rank(real_p, synthetic_p[var])
-            stratum_result[var]['synthetic_percentile'] = round(pct, 2)
-            stratum_result[var]['synthetic_p_values'] = [round(p, 6) for p in synthetic_p[var]]
-            print(f"    {var}: real p at {pct:.1f}th percentile of synthetic")
+            # Unrounded statistic, for ranking against the null
+            values, bin_indices = summary['bins'][var]
+            real_stats[(s_num, var)], _, _ = chi_square_energy(summary['energy_per_bin'][var])
+            var_result['real_chi_square'] = float(real_stats[(s_num, var)])
+            if null == 'analytic':
+                fit = analytic_null(real_stats[(s_num, var)], np.bincount(bin_indices, minlength=N_BINS),
+                                    stratum_energy)
+                var_result['synthetic_percentile'] = round(fit['percentile'], 2)
+                var_result['synthetic_log10_percentile'] = (
+                    round(fit['log10_percentile'], 4) if fit['log10_percentile'] is not None else None)
+                var_result['null_fit'] = {
+                    "mean": fit['mean'], "variance": fit['variance'], "scale": fit['scale'], "dof": fit['dof']}
+                print(f"    {var}: real p at {fit['percentile']:.1f}th percentile of the analytic "
+                      f"permutation null")
+                continue
+            units.append((
+                (values, stratum_energy, max_vals[var], n_synthetic, s_idx, var),
+                {'engine': engine, 'store': store, 'adaptive': adaptive,
+                 'real_stat': real_stats[(s_num, var)], 'bin_indices': bin_indices},
+            ))
 
         results[s_num] = stratum_result
 
+    if null == 'analytic':
+        results["null_model"] = "analytic: scaled chi-square matched to the exact permutation mean and variance"
+    else:
+        # Synthetic catalogs for every (stratum, variable) unit (energy-weighted)
+        cap = f"up to {n_synthetic} ({adaptive} stopping)" if adaptive else f"{n_synthetic}"
+        print(f"\n  Generating {cap} synthetic catalogs per stratum and variable "
+              f"(energy-weighted, {engine} engine, {len(units)} units, "
+              f"{workers} worker{'s' if workers != 1 else ''})...")
+        unit_results = iter(run_synthetic_units(units, workers))
+
+        # Percentile ranks are counted on the chi-square statistics (see synthetic_ranks)
+        for s_num in stratum_nums:
+            stratum_result = results[s_num]
+            for var in variables:
+                real_stat = real_stats[(s_num, var)]
+                synthetic_stats = None
+                if adaptive is not None:
+                    rank = next(unit_results)
+                    synthetic_stats = rank['statistics']
+                elif store is None:
+                    synthetic_stats = next(unit_results)
+                    rank = rank_summary(exceedances(synthetic_stats, real_stat), n_synthetic)
+                else:
+                    unit = next(unit_results)
+                    rank = rank_summary(unit.exceedances(real_stat, n_synthetic), n_synthetic)
+                    if n_synthetic <= INLINE_SYNTHETIC_LIMIT:
+                        synthetic_stats = unit.statistics(n_synthetic)
+                pct = rank['percentile']
+                synthetic_p = None
+                if synthetic_stats is not None:
+                    synthetic_p = p_values(synthetic_stats, N_BINS - 1).tolist()
+                stratum_result[var]['synthetic_percentile'] = round(pct, 2)
+                stratum_result[var]['synthetic_percentile_mc_error'] = round(rank['mc_error'], 2)
+                stratum_result[var]['synthetic_percentile_ci'] = [round(c, 2) for c in rank['ci']]
+                if adaptive is not None:
+                    stratum_result[var]['synthetic_catalogs_used'] = rank['n_catalogs']
+                if synthetic_p is not None:
+                    stratum_result[var]['synthetic_chi_square'] = np.asarray(synthetic_stats, dtype=float).tolist()
+                    stratum_result[var]['synthetic_p_values'] = [round(p, 6) for p in synthetic_p]
+                else:
+                    stratum_result[var]['synthetic_store'] = unit.path
+                print(f"    {s_num} {var}: real p at {pct:.1f}th percentile of synthetic "
+                      f"(MC error {rank['mc_error']:.2f}, {CONFIDENCE:.0%} CI "
+                      f"[{rank['ci'][0]:.2f}, {rank['ci'][1]:.2f}], {rank['n_catalogs']} catalogs)")
+
     # Comparative summary
     print("\n  Comparative Summary (Energy-Weighted):")
     comparative = {}
@@ -316,12 +603,21 @@ def main():
 
     results["comparative_summary"] = comparative
     print(f"    Interpretation: {comparative['interpretation']}")
+    return results
+
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, 'w') as f:
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
         json.dump(results, f, indent=2)
+    print(f"\nResults written to {path}")
+
 
-    print(f"\nResults written to {OUTPUT_PATH}")
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(n_synthetic=args.n_synthetic, engine=args.engine, workers=args.workers, store=args.store,
+                  adaptive=args.adaptive, null=args.null, strata=args.strata)
+    write_results(results)
 
 
 if __name__ == '__main__':
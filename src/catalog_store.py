@@ -0,0 +1,180 @@
+"""
+Catalog Store - Blind Study (Approach Two)
+Append-only on-disk store for long synthetic null runs (cases 3A, 3B, 4A, 4B).
+Each (case, stratum, variable) unit streams the chi-square statistic of every
+synthetic catalog to one .npy shard per catalog chunk, then appends a checkpoint
+line recording the chunk's RNG stream key. A killed run restarted on the same
+directory resumes after the last completed chunk, and percentile ranks are
+counted shard by shard without loading the whole run. Resume relies only on the
+keyed seeds: every chunk draws from its own chunk_rng stream, so a missing chunk
+is regenerated from scratch and no generator state is carried between chunks.
+
+Layout of one unit:
+    <root>/<case>/<stratum>/<variable>/manifest.json      run configuration
+    <root>/<case>/<stratum>/<variable>/checkpoint.jsonl   one line per completed chunk
+    <root>/<case>/<stratum>/<variable>/chunk_00000000.npy chi-square statistics
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+from rng_streams import CATALOG_CHUNK_SIZE, FULL_POPULATION, SEED, catalog_chunks, chunk_rng, stream_seed
+from synthetic_ranks import exceedance_threshold, p_values
+
+# Runs larger than this keep their synthetic p-values in the store only;
+# the results JSON then records the store path instead of the value lists.
+INLINE_SYNTHETIC_LIMIT = 10000
+
+
+def array_digest(*arrays):
+    """SHA-256 hex digest of the contents of one or more arrays."""
+    digest = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        digest.update(str(arr.dtype).encode('utf-8'))
+        digest.update(arr.tobytes())
+    return digest.hexdigest()
+
+
+def unit_path(root, case, stratum, variable):
+    """Directory of one (case, stratum, variable) unit under root."""
+    stratum_dir = 'population' if stratum == FULL_POPULATION else f"stratum_{stratum}"
+    return os.path.join(root, case, stratum_dir, variable)
+
+
+class CatalogStore:
+    """Synthetic chi-square statistics of one (case, stratum, variable) unit.
+
+    config describes everything the catalogs depend on besides the stream key
+    (engine, sample size, binning maximum, data digest, ...). Opening an
+    existing unit with a different config raises ValueError instead of mixing
+    catalogs from two runs. The number of catalogs is not part of the config:
+    because every chunk has its own keyed stream, a larger run extends a
+    smaller one."""
+
+    def __init__(self, root, case, stratum, variable, config, chunk_size=CATALOG_CHUNK_SIZE, seed=SEED):
+        self.case = case
+        self.stratum = stratum
+        self.variable = variable
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.path = unit_path(root, case, stratum, variable)
+        self.config = dict(config, chunk_size=chunk_size, seed=seed)
+        os.makedirs(self.path, exist_ok=True)
+        self._check_manifest()
+        self._completed = self.completed_chunks()
+
+    def _check_manifest(self):
+        manifest_path = os.path.join(self.path, 'manifest.json')
+        manifest = {"case": self.case, "stratum": self.stratum, "variable": self.variable,
+                    "config": self.config}
+        # Round-trip through JSON so tuples and numpy scalars compare like the stored copy
+        manifest = json.loads(json.dumps(manifest, default=float))
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                stored = json.load(f)
+            if stored != manifest:
+                raise ValueError(f"Catalog store {self.path} was written with a different "
+                                 f"configuration: {stored['config']} != {manifest['config']}")
+            return
+        fd, tmp_path = tempfile.mkstemp(suffix='.json', dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def _shard_path(self, chunk):
+        return os.path.join(self.path, f"chunk_{chunk:08d}.npy")
+
+    def completed_chunks(self):
+        """{chunk index: catalogs stored} for every checkpointed chunk whose shard exists.
+        A partially written final checkpoint line (crash mid-append) is ignored."""
+        completed = {}
+        try:
+            with open(os.path.join(self.path, 'checkpoint.jsonl'), 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if os.path.exists(self._shard_path(entry['chunk'])):
+                        completed[entry['chunk']] = entry['catalogs']
+        except FileNotFoundError:
+            pass
+        return completed
+
+    def append_chunk(self, chunk, statistics):
+        """Write one chunk's statistics, then checkpoint it with its stream key."""
+        statistics = np.asarray(statistics, dtype=float)
+        fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=self.path)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, statistics)
+        os.replace(tmp_path, self._shard_path(chunk))
+
+        seed_seq = stream_seed(self.case, self.stratum, self.variable, chunk, self.seed)
+        entry = {
+            "chunk": chunk,
+            "catalogs": len(statistics),
+            "entropy": seed_seq.entropy,
+            "spawn_key": list(seed_seq.spawn_key),
+        }
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        with open(os.path.join(self.path, 'checkpoint.jsonl'), 'ab+') as f:
+            # Start on a fresh line if an interrupted run left a partial one
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    line = b'\n' + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._completed[chunk] = len(statistics)
+
+    def _generate(self, chunk, n_catalogs, chunk_statistics):
+        rng = chunk_rng(self.case, self.stratum, self.variable, chunk, self.seed)
+        self.append_chunk(chunk, chunk_statistics(n_catalogs, rng))
+
+    def chunk(self, chunk, n_catalogs, chunk_statistics):
+        """Statistics of the first n_catalogs catalogs of one chunk, generating and
+        checkpointing the chunk first if it is not stored yet."""
+        if self._completed.get(chunk, 0) < n_catalogs:
+            self._generate(chunk, n_catalogs, chunk_statistics)
+        return np.load(self._shard_path(chunk), mmap_mode='r')[:n_catalogs]
+
+    def fill(self, n_synthetic, chunk_statistics):
+        """Generate every chunk of the first n_synthetic catalogs not already stored.
+        chunk_statistics(n_catalogs, rng) returns that chunk's chi-square statistics.
+        Returns the number of chunks generated by this call."""
+        completed = self.completed_chunks()
+        generated = 0
+        for k, start, stop in catalog_chunks(n_synthetic, self.chunk_size):
+            if completed.get(k, 0) >= stop - start:
+                continue
+            self._generate(k, stop - start, chunk_statistics)
+            generated += 1
+        return generated
+
+    def iter_statistics(self, n_synthetic):
+        """Memory-mapped statistics of the first n_synthetic catalogs, one chunk at a time."""
+        completed = self.completed_chunks()
+        for k, start, stop in catalog_chunks(n_synthetic, self.chunk_size):
+            if completed.get(k, 0) < stop - start:
+                raise ValueError(f"Catalog store {self.path} is missing chunk {k}; run fill() first")
+            yield np.load(self._shard_path(k), mmap_mode='r')[:stop - start]
+
+    def statistics(self, n_synthetic):
+        """Statistics of the first n_synthetic catalogs as one array."""
+        return np.concatenate(list(self.iter_statistics(n_synthetic)) or [np.empty(0)])
+
+    def p_values(self, n_synthetic, dof):
+        """Chi-square p-values of the first n_synthetic catalogs, for reporting."""
+        return p_values(self.statistics(n_synthetic), dof)
+
+    def exceedances(self, real_stat, n_synthetic):
+        """Number of the first n_synthetic catalogs at least as extreme as real_stat
+        (see synthetic_ranks), counted chunk by chunk."""
+        threshold = exceedance_threshold(real_stat)
+        return sum(int(np.count_nonzero(chunk >= threshold))
+                   for chunk in self.iter_statistics(n_synthetic))
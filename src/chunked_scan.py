@@ -0,0 +1,276 @@
+"""
+Chunked Scan - Blind Study (Approach Two)
+Out-of-core execution of Cases 0, 1 and 3A. The record columns are read block
+by block from the memory-mapped columnar cache (see data_store), so memory
+holds one block and its temporaries whatever the number of records:
+    pass 1   count, missing values, min, max and sum of every column, and
+             exact value counts (a_val)
+    pass 2   sums of squared deviations from the mean; [0, max] and
+             [min, max] bin counts and Rayleigh cos/sin sums of the binned
+             variables; a fine histogram locating every median
+    pass 3   (medians only) the distinct values in the histogram buckets of
+             the middle order statistics
+The results are those of the in-memory path exactly, not approximately.
+Integer sums are exact. Float sums (means of float columns, squared
+deviations, Rayleigh sums) are added up along numpy's own pairwise summation
+tree: blocks are nodes of that tree, at most block_rows records each, and
+their sums are combined as np.sum would combine them, so they match np.sum
+over the whole column bit for bit (see pairwise_blocks).
+
+A RecordScan answers the queries Cases 1 and 3A put to a CountCube (extrema,
+bin_counts, rayleigh_sums), so their cube code runs on it unchanged; Case 0
+reads its descriptive statistics. The block size follows from a memory limit
+(see block_rows_for).
+"""
+
+import numpy as np
+
+from histogram_kernels import equal_width_bin_indices
+
+N_BINS = 16
+BIN_VARIABLES = ('x_val', 'y_val', 'z_val')
+# numpy sums runs of at most 128 values without splitting them (PW_BLOCKSIZE)
+PAIRWISE_LEAF = 128
+MEDIAN_BUCKETS = 1 << 16
+# Working set per record of a block: the column, its angles, cos and sin,
+# bin indices and masks, all 8 bytes wide
+WORKING_BYTES_PER_ROW = 64
+MIN_BLOCK_ROWS = 1 << 10
+SCAN_BLOCK_ROWS = 1 << 20
+MEMORY_UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_memory_limit(text):
+    """Bytes in a size such as 512M, 2G, 1.5GB or 100000000 (binary units)."""
+    size = text.strip().upper().removesuffix('B')
+    try:
+        if size[-1:] in MEMORY_UNITS:
+            return int(float(size[:-1]) * MEMORY_UNITS[size[-1]])
+        return int(size)
+    except ValueError:
+        raise ValueError(f"Invalid memory limit {text!r}: expected bytes or a size such as 512M or 2G") from None
+
+
+def block_rows_for(memory_limit):
+    """Records per block of a scan held within memory_limit bytes."""
+    return max(MIN_BLOCK_ROWS, int(memory_limit) // WORKING_BYTES_PER_ROW)
+
+
+def _pairwise_split(n, block_rows):
+    """Length of the left half where numpy's pairwise sum splits n values,
+    or None if they form one block."""
+    if n <= max(block_rows, PAIRWISE_LEAF):
+        return None
+    half = n // 2
+    return half - half % 8
+
+
+def pairwise_blocks(n_rows, block_rows):
+    """(start, stop) of the blocks of a scan: the nodes of numpy's pairwise
+    summation tree over n_rows values that hold at most block_rows, in order."""
+    blocks = []
+
+    def visit(start, n):
+        half = _pairwise_split(n, block_rows)
+        if half is None:
+            blocks.append((start, start + n))
+        else:
+            visit(start, half)
+            visit(start + half, n - half)
+    visit(0, n_rows)
+    return blocks
+
+
+def pairwise_sum(block_sums, n_rows, block_rows):
+    """np.sum of a column of n_rows values from the np.sum of each of its
+    pairwise_blocks, added in the order of numpy's tree."""
+    sums = iter(block_sums)
+
+    def visit(n):
+        half = _pairwise_split(n, block_rows)
+        if half is None:
+            return next(sums)
+        left = visit(half)
+        return left + visit(n - half)
+    return visit(n_rows)
+
+
+def _merge_value_counts(values, counts, block_values, block_counts):
+    values, inverse = np.unique(np.concatenate([values, block_values]), return_inverse=True)
+    return values, np.bincount(inverse, weights=np.concatenate([counts, block_counts])).astype(np.int64)
+
+
+class RecordScan:
+    """Statistics of the record columns gathered by scan_records."""
+
+    def __init__(self, n_records, stats):
+        self.n_records = n_records
+        self._stats = stats
+
+    def count(self, col):
+        return self._stats[col]['count']
+
+    def missing(self, col):
+        return self._stats[col]['missing']
+
+    def extrema(self, col):
+        stats = self._stats[col]
+        return float(stats['min']), float(stats['max'])
+
+    def mean(self, col):
+        return self._stats[col]['mean']
+
+    def std(self, col):
+        """Sample standard deviation (ddof=1), as pandas' Series.std."""
+        stats = self._stats[col]
+        return np.sqrt(stats['m2'] / (stats['count'] - 1))
+
+    def median(self, col):
+        return self._stats[col]['median']
+
+    def value_counts(self, col):
+        """Sorted distinct values of col and their counts."""
+        return self._stats[col]['values'], self._stats[col]['value_counts']
+
+    def bin_counts(self, var, binning='zero_max'):
+        """[0, max] (cases 3A, 3B, 4A, 4B) or [min, max] ('range', case 1) bin counts."""
+        return self._stats[var]['counts' if binning == 'zero_max' else 'range_counts']
+
+    def rayleigh_sums(self, var):
+        """(sum cos, sum sin, n) of the values mapped onto [0, 2 pi] over [min, max]."""
+        stats = self._stats[var]
+        return stats['cos'], stats['sin'], stats['count']
+
+
+def _valid(values):
+    """Non-NaN values of a block, and the block with NaNs zeroed (as pandas sums it)."""
+    if values.dtype.kind != 'f':
+        return values, values
+    missing = np.isnan(values)
+    if not missing.any():
+        return values, values
+    return values[~missing], np.where(missing, 0.0, values)
+
+
+def scan_records(columns, block_rows=SCAN_BLOCK_ROWS, bin_columns=BIN_VARIABLES, medians=False,
+                 value_counts=()):
+    """RecordScan of a dict of record columns (arrays or memory maps), read in
+    pairwise_blocks of at most block_rows records. Every column gets its
+    count, missing values, extrema, mean and squared deviations; bin_columns
+    their bin counts and Rayleigh sums; with medians set, every column its
+    median; the columns in value_counts their exact value counts."""
+    n_rows = len(next(iter(columns.values())))
+    blocks = pairwise_blocks(n_rows, block_rows)
+    stats = {col: {'count': 0, 'missing': 0, 'min': None, 'max': None, 'sums': []} for col in columns}
+    for col in value_counts:
+        stats[col]['values'] = np.empty(0, dtype=columns[col].dtype)
+        stats[col]['value_counts'] = np.zeros(0, dtype=np.int64)
+
+    for start, stop in blocks:
+        for col, col_stats in stats.items():
+            values = np.asarray(columns[col][start:stop])
+            valid, zeroed = _valid(values)
+            col_stats['count'] += len(valid)
+            col_stats['missing'] += len(values) - len(valid)
+            if len(valid):
+                low, high = valid.min(), valid.max()
+                col_stats['min'] = low if col_stats['min'] is None else min(col_stats['min'], low)
+                col_stats['max'] = high if col_stats['max'] is None else max(col_stats['max'], high)
+            if values.dtype.kind == 'f':
+                col_stats['sums'].append(np.sum(zeroed))
+            else:
+                col_stats['sums'].append(int(np.sum(values, dtype=np.int64)))
+            if col in value_counts:
+                block_values, block_counts = np.unique(valid, return_counts=True)
+                col_stats['values'], col_stats['value_counts'] = _merge_value_counts(
+                    col_stats['values'], col_stats['value_counts'], block_values, block_counts)
+
+    for col, col_stats in stats.items():
+        if columns[col].dtype.kind == 'f':
+            total = pairwise_sum(col_stats.pop('sums'), n_rows, block_rows)
+        else:
+            # Exact: the float sum of integers is exact below 2^53
+            total = np.float64(sum(col_stats.pop('sums')))
+        col_stats['mean'] = total / col_stats['count']
+        col_stats['m2'] = []
+        if medians:
+            col_stats['buckets'] = np.zeros(MEDIAN_BUCKETS, dtype=np.int64)
+        if col in bin_columns:
+            col_stats['counts'] = np.zeros(N_BINS, dtype=np.int64)
+            col_stats['range_counts'] = np.zeros(N_BINS, dtype=np.int64)
+            col_stats['cos'], col_stats['sin'] = [], []
+
+    for start, stop in blocks:
+        for col, col_stats in stats.items():
+            values = np.asarray(columns[col][start:stop])
+            valid, zeroed = _valid(values)
+            # Squared deviations as pandas' nanvar forms them, NaNs zeroed
+            squared = (col_stats['mean'] - values) ** 2
+            if len(valid) < len(values):
+                squared[np.isnan(values)] = 0
+            col_stats['m2'].append(np.sum(squared))
+            min_val, max_val = col_stats['min'], col_stats['max']
+            if medians and max_val > min_val:
+                col_stats['buckets'] += np.bincount(_median_buckets(valid, min_val, max_val),
+                                                    minlength=MEDIAN_BUCKETS)
+            if col in bin_columns:
+                col_stats['counts'] += np.bincount(equal_width_bin_indices(values, max_val, N_BINS),
+                                                   minlength=N_BINS)
+                range_edges = np.linspace(min_val, max_val, N_BINS + 1)
+                col_stats['range_counts'] += np.bincount(np.digitize(values, range_edges[1:-1], right=False),
+                                                         minlength=N_BINS)[:N_BINS]
+                if max_val > min_val:
+                    theta = 2 * np.pi * (values - min_val) / (max_val - min_val)
+                    col_stats['cos'].append(np.sum(np.cos(theta)))
+                    col_stats['sin'].append(np.sum(np.sin(theta)))
+
+    for col, col_stats in stats.items():
+        col_stats['m2'] = pairwise_sum(col_stats['m2'], n_rows, block_rows)
+        if col in bin_columns:
+            for name in ('cos', 'sin'):
+                col_stats[name] = pairwise_sum(col_stats[name], n_rows, block_rows) if col_stats[name] else 0.0
+
+    if medians:
+        _scan_medians(columns, blocks, stats)
+    return RecordScan(n_rows, stats)
+
+
+def _median_buckets(values, min_val, max_val):
+    """Fine histogram bucket of each value, non-decreasing in the value."""
+    scaled = (values - min_val) / (max_val - min_val) * MEDIAN_BUCKETS
+    return np.minimum(scaled.astype(np.intp), MEDIAN_BUCKETS - 1)
+
+
+def _scan_medians(columns, blocks, stats):
+    """Median of every column: the buckets holding its middle order statistics
+    come from the pass 2 histogram, their values from one more pass."""
+    targets = {}
+    for col, col_stats in stats.items():
+        n = col_stats['count']
+        ranks = [n // 2] if n % 2 else [n // 2 - 1, n // 2]
+        if col_stats['max'] == col_stats['min']:
+            col_stats['median'] = float(col_stats['min'])
+            continue
+        cumulative = np.cumsum(col_stats.pop('buckets'))
+        buckets = np.searchsorted(cumulative, ranks, side='right')
+        below = np.concatenate([[0], cumulative])[buckets]
+        targets[col] = (ranks, buckets, below)
+        col_stats['bucket_values'] = np.empty(0, dtype=columns[col].dtype)
+        col_stats['bucket_counts'] = np.zeros(0, dtype=np.int64)
+
+    for start, stop in blocks:
+        for col, (ranks, buckets, below) in targets.items():
+            col_stats = stats[col]
+            valid, _ = _valid(np.asarray(columns[col][start:stop]))
+            selected = valid[np.isin(_median_buckets(valid, col_stats['min'], col_stats['max']), buckets)]
+            block_values, block_counts = np.unique(selected, return_counts=True)
+            col_stats['bucket_values'], col_stats['bucket_counts'] = _merge_value_counts(
+                col_stats['bucket_values'], col_stats['bucket_counts'], block_values, block_counts)
+
+    for col, (ranks, buckets, below) in targets.items():
+        col_stats = stats[col]
+        values, counts = col_stats.pop('bucket_values'), col_stats.pop('bucket_counts')
+        # Values below the first target bucket are not held: count ranks from it
+        cumulative = np.cumsum(counts) + below[0]
+        middle = values[np.searchsorted(cumulative, ranks, side='right')].astype(float)
+        col_stats['median'] = float(np.mean(middle))
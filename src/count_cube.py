@@ -0,0 +1,268 @@
+"""
+Count Cube - Blind Study (Approach Two)
+Sufficient statistics of record_vals.csv for cases 0, 1, 3A, 3B, 4A and 4B.
+a_val and v_val take few distinct values (72 and 53 here), and every one of
+those cases reduces x_val, y_val and z_val to 16 equal-width bins, per-record
+energies that depend on v_val only, or sums over records. One integer cube per
+variable,
+    counts[a_val code, v_val code, bin]
+plus a few per-(a_val, v_val) cell sums the bins cannot recover, therefore
+replaces the raw records:
+    counts          16 bins over [0, max]       (cases 3A, 3B, 4A, 4B)
+    range_counts    16 bins over [min, max]     (case 1)
+    sum, m2         sum and centered sum of squares  (case 0 mean and std)
+    cos, sin        sums of cos/sin of the value mapped onto [0, 2 pi] over
+                    [min, max]                  (Rayleigh tests of 1, 3A, 4A)
+The global median of each variable is the one order statistic the cells cannot
+give, so it is stored beside them. Codes index the sorted distinct values, so
+the cube is exact whatever the resolution of v_val.
+
+The cube is built block by block from the columnar cache (see data_store), in
+one pass for the extrema and distinct values and one for the sums, and stored
+as a single .npz keyed by the SHA-256 of the source file. A case run on the
+cube reduces a few hundred thousand cells instead of scanning every record.
+
+Usage:
+    python src/count_cube.py       # build (or validate) the cube for record_vals.csv
+"""
+
+import os
+import tempfile
+import numpy as np
+
+from data_store import CACHE_DIR, RECORD_DTYPES, RECORDS_PATH, cache_index, load_columns
+
+N_BINS = 16
+CUBE_VARIABLES = ('x_val', 'y_val', 'z_val')
+CUBE_BLOCK_ROWS = 1 << 20
+CUBE_VERSION = 1
+
+
+def _blocks(n_rows, block_rows=CUBE_BLOCK_ROWS):
+    return [(start, min(start + block_rows, n_rows)) for start in range(0, n_rows, block_rows)]
+
+
+def _zero_max_bins(values, max_val, n_bins=N_BINS):
+    """Bins of cases 3A/3B/4A/4B: equal width from 0 to max, last bin includes max."""
+    bin_size = max_val / n_bins
+    return np.minimum(np.floor(values / bin_size).astype(np.intp), n_bins - 1)
+
+
+def _range_bins(values, min_val, max_val, n_bins=N_BINS):
+    """Bins of case 1: equal width from min to max, last bin includes max."""
+    bin_edges = np.linspace(min_val, max_val, n_bins + 1)
+    return np.digitize(values, bin_edges[1:-1], right=False)
+
+
+def quantile(values, counts, q):
+    """np.quantile (linear method, as pandas' Series.quantile) of the records
+    holding sorted distinct values with the given counts."""
+    cum = np.cumsum(counts)
+    n = int(cum[-1])
+    virtual = n * q + (1 - q) - 1
+    lower = int(np.floor(virtual))
+    upper = min(lower + 1, n - 1)
+    gamma = virtual - lower
+    a = values[np.searchsorted(cum, lower, side='right')]
+    b = values[np.searchsorted(cum, upper, side='right')]
+    diff = b - a
+    return float(b - diff * (1 - gamma)) if gamma >= 0.5 else float(a + diff * gamma)
+
+
+def median(values, counts):
+    """Median of the records holding sorted distinct values with the given counts,
+    computed as np.median does."""
+    cum = np.cumsum(counts)
+    n = int(cum[-1])
+    a = values[np.searchsorted(cum, (n - 1) // 2, side='right')]
+    b = values[np.searchsorted(cum, n // 2, side='right')]
+    return float(np.mean([a, b]))
+
+
+class CountCube:
+    """Per-variable (a_val, v_val, bin) count cubes and cell sums of one record file.
+
+    Reductions take an optional v_select, a boolean mask over v_values, so a
+    v_val stratum is a slice of the cube. v_weights (one weight per v_val code,
+    e.g. the energy proxy) turn counts into weighted sums."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.a_values = arrays['a_values']
+        self.v_values = arrays['v_values']
+        self.cells = arrays['cells']
+
+    @property
+    def n_records(self):
+        return int(self.cells.sum())
+
+    def _select(self, array, v_select):
+        return array if v_select is None else array[:, v_select]
+
+    def extrema(self, var):
+        """(min, max) of a variable over the whole file."""
+        min_val, max_val = self.arrays[f'{var}_extrema']
+        return min_val, max_val
+
+    def v_counts(self, v_select=None):
+        """Records per v_val code."""
+        counts = self.cells.sum(axis=0)
+        return counts if v_select is None else np.where(v_select, counts, 0)
+
+    def a_counts(self, v_select=None):
+        """Records per a_val code."""
+        return self._select(self.cells, v_select).sum(axis=1)
+
+    def bin_counts(self, var, v_select=None, binning='zero_max'):
+        """Counts per bin; binning='zero_max' ([0, max], cases 3A-4B) or 'range' ([min, max], case 1)."""
+        name = 'counts' if binning == 'zero_max' else 'range_counts'
+        return self._select(self.arrays[f'{var}_{name}'], v_select).sum(axis=(0, 1))
+
+    def a_bin_counts(self, var, v_select=None):
+        """(a_val code, bin) counts over [0, max], e.g. for per-a_val heatmaps."""
+        return self._select(self.arrays[f'{var}_counts'], v_select).sum(axis=1)
+
+    def weighted_bin_sums(self, var, v_weights, v_select=None):
+        """Sum of v_weights over the records in each [0, max] bin."""
+        counts = self._select(self.arrays[f'{var}_counts'], v_select).sum(axis=0)
+        weights = v_weights if v_select is None else v_weights[v_select]
+        return np.sum(counts * weights[:, None], axis=0)
+
+    def rayleigh_sums(self, var, v_weights=None, v_select=None):
+        """(sum w cos(theta), sum w sin(theta), sum w) over the records, theta mapping
+        [min, max] onto [0, 2 pi]; w = 1 unless v_weights is given."""
+        cos = self._select(self.arrays[f'{var}_cos'], v_select).sum(axis=0)
+        sin = self._select(self.arrays[f'{var}_sin'], v_select).sum(axis=0)
+        counts = self._select(self.cells, v_select).sum(axis=0)
+        if v_weights is None:
+            return float(cos.sum()), float(sin.sum()), float(counts.sum())
+        weights = v_weights if v_select is None else v_weights[v_select]
+        return float(np.sum(weights * cos)), float(np.sum(weights * sin)), float(np.sum(weights * counts))
+
+    def moments(self, var):
+        """(count, mean, sum of squared deviations) of a variable, merging the
+        per-cell sums with Chan's pairwise update."""
+        cells = self.cells.ravel().astype(float)
+        occupied = cells > 0
+        n = cells[occupied]
+        sums = self.arrays[f'{var}_sum'].ravel()[occupied]
+        total = float(n.sum())
+        mean = float(sums.sum() / total)
+        m2 = float(self.arrays[f'{var}_m2'].ravel()[occupied].sum() + np.sum(n * (sums / n - mean) ** 2))
+        return int(total), mean, m2
+
+    def median(self, var):
+        return float(self.arrays[f'{var}_median'])
+
+    def expand(self, var, v_select=None):
+        """Record-level ([0, max] bin index, v_val code) pairs in cell order. Any
+        statistic invariant to record order (the permutation nulls of 4A and
+        4B) can run on these instead of the raw records."""
+        counts = self._select(self.arrays[f'{var}_counts'], v_select)
+        v_codes = np.arange(len(self.v_values)) if v_select is None else np.flatnonzero(v_select)
+        flat = counts.ravel()
+        bins = np.tile(np.arange(N_BINS), counts.shape[0] * counts.shape[1])
+        codes = np.tile(np.repeat(v_codes, N_BINS), counts.shape[0])
+        return np.repeat(bins, flat), np.repeat(codes, flat)
+
+
+def build_cube(columns, block_rows=CUBE_BLOCK_ROWS):
+    """Cube arrays from a dict of record columns (arrays or memory maps), read
+    block by block: one pass for extrema and distinct values, one for the sums."""
+    n_rows = len(columns['a_val'])
+    blocks = _blocks(n_rows, block_rows)
+    a_values, v_values = set(), set()
+    extrema = {var: [np.inf, -np.inf] for var in CUBE_VARIABLES}
+    for start, stop in blocks:
+        a_values.update(np.unique(columns['a_val'][start:stop]).tolist())
+        v_block = np.asarray(columns['v_val'][start:stop])
+        if np.isnan(v_block).any():
+            raise ValueError("Count cube requires v_val without missing values")
+        v_values.update(np.unique(v_block).tolist())
+        for var in CUBE_VARIABLES:
+            block = columns[var][start:stop]
+            extrema[var] = [min(extrema[var][0], block.min()), max(extrema[var][1], block.max())]
+    a_values = np.array(sorted(a_values), dtype=RECORD_DTYPES['a_val'])
+    v_values = np.array(sorted(v_values), dtype=float)
+    n_a, n_v = len(a_values), len(v_values)
+    n_cells = n_a * n_v
+
+    arrays = {'a_values': a_values, 'v_values': v_values, 'cells': np.zeros(n_cells, dtype=np.int64)}
+    for var in CUBE_VARIABLES:
+        arrays[f'{var}_extrema'] = np.array(extrema[var], dtype=float)
+        arrays[f'{var}_counts'] = np.zeros(n_cells * N_BINS, dtype=np.int64)
+        arrays[f'{var}_range_counts'] = np.zeros(n_cells * N_BINS, dtype=np.int64)
+        for name in ('sum', 'm2', 'cos', 'sin'):
+            arrays[f'{var}_{name}'] = np.zeros(n_cells)
+
+    for start, stop in blocks:
+        cell = (np.searchsorted(a_values, columns['a_val'][start:stop]) * n_v
+                + np.searchsorted(v_values, columns['v_val'][start:stop]))
+        block_cells = np.bincount(cell, minlength=n_cells)
+        occupied = block_cells > 0
+        for var in CUBE_VARIABLES:
+            values = np.asarray(columns[var][start:stop], dtype=float)
+            min_val, max_val = extrema[var]
+            arrays[f'{var}_counts'] += np.bincount(cell * N_BINS + _zero_max_bins(values, max_val),
+                                                   minlength=n_cells * N_BINS)
+            arrays[f'{var}_range_counts'] += np.bincount(cell * N_BINS + _range_bins(values, min_val, max_val),
+                                                         minlength=n_cells * N_BINS)
+            if max_val > min_val:
+                theta = 2 * np.pi * (values - min_val) / (max_val - min_val)
+                arrays[f'{var}_cos'] += np.bincount(cell, weights=np.cos(theta), minlength=n_cells)
+                arrays[f'{var}_sin'] += np.bincount(cell, weights=np.sin(theta), minlength=n_cells)
+            # Merge this block's per-cell mean and m2 into the running ones (Chan et al.)
+            block_sum = np.bincount(cell, weights=values, minlength=n_cells)
+            block_mean = np.divide(block_sum, block_cells, out=np.zeros(n_cells), where=occupied)
+            block_m2 = np.bincount(cell, weights=(values - block_mean[cell]) ** 2, minlength=n_cells)
+            prior = arrays['cells'].astype(float)
+            merged = prior + block_cells
+            prior_mean = np.divide(arrays[f'{var}_sum'], prior, out=np.zeros(n_cells), where=prior > 0)
+            delta = block_mean - prior_mean
+            arrays[f'{var}_m2'] += block_m2 + np.divide(delta ** 2 * prior * block_cells, merged,
+                                                        out=np.zeros(n_cells), where=merged > 0)
+            arrays[f'{var}_sum'] += block_sum
+        arrays['cells'] += block_cells
+
+    arrays['cells'] = arrays['cells'].reshape(n_a, n_v)
+    for var in CUBE_VARIABLES:
+        for name in ('counts', 'range_counts'):
+            arrays[f'{var}_{name}'] = arrays[f'{var}_{name}'].reshape(n_a, n_v, N_BINS)
+        for name in ('sum', 'm2', 'cos', 'sin'):
+            arrays[f'{var}_{name}'] = arrays[f'{var}_{name}'].reshape(n_a, n_v)
+        # The one statistic the cells cannot recover
+        arrays[f'{var}_median'] = np.array(np.median(np.asarray(columns[var])))
+    return arrays
+
+
+def cube_path(path=RECORDS_PATH, cache_dir=CACHE_DIR):
+    """Location of the stored cube for the current contents of path."""
+    index = cache_index(path, RECORD_DTYPES, cache_dir=cache_dir)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-cube-v{CUBE_VERSION}-{index['sha256'][:16]}.npz")
+
+
+def load_cube(path=RECORDS_PATH, cache_dir=CACHE_DIR):
+    """CountCube of a record file, built and stored on first use and rebuilt
+    whenever the source file changes."""
+    target = cube_path(path, cache_dir)
+    if not os.path.exists(target):
+        arrays = build_cube(load_columns(path, RECORD_DTYPES, cache_dir=cache_dir))
+        fd, tmp_path = tempfile.mkstemp(suffix='.npz', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, target)
+    with np.load(target) as stored:
+        return CountCube({name: stored[name] for name in stored.files})
+
+
+def main():
+    cube = load_cube()
+    n_cells = cube.cells.size
+    print(f"Count cube for {RECORDS_PATH}: {cube.n_records} records, {len(cube.a_values)} a_val x "
+          f"{len(cube.v_values)} v_val codes x {N_BINS} bins ({n_cells * N_BINS} cells per variable)")
+    print(f"  Stored at {cube_path()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Data Store - Blind Study (Approach Two)
+Shared data access for every analysis and visualization script. Each source CSV
+is parsed once, in chunks of rows, into typed .npy columns under data/.cache/,
+keyed by the SHA-256 of the source file, and memory-mapped on every later load.
+Timestamps are stored as int64 epoch seconds so no script has to re-run
+pd.to_datetime.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+RECORDS_PATH = os.path.join(DATA_DIR, 'record_vals.csv')
+TIMESTAMPS_PATH = os.path.join(DATA_DIR, 'timestamp_vals.csv')
+CACHE_DIR = os.path.join(DATA_DIR, '.cache')
+
+# Narrowest storage type per column; a column keeps its parsed dtype if the
+# narrow type would not round-trip. v_val stays float64: float32 would perturb
+# the 10^(1.5 * v_val) energy proxy and the stratum quantiles.
+RECORD_DTYPES = {
+    'a_val': np.int16,
+    'v_val': np.float64,
+    'x_val': np.int32,
+    'y_val': np.int32,
+    'z_val': np.int32,
+}
+TIMESTAMP_DTYPES = {
+    'v_val': np.float64,
+}
+TIMESTAMP_COLUMNS = ['timestamp']
+
+HASH_BLOCK_SIZE = 1 << 20
+CSV_CHUNK_ROWS = 1 << 20
+
+
+def file_hash(path):
+    """SHA-256 hex digest of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _index_path(path, cache_dir):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}.json")
+
+
+def _fits(values, dtype):
+    """Whether every value survives a round trip through dtype."""
+    try:
+        with np.errstate(invalid='ignore'):
+            narrowed = values.astype(dtype)
+    except (TypeError, ValueError):
+        return False
+    return np.array_equal(narrowed, values)
+
+
+def _epoch_seconds(series):
+    """Parse ISO-8601 timestamps to int64 seconds since the UTC epoch."""
+    parsed = pd.to_datetime(series, utc=True)
+    nanoseconds = (parsed - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(nanoseconds=1)
+    nanoseconds = nanoseconds.to_numpy(dtype=np.int64)
+    if np.any(nanoseconds % 1_000_000_000):
+        raise ValueError("Sub-second timestamps cannot be stored as epoch seconds")
+    return nanoseconds // 1_000_000_000
+
+
+def build_cache(path, dtypes, timestamp_columns=(), cache_dir=CACHE_DIR, chunk_rows=CSV_CHUNK_ROWS):
+    """Parse a CSV once and write one .npy file per column.
+    The CSV is read chunk_rows rows at a time, so memory holds one chunk
+    whatever the size of the file: each chunk's columns are spilled to part
+    files, then copied into the column files at their common type, narrowed
+    if every chunk fits. Returns the cache index describing the stored columns."""
+    source_hash = file_hash(path)
+    stat = os.stat(path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    column_dir_name = f"{stem}-{source_hash[:16]}"
+    tmp_dir = tempfile.mkdtemp(prefix=f".{stem}-", dir=cache_dir)
+
+    parts = {}
+    part_dtypes = {}
+    narrow = {}
+    n_rows = 0
+    with pd.read_csv(path, chunksize=chunk_rows) as reader:
+        for chunk_index, chunk in enumerate(reader):
+            for col in chunk.columns:
+                if col in timestamp_columns:
+                    values = _epoch_seconds(chunk[col])
+                else:
+                    values = chunk[col].to_numpy()
+                    if col in dtypes:
+                        narrow[col] = narrow.get(col, True) and _fits(values, dtypes[col])
+                part = os.path.join(tmp_dir, f"{col}.{chunk_index}.part.npy")
+                np.save(part, values)
+                parts.setdefault(col, []).append(part)
+                part_dtypes.setdefault(col, []).append(values.dtype)
+            n_rows += len(chunk)
+
+    columns = {}
+    for col, col_parts in parts.items():
+        dtype = dtypes[col] if narrow.get(col) else np.result_type(*part_dtypes[col])
+        if dtype == object:
+            values = np.concatenate([np.load(part, allow_pickle=True) for part in col_parts])
+            np.save(os.path.join(tmp_dir, f"{col}.npy"), values)
+        else:
+            values = np.lib.format.open_memmap(os.path.join(tmp_dir, f"{col}.npy"), mode='w+',
+                                               dtype=dtype, shape=(n_rows,))
+            start = 0
+            for part in col_parts:
+                piece = np.load(part)
+                values[start:start + len(piece)] = piece
+                start += len(piece)
+            values.flush()
+            del values
+        for part in col_parts:
+            os.remove(part)
+        columns[col] = str(np.dtype(dtype))
+
+    column_dir = os.path.join(cache_dir, column_dir_name)
+    if os.path.isdir(column_dir):
+        shutil.rmtree(tmp_dir)
+    else:
+        os.replace(tmp_dir, column_dir)
+
+    index = {
+        "source": os.path.basename(path),
+        "sha256": source_hash,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "rows": n_rows,
+        "columns": columns,
+        "timestamp_columns": list(timestamp_columns),
+        "column_dir": column_dir_name,
+    }
+    _write_index(path, index, cache_dir)
+
+    # Drop column directories left behind by earlier versions of the source file
+    for name in os.listdir(cache_dir):
+        if name.startswith(f"{stem}-") and name != column_dir_name:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+    return index
+
+
+def _write_index(path, index, cache_dir):
+    fd, tmp_path = tempfile.mkstemp(suffix='.json', dir=cache_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, _index_path(path, cache_dir))
+
+
+def _read_index(path, cache_dir):
+    try:
+        with open(_index_path(path, cache_dir), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def cache_index(path, dtypes, timestamp_columns=(), cache_dir=CACHE_DIR):
+    """Return a valid cache index for path, rebuilding the cache if the source changed.
+    A matching size and mtime skip rehashing; otherwise the SHA-256 decides."""
+    index = _read_index(path, cache_dir)
+    if index is not None and os.path.isdir(os.path.join(cache_dir, index['column_dir'])):
+        stat = os.stat(path)
+        if stat.st_size == index['size'] and stat.st_mtime_ns == index['mtime_ns']:
+            return index
+        if file_hash(path) == index['sha256']:
+            index['size'] = stat.st_size
+            index['mtime_ns'] = stat.st_mtime_ns
+            _write_index(path, index, cache_dir)
+            return index
+    return build_cache(path, dtypes, timestamp_columns, cache_dir)
+
+
+def load_columns(path, dtypes, timestamp_columns=(), columns=None, mmap=True, cache_dir=CACHE_DIR):
+    """Memory-mapped typed columns of a CSV as a dict of numpy arrays."""
+    index = cache_index(path, dtypes, timestamp_columns, cache_dir)
+    column_dir = os.path.join(cache_dir, index['column_dir'])
+    names = columns if columns is not None else list(index['columns'])
+    mmap_mode = 'r' if mmap else None
+    return {col: np.load(os.path.join(column_dir, f"{col}.npy"), mmap_mode=mmap_mode) for col in names}
+
+
+def load_record_columns(path=RECORDS_PATH, columns=None, mmap=True):
+    """Record columns (a_val, v_val, x_val, y_val, z_val) as memory-mapped arrays."""
+    return load_columns(path, RECORD_DTYPES, columns=columns, mmap=mmap)
+
+
+def load_records(path=RECORDS_PATH, columns=None):
+    """Record data as a DataFrame backed by the columnar cache."""
+    return pd.DataFrame(load_record_columns(path, columns=columns), copy=False)
+
+
+def load_timestamps(path=TIMESTAMPS_PATH):
+    """Timestamp data as a DataFrame with a tz-aware UTC 'timestamp' column."""
+    arrays = load_columns(path, TIMESTAMP_DTYPES, TIMESTAMP_COLUMNS)
+    data = {}
+    for col, values in arrays.items():
+        if col in TIMESTAMP_COLUMNS:
+            data[col] = pd.to_datetime(np.asarray(values), unit='s', utc=True)
+        else:
+            data[col] = values
+    return pd.DataFrame(data, copy=False)
@@ -0,0 +1,167 @@
+"""
+Descriptive Stats - Blind Study (Approach Two)
+Fused descriptive statistics of several columns at once: Case 0's population
+profile, cheap enough to recompute per a_val group or per stratum. The
+columns are stacked into one (n_columns, n_records) float64 block and every
+statistic is a row-wise reduction of that block, never a per-column scan:
+    missing, count     one isnan pass
+    min, max           fmin / fmax reductions, NaN ignored
+    mean, std          pairwise sums of the NaN-zeroed rows and of the squared
+                       deviations from the mean, formed as pandas forms them,
+                       so the values equal pandas' bit for bit
+    median             one np.partition of the block at the middle ranks
+Integer columns convert to float64 exactly below 2^53.
+
+ColumnStatsState is the streaming variant: count, missing, extrema, mean and
+sum of squared deviations of each column, updated block by block and merged
+across blocks or workers with Chan et al.'s pairwise update (equal to the
+fused values up to rounding); its medians come from mergeable KLL sketches
+(see quantile_sketch) with their rank error bound. Each block's sketches draw
+their compaction offsets from their own keyed stream, as the bound requires;
+states built on separate workers take distinct stream numbers. Exact
+out-of-core statistics are chunked_scan's.
+"""
+
+import numpy as np
+
+from quantile_sketch import SKETCH_K, KLLSketch
+
+STAT_NAMES = ('count', 'missing', 'min', 'max', 'mean', 'std', 'median')
+
+
+def column_block(columns, names):
+    """(n_columns, n_records) C-contiguous float64 block of the named columns
+    of a DataFrame or a mapping of column name to array."""
+    block = np.empty((len(names), len(columns[names[0]])))
+    for row, name in zip(block, names):
+        row[:] = columns[name]
+    return block
+
+
+def _middle_ranks(count):
+    return [count // 2] if count % 2 else [count // 2 - 1, count // 2]
+
+
+def block_medians(block, missing):
+    """Median of each row of block, ignoring NaNs. Complete rows share one
+    np.partition of the block at their common middle ranks."""
+    medians = np.full(block.shape[0], np.nan)
+    complete = missing == 0
+    if complete.any() and block.shape[1]:
+        ranks = _middle_ranks(block.shape[1])
+        rows = block[complete] if not complete.all() else block
+        medians[complete] = np.mean(np.partition(rows, ranks, axis=1)[:, ranks], axis=1)
+    for row in np.flatnonzero(~complete):
+        values = block[row][~np.isnan(block[row])]
+        if len(values):
+            ranks = _middle_ranks(len(values))
+            medians[row] = np.mean(np.partition(values, ranks)[ranks])
+    return medians
+
+
+def describe_block(block, medians=True):
+    """{statistic: array over the rows of block} of every name in STAT_NAMES
+    (std with ddof=1, as pandas' Series.std)."""
+    nan = np.isnan(block)
+    missing = nan.sum(axis=1)
+    count = block.shape[1] - missing
+    zeroed = np.where(nan, 0.0, block) if missing.any() else block
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = zeroed.sum(axis=1) / count
+        # Squared deviations as pandas' nanvar forms them, NaNs zeroed
+        squared = (mean[:, None] - block) ** 2
+        if missing.any():
+            squared[nan] = 0
+        std = np.sqrt(squared.sum(axis=1) / (count - 1))
+    stats = {
+        'count': count,
+        'missing': missing,
+        'min': np.fmin.reduce(block, axis=1) if block.shape[1] else np.full(len(block), np.nan),
+        'max': np.fmax.reduce(block, axis=1) if block.shape[1] else np.full(len(block), np.nan),
+        'mean': mean,
+        'std': std,
+    }
+    if medians:
+        stats['median'] = block_medians(block, missing)
+    return stats
+
+
+def describe(columns, names):
+    """describe_block of the named columns, as {column: {statistic: value}}."""
+    stats = describe_block(column_block(columns, names))
+    return {name: {stat: stats[stat][i].item() for stat in STAT_NAMES} for i, name in enumerate(names)}
+
+
+class ColumnStatsState:
+    """Mergeable partial statistics of the named columns over the records seen
+    so far. stream keys the sketches' random offsets: give each worker's state
+    its own. block is the state's position in its stream (0 for the running
+    state, then one per update)."""
+
+    def __init__(self, names, sketch_k=SKETCH_K, stream=0, block=0):
+        self.names = list(names)
+        self.sketch_k = sketch_k
+        self.stream = stream
+        self.n_blocks = block
+        n_columns = len(self.names)
+        self.count = np.zeros(n_columns, dtype=np.int64)
+        self.missing = np.zeros(n_columns, dtype=np.int64)
+        self.min = np.full(n_columns, np.nan)
+        self.max = np.full(n_columns, np.nan)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.sketches = self._block_sketches(block)
+
+    def _block_sketches(self, block):
+        """One sketch per column, keyed by (stream, block, column)."""
+        n_columns = len(self.names)
+        return [KLLSketch(self.sketch_k, stream=self.stream, block=block * n_columns + i) for i in range(n_columns)]
+
+    def update(self, columns):
+        """Add a block of records, given as a DataFrame or a mapping of column name to array."""
+        block = column_block(columns, self.names)
+        stats = describe_block(block, medians=False)
+        self.n_blocks += 1
+        part = ColumnStatsState(self.names, self.sketch_k, self.stream, block=self.n_blocks)
+        part.count, part.missing = stats['count'].astype(np.int64), stats['missing'].astype(np.int64)
+        part.min, part.max = stats['min'], stats['max']
+        occupied = part.count > 0
+        part.mean = np.where(occupied, stats['mean'], 0.0)
+        part.m2 = np.where(part.count > 1, stats['std'] ** 2 * (part.count - 1), 0.0)
+        for sketch, values in zip(part.sketches, block):
+            sketch.update(values)
+        return self.merge(part)
+
+    def merge(self, other):
+        """Fold in the state of disjoint records (Chan et al.'s pairwise update)."""
+        if other.names != self.names:
+            raise ValueError(f"Cannot merge statistics of {other.names} into {self.names}")
+        total = self.count + other.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = other.mean - self.mean
+            weight = np.where(total > 0, other.count / total, 0.0)
+            self.mean = self.mean + delta * weight
+            self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * weight
+        self.count = total
+        self.missing = self.missing + other.missing
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+        return self
+
+    def result(self):
+        """{statistic: array over the columns} as describe_block gives it, the
+        medians approximate within median_rank_error (a fraction of the count)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self.m2 / (self.count - 1))
+        return {
+            'count': self.count,
+            'missing': self.missing,
+            'min': self.min,
+            'max': self.max,
+            'mean': np.where(self.count > 0, self.mean, np.nan),
+            'std': std,
+            'median': np.array([sketch.quantile(0.5) if sketch.n else np.nan for sketch in self.sketches]),
+            'median_rank_error': np.array([sketch.rank_error() for sketch in self.sketches]),
+        }
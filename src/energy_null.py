@@ -0,0 +1,119 @@
+"""
+Energy Null - Blind Study (Approach Two)
+Closed-form permutation null for the energy-weighted chi-square of cases 4A and 4B.
+Shuffling a variable against fixed energies leaves the bin counts n_j fixed and
+makes each bin's energy sum S_j a draw of n_j energies without replacement, so
+the mean and variance of
+    chi2 = sum_j (S_j - E/k)^2 / (E/k)
+under that null follow exactly from the bin counts and the power sums of the
+energies (moments of distinct draws from a finite population up to fourth order).
+The null is then approximated by a scaled chi-square a * chi2(nu) with the same
+first two moments (Satterthwaite-Welch), which ranks an observed statistic in
+microseconds instead of thousands of synthetic catalogs. The moments are exact;
+the shape is not. On the real Case 4A population, against 20000 catalogs, the
+analytic percentiles sit 5 to 13 points above the Monte Carlo ranks in the
+middle of the null, where the real x_val, y_val and z_val statistics fall,
+but up to about 2 points below them in the 10% to 1% tail: a statistic at the
+Monte Carlo 5% point ranks at about 3.5-3.7%, one at the 1% point at about
+0.1%. It is therefore not conservative where significance is decided; it is
+meant for screening many (stratum, variable) cells, and the permutation null
+stays the default.
+"""
+
+import numpy as np
+from scipy import stats
+
+from synthetic_ranks import log10_p_value
+
+NULL_MODES = ('permutation', 'analytic')
+
+
+def _falling(n, m):
+    """Falling factorial n (n-1) ... (n-m+1)."""
+    return float(np.prod([n - i for i in range(m)]))
+
+
+def draw_moments(y):
+    """E[y_a^r y_b^s ...] over distinct positions a, b, ... of a random permutation
+    of the centered population y, keyed by the exponent tuple. With sum(y) = 0 the
+    augmented symmetric functions reduce to the power sums p2, p3, p4."""
+    n = len(y)
+    p2, p3, p4 = (float(np.sum(y ** r)) for r in (2, 3, 4))
+    return {
+        (2,): p2 / n,
+        (3,): p3 / n,
+        (4,): p4 / n,
+        (1, 1): -p2 / _falling(n, 2),
+        (2, 1): -p3 / _falling(n, 2),
+        (3, 1): -p4 / _falling(n, 2),
+        (2, 2): (p2 ** 2 - p4) / _falling(n, 2),
+        (1, 1, 1): 2 * p3 / _falling(n, 3),
+        (2, 1, 1): (2 * p4 - p2 ** 2) / _falling(n, 3),
+        (1, 1, 1, 1): (3 * p2 ** 2 - 6 * p4) / _falling(n, 4),
+    }
+
+
+def permutation_moments(bin_counts, energy):
+    """Exact mean and variance of the energy chi-square statistic when the
+    energies are permuted against fixed bins holding bin_counts records each."""
+    energy = np.asarray(energy, dtype=float)
+    n = np.asarray(bin_counts, dtype=float)
+    n_records = len(energy)
+    k = len(n)
+    if n_records < 4:
+        raise ValueError(f"Analytic null needs at least 4 records, got {n_records}")
+    # Work in units of the mean energy: the statistic scales linearly with it
+    mu = energy.mean()
+    m = draw_moments(energy / mu - 1)
+
+    f2 = n * (n - 1)
+    f3 = f2 * (n - 2)
+    # Moments of the centered bin sums Y_j = S_j / mu - n_j
+    e2 = n * m[(2,)] + f2 * m[(1, 1)]
+    e3 = n * m[(3,)] + 3 * f2 * m[(2, 1)] + f3 * m[(1, 1, 1)]
+    e4 = (n * m[(4,)] + 4 * f2 * m[(3, 1)] + 3 * f2 * m[(2, 2)]
+          + 6 * f3 * m[(2, 1, 1)] + f3 * (n - 3) * m[(1, 1, 1, 1)])
+    # E[Y_j^2 Y_l] = a_j n_l for j != l
+    a = n * m[(2, 1)] + f2 * m[(1, 1, 1)]
+    d = n - n_records / k
+
+    # chi2 = (k / n_records) mu (U + 2 L + sum d^2), U = sum Y_j^2, L = sum d_j Y_j, E[L] = 0
+    mean_u = e2.sum()
+    cross_uu = (m[(2, 2)] * (n.sum() ** 2 - np.sum(n ** 2))
+                + 2 * m[(2, 1, 1)] * (n.sum() * f2.sum() - np.sum(n * f2))
+                + m[(1, 1, 1, 1)] * (f2.sum() ** 2 - np.sum(f2 ** 2)))
+    var_u = e4.sum() + cross_uu - mean_u ** 2
+    cov_ul = np.sum(d * e3) + a.sum() * np.sum(d * n) - np.sum(a * d * n)
+    var_l = np.sum(d ** 2 * e2) + m[(1, 1)] * (np.sum(d * n) ** 2 - np.sum((d * n) ** 2))
+
+    scale = k / n_records * mu
+    mean = scale * (mean_u + np.sum(d ** 2))
+    variance = scale ** 2 * (var_u + 4 * cov_ul + 4 * var_l)
+    return float(mean), float(max(variance, 0.0))
+
+
+def scaled_chi2_fit(mean, variance):
+    """(a, nu) of the scaled chi-square a * chi2(nu) with the given mean and variance."""
+    return variance / (2 * mean), 2 * mean ** 2 / variance
+
+
+def analytic_null(stat, bin_counts, energy):
+    """Permutation-null tail probability of an observed energy chi-square statistic
+    from the moment-matched scaled chi-square. Returns the percentile (synthetic
+    catalogs at least as extreme, in %, as the Monte Carlo ranks report it), its
+    log10, and the fitted moments."""
+    mean, variance = permutation_moments(bin_counts, energy)
+    if variance == 0.0:
+        # Equal energies: the statistic does not depend on the permutation
+        p = 1.0 if stat <= mean * (1 + 1e-9) else 0.0
+        return {"percentile": p * 100, "log10_percentile": 2.0 if p else None,
+                "mean": mean, "variance": variance, "scale": None, "dof": None}
+    scale, dof = scaled_chi2_fit(mean, variance)
+    return {
+        "percentile": float(stats.chi2.sf(stat / scale, dof) * 100),
+        "log10_percentile": log10_p_value(stat / scale, dof) + 2,
+        "mean": mean,
+        "variance": variance,
+        "scale": float(scale),
+        "dof": float(dof),
+    }
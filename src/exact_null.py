@@ -0,0 +1,190 @@
+"""
+Exact Null - Blind Study (Approach Two)
+Exact distribution of the chi-square uniformity statistic of Case 3B under its
+null: n records dropped independently into k equiprobable bins. With counts
+c_1..c_k summing to n,
+    chi2 = (k / n) * sum_j c_j^2 - n,
+so the null is the distribution of the integer T = sum_j c_j^2 over the
+multinomial. Writing the multinomial as k independent Poisson(n / k) counts
+conditioned on their sum, the joint law of (sum c_j, sum c_j^2) over j bins is
+the j-fold convolution of the single-bin law, built by repeated doubling with
+2D FFT convolutions, and the null is its slice at sum c_j = n.
+States whose partial deviation sum_j (c_j - n/k)^2 already exceeds the
+deviation of the cap statistic (with the bins still to come placed as evenly
+as they can be) are dropped as they arise, which keeps the tables at O(n^1.5)
+cells. The cap is the chi2(k - 1) quantile of upper tail EXACT_TAIL, far below
+the 0.01 percentile resolution of the results; the mass beyond it is kept as
+tail_mass, the complement of what remains. One null per (n, k) replaces every
+synthetic catalog of the strata of that size, without Monte Carlo error;
+above MAX_EXACT_STATES cells the synthetic catalogs remain the way to go.
+"""
+
+import os
+
+import numpy as np
+from scipy import fft, signal, stats
+
+from data_store import CACHE_DIR
+from synthetic_ranks import exceedance_threshold
+
+# Asymptotic tail probability beyond the largest chi2 tracked exactly
+EXACT_TAIL = 1e-8
+# Cells of the largest intermediate (sum, sum of squares) table
+MAX_EXACT_STATES = 2 * 10 ** 7
+NULL_MODES = ('synthetic', 'exact')
+EXACT_NULL_VERSION = 1
+
+
+class ExactNull:
+    """Exact null of the equiprobable chi-square statistic for one (n, k):
+    the support of the statistic in increasing order and its survival function."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.n_records = int(arrays['n_records'])
+        self.n_bins = int(arrays['n_bins'])
+        self.statistics = arrays['statistics']
+        self.pmf = arrays['pmf']
+        self.tail_mass = float(arrays['tail_mass'])
+        # survival[i] = P(chi2 >= statistics[i]); survival[-1] is the mass beyond the cap
+        self.survival = np.append(np.cumsum(self.pmf[::-1])[::-1], 0.0) + self.tail_mass
+
+    def sf(self, stat):
+        """P(chi2 >= stat) under the null, with the tie tolerance of the synthetic ranks."""
+        return float(self.survival[np.searchsorted(self.statistics, exceedance_threshold(stat))])
+
+    def percentile(self, stat):
+        """Percentile rank of the real p-value among infinitely many synthetic
+        catalogs: the percentage of null catalogs at least as extreme."""
+        return self.sf(stat) * 100
+
+    def mean(self):
+        return float(np.sum(self.pmf * self.statistics))
+
+
+def _deviation_cap(n, k):
+    """Largest sum_j (c_j - n/k)^2 kept: that of the chi2 with asymptotic tail EXACT_TAIL."""
+    return stats.chi2.isf(EXACT_TAIL, k - 1) * n / k
+
+
+def _count_range(j, n, k, cap):
+    """Range of partial sums m over j bins compatible with the cap."""
+    e = n / k
+    half_width = np.sqrt(cap * j * (k - j) / k) if j < k else 0.0
+    return int(np.ceil(j * e - half_width - 1e-9)), int(np.floor(j * e + half_width + 1e-9))
+
+
+def exact_states(n, k):
+    """Cells of the largest (sum, sum of squares) table the exact null needs."""
+    cap = _deviation_cap(n, k)
+    lo, hi = _count_range(k // 2, n, k, cap)
+    return (hi - lo + 1) * int(cap + 2 * np.sqrt(cap) + 2)
+
+
+def exact_feasible(n, k):
+    return exact_states(n, k) <= MAX_EXACT_STATES
+
+
+class _Partial:
+    """Joint Poisson weights of (m, v) over j bins, m = sum c, v = sum c^2 - q m,
+    as a dense table from (m0, v0). q ~ 2n/k keeps v in a narrow band."""
+
+    def __init__(self, j, m0, v0, table):
+        self.j, self.m0, self.v0, self.table = j, m0, v0, table
+
+
+def _prune(part, n, k, q, cap):
+    """Zero the states that cannot end below the cap and crop to the rest."""
+    e = n / k
+    m = part.m0 + np.arange(part.table.shape[0])[:, None]
+    v = part.v0 + np.arange(part.table.shape[1])[None, :]
+    deviation = v + (q - 2 * e) * m + part.j * e ** 2
+    if part.j < k:
+        deviation = deviation + (m - part.j * e) ** 2 / (k - part.j)
+    else:
+        deviation = np.where(m == n, deviation, np.inf)
+    keep = (deviation <= cap * (1 + 1e-12)) & (part.table > 0)
+    rows, cols = np.flatnonzero(keep.any(axis=1)), np.flatnonzero(keep.any(axis=0))
+    if len(rows) == 0:
+        raise ValueError(f"No states below the cap for n={n}, k={k}")
+    table = np.where(keep, part.table, 0.0)[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    return _Partial(part.j, part.m0 + rows[0], part.v0 + cols[0], table)
+
+
+def _combine(a, b, n, k, q, cap):
+    if a.j + b.j == k:
+        # Only the row m = n is needed: pair the rows of a with those of b summing to n
+        # and add their products in the frequency domain, one inverse transform in all
+        rows = np.arange(a.table.shape[0])
+        partner = n - a.m0 - b.m0 - rows
+        paired = (partner >= 0) & (partner < b.table.shape[0])
+        width = a.table.shape[1] + b.table.shape[1] - 1
+        size = fft.next_fast_len(width, real=True)
+        spectrum = np.sum(fft.rfft(a.table[rows[paired]], size, axis=1)
+                          * fft.rfft(b.table[partner[paired]], size, axis=1), axis=0)
+        table = np.zeros((1, width))
+        table[0] = fft.irfft(spectrum, size)[:width]
+        m0 = n
+    else:
+        table = signal.fftconvolve(a.table, b.table)
+        m0 = a.m0 + b.m0
+    # FFT round-off leaves tiny negative weights where there are none
+    np.maximum(table, 0.0, out=table)
+    return _prune(_Partial(a.j + b.j, m0, a.v0 + b.v0, table), n, k, q, cap)
+
+
+def compute_exact_null(n, k):
+    """Arrays of the ExactNull for n records in k equiprobable bins."""
+    if not exact_feasible(n, k):
+        raise ValueError(f"Exact null for n={n}, k={k} needs {exact_states(n, k)} states "
+                         f"(limit {MAX_EXACT_STATES}); use synthetic catalogs")
+    e = n / k
+    cap = _deviation_cap(n, k)
+    q = int(round(2 * e))
+    lo, hi = _count_range(1, n, k, cap)
+    c = np.arange(max(lo, 0), hi + 1)
+    v = c ** 2 - q * c
+    single = np.zeros((len(c), int(v.max() - v.min()) + 1))
+    single[np.arange(len(c)), v - v.min()] = stats.poisson.pmf(c, e)
+    single = _prune(_Partial(1, int(c[0]), int(v.min()), single), n, k, q, cap)
+
+    # Binary powering: result accumulates the set bits of k
+    result, power, remaining = None, single, k
+    while remaining:
+        if remaining & 1:
+            result = power if result is None else _combine(result, power, n, k, q, cap)
+        remaining >>= 1
+        if remaining:
+            power = _combine(power, power, n, k, q, cap)
+    # Condition on sum c = n: divide by the Poisson(n) probability of the total
+    row = result.table[n - result.m0] / stats.poisson.pmf(n, n)
+    sum_squares = result.v0 + np.arange(len(row)) + q * n
+    # Sums of squares have the parity of the sum
+    support = (row > 0) & (sum_squares % 2 == n % 2)
+    pmf = row[support]
+    statistics = k * sum_squares[support] / n - n
+    return {
+        'n_records': np.int64(n),
+        'n_bins': np.int64(k),
+        'statistics': statistics,
+        'pmf': pmf,
+        'tail_mass': np.float64(max(0.0, 1.0 - pmf.sum())),
+    }
+
+
+def null_path(n, k, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"exact-chi2-v{EXACT_NULL_VERSION}-k{k}-n{n}.npz")
+
+
+def exact_null(n, k, cache_dir=CACHE_DIR):
+    """The ExactNull for (n, k), computed once and kept under cache_dir."""
+    path = null_path(n, k, cache_dir)
+    if os.path.exists(path):
+        with np.load(path) as f:
+            return ExactNull({name: f[name] for name in f.files})
+    arrays = compute_exact_null(n, k)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return ExactNull(arrays)
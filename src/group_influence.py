@@ -0,0 +1,156 @@
+"""
+Group Influence - Blind Study (Approach Two)
+Leave-one-group-out (jackknife) stability of the Case 3A and Case 4A
+clustering statistics: is a variable's signal carried by the whole
+population or by a few a_val groups? Every leave-one-out histogram is the
+full histogram without one group's row of the (group, variable, bin) matrix
+of group_stats, so all groups together cost O(groups x bins), never a rescan:
+    - counts: the full histogram minus each group's row (exact in int64)
+    - energy sums (Case 4A): the sum of the rows before plus the rows after
+      each group, from prefix and suffix sums over the groups, so a group
+      holding nearly all of a bin's energy leaves no cancellation error
+For each group left out: chi-square against uniform, p-value, Cramér's V and
+its change from the full population (Cramér's V based on count in both
+cases, as in Case 4A), plus the jackknife standard error of Cramér's V.
+The bins stay those of the full population, [0, max] of each variable.
+
+Usage:
+    python src/group_influence.py              # a_val groups of record_vals.csv
+Outputs results to output/group_influence_blind.json.
+"""
+
+import json
+import os
+import numpy as np
+
+from data_store import load_record_columns
+from group_stats import GROUP_COLUMN, VARIABLES, group_statistics, uniformity_statistics
+from synthetic_ranks import log10_p_value
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
+OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'group_influence_blind.json')
+
+N_INFLUENTIAL = 5
+
+
+def calculate_energy(v_vals):
+    """Case 4A's energy proxy: energy = 10^(1.5 * v_val)."""
+    return np.power(10, 1.5 * v_vals)
+
+
+def exclusive_sums(rows):
+    """Sum over all rows but one, for each row of a (n_groups, ...) array:
+    prefix sums of the rows before it plus suffix sums of the rows after it.
+    Only non-negative terms are added, never subtracted."""
+    zero = np.zeros_like(rows[:1])
+    before = np.concatenate([zero, np.cumsum(rows[:-1], axis=0)])
+    after = np.concatenate([np.cumsum(rows[:0:-1], axis=0)[::-1], zero])
+    return before + after
+
+
+def leave_one_out(bin_counts, bin_weights=None):
+    """Statistics of the full population and with each group left out.
+
+    bin_counts is the (n_groups, n_variables, n_bins) count matrix of a
+    GroupTable; with bin_weights (its energy sums) the chi-square is that of
+    the weighted histograms. Returns {'full': {statistic: (n_variables,)},
+    'left_out': {statistic: (n_groups, n_variables)}} with the statistics
+    count, chi_square, p_value and cramers_v, left_out also holding
+    delta_cramers_v, and full the jackknife cramers_v_se."""
+    counts = bin_counts.sum(axis=-1)
+    total_count = counts.sum(axis=0)
+    left_out_count = total_count - counts
+    if bin_weights is None:
+        full_bins = bin_counts.sum(axis=0)
+        left_out_bins = full_bins - bin_counts
+    else:
+        left_out_bins = exclusive_sums(bin_weights)
+        full_bins = left_out_bins[0] + bin_weights[0]
+
+    full = dict(zip(('chi_square', 'p_value', 'cramers_v'), uniformity_statistics(full_bins, total_count)))
+    full['count'] = total_count
+    left_out = dict(zip(('chi_square', 'p_value', 'cramers_v'),
+                        uniformity_statistics(left_out_bins, left_out_count)))
+    left_out['count'] = left_out_count
+    left_out['delta_cramers_v'] = left_out['cramers_v'] - full['cramers_v']
+
+    n_groups = len(bin_counts)
+    pseudo_mean = left_out['cramers_v'].mean(axis=0)
+    full['cramers_v_se'] = np.sqrt((n_groups - 1) / n_groups
+                                   * np.sum((left_out['cramers_v'] - pseudo_mean) ** 2, axis=0))
+    return {'full': full, 'left_out': left_out}
+
+
+def influence_results(table, influence, n_influential=N_INFLUENTIAL):
+    """JSON form of a leave_one_out result for the groups of a GroupTable:
+    per variable, the full statistics, the groups whose removal changes
+    Cramér's V most, and every group's leave-one-out values in group order.
+    log10 p-values stay finite where the energy-weighted ones underflow."""
+    full, left_out = influence['full'], influence['left_out']
+    dof = table.bin_edges.shape[1] - 2
+    results = {}
+    for j, var in enumerate(table.variables):
+        delta = left_out['delta_cramers_v'][:, j]
+        order = np.argsort(-np.abs(delta), kind='stable')[:n_influential]
+        results[var] = {
+            "full": {
+                "chi_square": round(float(full['chi_square'][j]), 4),
+                "p_value": float(full['p_value'][j]),
+                "log10_p_value": round(log10_p_value(full['chi_square'][j], dof), 4),
+                "cramers_v": round(float(full['cramers_v'][j]), 6),
+                "cramers_v_jackknife_se": round(float(full['cramers_v_se'][j]), 6),
+            },
+            "most_influential_groups": [
+                {"group": table.groups[i].item(), "count": int(table['count'][i]),
+                 "delta_cramers_v": round(float(delta[i]), 6)}
+                for i in order
+            ],
+            "left_out": {
+                "chi_square": [round(float(c), 4) for c in left_out['chi_square'][:, j]],
+                "p_value": left_out['p_value'][:, j].tolist(),
+                "log10_p_value": [round(log10_p_value(c, dof), 4) for c in left_out['chi_square'][:, j]],
+                "cramers_v": [round(float(v), 6) for v in left_out['cramers_v'][:, j]],
+                "delta_cramers_v": [round(float(d), 6) for d in delta],
+            },
+        }
+    return results
+
+
+def group_influence(columns, group_column=GROUP_COLUMN, variables=VARIABLES):
+    """Leave-one-group-out results of the count (Case 3A) and energy-weighted
+    (Case 4A) statistics, from one grouped pass over the records."""
+    energy = calculate_energy(np.asarray(columns['v_val'], dtype=float))
+    table = group_statistics(columns, group_column, variables, weights=energy)
+    return {
+        "group_column": group_column,
+        "n_groups": len(table),
+        "groups": table.groups.tolist(),
+        "count": table['count'].tolist(),
+        "binning_approach": "max(variable) / 16 over the full population",
+        "case_3a": influence_results(table, leave_one_out(table['bin_counts'])),
+        "case_4a": influence_results(table, leave_one_out(table['bin_counts'], table['bin_weights'])),
+    }
+
+
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+
+
+def main():
+    columns = load_record_columns(DATA_PATH, [GROUP_COLUMN, 'v_val', *VARIABLES])
+    results = group_influence(columns)
+    print(f"Leave-one-out over {results['n_groups']} {results['group_column']} groups")
+    for case in ('case_3a', 'case_4a'):
+        for var, var_results in results[case].items():
+            top = var_results['most_influential_groups'][0]
+            print(f"  {case} {var}: Cramér's V {var_results['full']['cramers_v']} "
+                  f"(jackknife SE {var_results['full']['cramers_v_jackknife_se']}); "
+                  f"without {top['group']}: {top['delta_cramers_v']:+.6f}")
+    write_results(results)
+
+
+if __name__ == '__main__':
+    main()
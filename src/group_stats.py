@@ -0,0 +1,212 @@
+"""
+Group Stats - Blind Study (Approach Two)
+Per-group statistics of x_val, y_val and z_val for every a_val group (or any
+integer or discrete grouping column) in one grouped pass, never a filtered
+DataFrame per group:
+    - group codes from one np.unique of the grouping column
+    - one stable argsort by code; counts, sums, extrema and centered sums of
+      squares of every (group, variable) are reduceat segments of the sorted
+      (n_variables, n_records) block
+    - 16-bin histograms over the full-dataset [0, max] of each variable (the
+      binning of Cases 3A and 3B) from one stratified_bincount
+    - chi-square against uniform, its p-value and Cramér's V, vectorized
+      over the (group, variable) histogram rows
+    - optionally, per-bin sums of a weight (Case 4A's energy) from the same
+      bincount, and the Rayleigh test's cos/sin sums of every group
+The result is a GroupTable: one array per statistic, indexed by group, so
+thousands of groups cost a few array operations rather than a Python loop.
+
+Usage:
+    python src/group_stats.py                  # a_val groups of record_vals.csv
+Outputs results to output/case_0_group_statistics.json.
+"""
+
+import json
+import os
+import numpy as np
+from scipy import stats
+
+from data_store import load_record_columns
+from histogram_kernels import bin_index_block, stratified_bincount
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
+OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_0_group_statistics.json')
+
+N_BINS = 16
+GROUP_COLUMN = 'a_val'
+VARIABLES = ('x_val', 'y_val', 'z_val')
+
+
+class GroupTable:
+    """Statistics of every (group, variable): arrays of shape (n_groups,),
+    (n_groups, n_variables) or, for the histograms, (n_groups, n_variables, n_bins)."""
+
+    def __init__(self, group_column, groups, variables, arrays, bin_edges):
+        self.group_column = group_column
+        self.groups = groups
+        self.variables = list(variables)
+        self.arrays = arrays
+        self.bin_edges = bin_edges
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __getitem__(self, stat):
+        return self.arrays[stat]
+
+    def index(self, group):
+        """Row of a group value."""
+        row = int(np.searchsorted(self.groups, group))
+        if row == len(self.groups) or self.groups[row] != group:
+            raise KeyError(f"No {self.group_column} group {group}")
+        return row
+
+    def column(self, stat, var):
+        """stat of var over the groups, e.g. table.column('cramers_v', 'x_val')."""
+        return self.arrays[stat][:, self.variables.index(var)]
+
+    def to_dict(self):
+        """Columnar JSON form: one list per statistic, in group order."""
+        per_variable = {}
+        for j, var in enumerate(self.variables):
+            per_variable[var] = {
+                "mean": [round(float(m), 4) for m in self.arrays['mean'][:, j]],
+                "std_dev": [round(float(s), 4) for s in self.arrays['std'][:, j]],
+                "min": self.arrays['min'][:, j].tolist(),
+                "max": self.arrays['max'][:, j].tolist(),
+                "chi_square": [round(float(c), 4) for c in self.arrays['chi_square'][:, j]],
+                "p_value": self.arrays['p_value'][:, j].tolist(),
+                "cramers_v": [round(float(v), 6) for v in self.arrays['cramers_v'][:, j]],
+                "bin_counts": self.arrays['bin_counts'][:, j].tolist(),
+                "bin_edges": [round(float(e), 2) for e in self.bin_edges[j]],
+            }
+        return {
+            "group_column": self.group_column,
+            "n_groups": len(self.groups),
+            "groups": self.groups.tolist(),
+            "count": self.arrays['count'].tolist(),
+            "variables": per_variable,
+        }
+
+
+def group_codes(group_values):
+    """(sorted distinct groups, code of every record): NaN groups get code -1."""
+    group_values = np.asarray(group_values)
+    valid = ~np.isnan(group_values) if group_values.dtype.kind == 'f' else np.ones(len(group_values), bool)
+    groups, codes = np.unique(group_values[valid], return_inverse=True)
+    if valid.all():
+        return groups, codes
+    all_codes = np.full(len(group_values), -1, dtype=np.intp)
+    all_codes[valid] = codes
+    return groups, all_codes
+
+
+def grouped_moments(codes, block, n_groups):
+    """Counts and per-(group, row of block) sums, minima, maxima and centered
+    sums of squares from one stable argsort by code; records with code -1 are
+    left out. Every group must hold a record."""
+    order = np.argsort(codes, kind='stable')
+    order = order[codes[order] >= 0]
+    counts = np.bincount(codes[order], minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ordered = block[:, order]
+    sums = np.add.reduceat(ordered, starts, axis=1)
+    means = sums / counts
+    m2 = np.add.reduceat((ordered - np.repeat(means, counts, axis=1)) ** 2, starts, axis=1)
+    return {
+        'count': counts,
+        'sum': sums.T,
+        'mean': means.T,
+        'm2': m2.T,
+        'min': np.minimum.reduceat(ordered, starts, axis=1).T,
+        'max': np.maximum.reduceat(ordered, starts, axis=1).T,
+    }
+
+
+def grouped_trig_sums(codes, block, n_groups):
+    """(n_groups, n_rows) sums of cos(theta) and sin(theta) per group and row
+    of block, theta = 2*pi * (value - min) / (max - min) over each whole row."""
+    keep = codes >= 0
+    cos_sums = np.zeros((n_groups, len(block)))
+    sin_sums = np.zeros((n_groups, len(block)))
+    for j, row in enumerate(block):
+        min_val, max_val = row.min(), row.max()
+        if max_val == min_val:
+            continue
+        theta = 2 * np.pi * (row[keep] - min_val) / (max_val - min_val)
+        cos_sums[:, j] = np.bincount(codes[keep], weights=np.cos(theta), minlength=n_groups)
+        sin_sums[:, j] = np.bincount(codes[keep], weights=np.sin(theta), minlength=n_groups)
+    return cos_sums, sin_sums
+
+
+def uniformity_statistics(bin_counts, n_events=None):
+    """Chi-square against uniform, p-value and Cramér's V of every row of
+    (..., n_bins) bin counts. For energy sums in place of counts, n_events
+    gives the event count of each row, Cramér's V being based on count (as
+    in Case 4A)."""
+    total = bin_counts.sum(axis=-1)
+    n = total if n_events is None else n_events
+    k = bin_counts.shape[-1]
+    expected = total / k
+    with np.errstate(invalid='ignore', divide='ignore'):
+        chi2 = np.sum((bin_counts - expected[..., None]) ** 2, axis=-1) / expected
+        cramers_v = np.sqrt(chi2 / (n * (k - 1)))
+    return chi2, stats.chi2.sf(chi2, k - 1), cramers_v
+
+
+def group_statistics(columns, group_column=GROUP_COLUMN, variables=VARIABLES, max_vals=None, n_bins=N_BINS,
+                     weights=None, summation='kahan', rayleigh=False):
+    """GroupTable of the records given by columns (a DataFrame or a mapping of
+    column name to array), grouped by the distinct values of group_column.
+    Histograms span [0, max] per variable with the full-dataset max unless
+    max_vals gives it. Raises ValueError when no record has a group value.
+    With weights (e.g. Case 4A's energy of each record),
+    the same bincount also sums them per (group, variable, bin) into
+    'bin_weights', with the given summation (see weighted_bincount). With
+    rayleigh, 'cos_sum' and 'sin_sum' hold each group's sums of cos(theta)
+    and sin(theta), theta mapping the full-dataset [min, max] of each variable
+    onto [0, 2*pi] as Case 3A's Rayleigh test does (zero for a constant
+    variable, whose Rayleigh test Case 3A reports as Z = 0)."""
+    groups, codes = group_codes(columns[group_column])
+    if len(groups) == 0:
+        raise ValueError(f"No {group_column} groups: {len(codes)} records, none with a {group_column} value")
+    block = np.empty((len(variables), len(codes)))
+    for row, var in zip(block, variables):
+        row[:] = columns[var]
+    if max_vals is None:
+        max_vals = {var: float(np.max(columns[var])) for var in variables}
+
+    arrays = grouped_moments(codes, block, len(groups))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        arrays['std'] = np.sqrt(arrays['m2'] / (arrays['count'][:, None] - 1))
+    bin_block = bin_index_block(list(block), [max_vals[var] for var in variables], n_bins)
+    arrays['bin_counts'], bin_weights = stratified_bincount(codes, bin_block, len(groups), n_bins,
+                                                            weights=weights, summation=summation)
+    if bin_weights is not None:
+        arrays['bin_weights'] = bin_weights
+    if rayleigh:
+        arrays['cos_sum'], arrays['sin_sum'] = grouped_trig_sums(codes, block, len(groups))
+    arrays['chi_square'], arrays['p_value'], arrays['cramers_v'] = uniformity_statistics(arrays['bin_counts'])
+    bin_edges = np.array([np.arange(n_bins + 1) * (max_vals[var] / n_bins) for var in variables])
+    return GroupTable(group_column, groups, variables, arrays, bin_edges)
+
+
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+
+
+def main():
+    table = group_statistics(load_record_columns(DATA_PATH))
+    print(f"{len(table)} {table.group_column} groups")
+    for var in table.variables:
+        significant = int(np.sum(table.column('p_value', var) < 0.05))
+        print(f"  {var}: {significant} groups non-uniform at p < 0.05, "
+              f"Cramér's V {table.column('cramers_v', var).min():.4f} to {table.column('cramers_v', var).max():.4f}")
+    write_results(table.to_dict())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Null Library - Blind Study (Approach Two)
+Persistent library of synthetic null distributions for the uniform null of
+cases 3A and 3B. Uniform values in [0, max] binned into k equal-width bins
+fill them as a multinomial draw whatever max is, so the null distribution of
+the chi-square statistic depends on (n_records, n_bins) only, not on the
+variable or the stratum being tested. Two null types cover the two binnings:
+    'fixed_max'  Case 3B, bins of [0, dataset max]: Multinomial(n, 1/k)
+    'own_max'    Case 3A, each catalog binned against its own maximum, which
+                 always lands in the last bin: Multinomial(n - 1, 1/k) plus
+                 one record in the last bin (see case_3a's multinomial engine)
+The library draws those counts directly and keeps each distribution as one
+sorted array of statistics, keyed by
+    (null type, n_records, n_bins, seed, catalog count)
+so every variable, stratum and run with the same sample size shares one
+array, and a percentile rank is one binary search, O(log m) in the number of
+catalogs. Catalog chunks draw from keyed streams (see rng_streams), so asking
+for more catalogs than are stored generates only the missing chunks and
+merges them into the sorted array of the largest stored prefix.
+
+Layout:
+    <root>/<null type>/k<n_bins>/n<n_records>/seed<seed>-chunk<size>-m<count>.npy
+"""
+
+import glob
+import os
+import re
+import tempfile
+import numpy as np
+
+from data_store import CACHE_DIR
+from rng_streams import CATALOG_CHUNK_SIZE, SEED, catalog_chunks, chunk_rng
+from synthetic_ranks import exceedance_threshold
+
+LIBRARY_DIR = os.path.join(CACHE_DIR, 'nulls')
+
+
+def chi_square_statistics(counts):
+    """Row-wise chi-square statistic of (n_catalogs, n_bins) counts against the uniform distribution."""
+    expected = counts.sum(axis=1) / counts.shape[1]
+    return np.sum((counts - expected[:, None]) ** 2 / expected[:, None], axis=1)
+
+
+def fixed_max_statistics(n_records, n_bins, n_catalogs, rng):
+    """Chi-square statistics of n_catalogs catalogs binned against a fixed maximum."""
+    return chi_square_statistics(rng.multinomial(n_records, np.full(n_bins, 1 / n_bins), size=n_catalogs))
+
+
+def own_max_statistics(n_records, n_bins, n_catalogs, rng):
+    """Chi-square statistics of n_catalogs catalogs each binned against its own maximum."""
+    counts = rng.multinomial(n_records - 1, np.full(n_bins, 1 / n_bins), size=n_catalogs)
+    counts[:, -1] += 1
+    return chi_square_statistics(counts)
+
+
+NULL_GENERATORS = {'fixed_max': fixed_max_statistics, 'own_max': own_max_statistics}
+NULL_TYPES = tuple(NULL_GENERATORS)
+
+
+class SortedNull:
+    """Sorted synthetic chi-square statistics of one library entry."""
+
+    def __init__(self, statistics, path=None):
+        self.statistics = statistics
+        self.count = len(statistics)
+        self.path = path
+
+    def exceedances(self, real_stat):
+        """Number of catalogs at least as extreme as real_stat (see synthetic_ranks)."""
+        return self.count - int(np.searchsorted(self.statistics, exceedance_threshold(real_stat), side='left'))
+
+    def percentile(self, real_stat):
+        return float(self.exceedances(real_stat) / self.count * 100)
+
+
+class NullLibrary:
+    """On-disk library of SortedNull entries under root. Entries loaded or
+    generated through one NullLibrary are kept in memory for its lifetime."""
+
+    def __init__(self, root=LIBRARY_DIR, seed=SEED, chunk_size=CATALOG_CHUNK_SIZE):
+        self.root = root
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self._loaded = {}
+
+    def _entry_dir(self, null_type, n_records, n_bins):
+        return os.path.join(self.root, null_type, f"k{n_bins}", f"n{n_records}")
+
+    def entry_path(self, null_type, n_records, n_bins, count):
+        return os.path.join(self._entry_dir(null_type, n_records, n_bins),
+                            f"seed{self.seed}-chunk{self.chunk_size}-m{count}.npy")
+
+    def counts(self, null_type, n_records, n_bins):
+        """Catalog counts stored for (null type, n_records, n_bins), ascending."""
+        pattern = re.compile(rf"seed{self.seed}-chunk{self.chunk_size}-m(\d+)\.npy$")
+        paths = glob.glob(os.path.join(self._entry_dir(null_type, n_records, n_bins), '*.npy'))
+        return sorted(int(m.group(1)) for m in map(pattern.search, paths) if m)
+
+    def _save(self, path, statistics):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, statistics)
+        os.replace(tmp_path, path)
+
+    def null(self, n_records, n_bins, count, null_type):
+        """SortedNull of the first count catalogs for (n_records, n_bins),
+        read from the library or extended from its largest stored prefix."""
+        if null_type not in NULL_GENERATORS:
+            raise ValueError(f"Unknown null type: {null_type}")
+        key = (null_type, n_records, n_bins, count)
+        if key in self._loaded:
+            return self._loaded[key]
+        path = self.entry_path(null_type, n_records, n_bins, count)
+        if os.path.exists(path):
+            statistics = np.load(path)
+        else:
+            # Only whole-chunk prefixes can be extended: a partial last chunk is a
+            # prefix of its stream, so extending it would mean regenerating it
+            base = max((m for m in self.counts(null_type, n_records, n_bins)
+                        if m < count and m % self.chunk_size == 0), default=0)
+            statistics = (np.load(self.entry_path(null_type, n_records, n_bins, base)) if base
+                          else np.empty(0))
+            generate = NULL_GENERATORS[null_type]
+            case = f"null_library/{null_type}"
+            new = np.concatenate([
+                generate(n_records, n_bins, stop - start, chunk_rng(case, n_records, f"k{n_bins}", k, self.seed))
+                for k, start, stop in catalog_chunks(count, self.chunk_size) if start >= base
+            ])
+            new.sort()
+            statistics = np.insert(statistics, np.searchsorted(statistics, new), new)
+            self._save(path, statistics)
+        self._loaded[key] = SortedNull(statistics, path)
+        return self._loaded[key]
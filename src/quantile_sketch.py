@@ -0,0 +1,133 @@
+"""
+Quantile Sketch - Blind Study (Approach Two)
+Mergeable KLL quantile sketch (Karnin, Lang & Liberty 2016) for stratum
+boundaries over data streamed in blocks. Level h holds items standing for 2^h
+records each; a level over its capacity k * (2/3)^(depth - h) is sorted and
+every other item, from a random offset, is promoted to level h + 1. The sketch
+keeps O(k log(n / k)) items whatever n is, and sketches of separate blocks or
+workers merge level by level into the sketch of their union.
+
+Each compaction at level h shifts any rank by 0 or +-2^h with equal
+probability, independently of the others, so the sketch accumulates the sum of
+squared compaction weights and reports a Hoeffding bound on the rank error of
+any query:
+    P(|rank error| >= t) <= 2 exp(-t^2 / (2 sum w^2))
+Queries treat the retained items as records with their weights, so quantiles
+follow the same linear interpolation as the exact ones (see count_cube.quantile).
+Compaction offsets come from a keyed stream (see rng_streams): a sketch is
+reproducible for a given block order. The rank error bound assumes
+independent offsets, so every sketch merged into another must draw from its
+own (stream, block) key.
+"""
+
+import numpy as np
+
+from count_cube import quantile
+from rng_streams import SEED, chunk_rng
+
+SKETCH_K = 200
+SKETCH_BLOCK_ROWS = 1 << 20
+CAPACITY_RATIO = 2 / 3
+RANK_CONFIDENCE = 0.99
+
+
+class KLLSketch:
+    """KLL sketch of a stream of float values; NaNs are skipped."""
+
+    def __init__(self, k=SKETCH_K, seed=SEED, stream=0, block=0):
+        if k < 8:
+            raise ValueError(f"Sketch size k must be at least 8, got {k}")
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        # Sum of squared compaction weights: the variance proxy of the rank error
+        self.squared_weights = 0.0
+        self._rng = chunk_rng('quantile_sketch', stream, 'kll', block, seed)
+
+    def capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * CAPACITY_RATIO ** depth)))
+
+    @property
+    def n_retained(self):
+        return sum(len(items) for items in self.levels)
+
+    def update(self, values):
+        """Add a block of values to the sketch."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold other, a sketch of disjoint data, into this one."""
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge sketches of k={other.k} and k={self.k}")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.squared_weights += other.squared_weights
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind, so compaction pairs up the rest
+                kept, paired = items[:len(items) % 2], items[len(items) % 2:]
+                promoted = paired[int(self._rng.integers(2))::2]
+                self.levels[level] = kept
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.squared_weights += 4.0 ** level
+            level += 1
+
+    def weighted_items(self):
+        """Retained items in increasing order and the number of records each stands for."""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level, dtype=np.int64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        return values[order], weights[order]
+
+    def quantile(self, q):
+        """Approximate q-quantile, interpolated as np.quantile's linear method."""
+        if self.n == 0:
+            raise ValueError("Quantile of an empty sketch")
+        values, weights = self.weighted_items()
+        return quantile(values, weights, q)
+
+    def quantiles(self, levels):
+        values, weights = self.weighted_items()
+        return np.array([quantile(values, weights, q) for q in levels])
+
+    def rank(self, value):
+        """Approximate number of records at or below value."""
+        values, weights = self.weighted_items()
+        return int(weights[:np.searchsorted(values, value, side='right')].sum())
+
+    def rank_error(self, confidence=RANK_CONFIDENCE):
+        """Bound on the error of any rank, as a fraction of n, holding with the
+        given probability (Hoeffding over the compactions so far)."""
+        if self.n == 0:
+            return 0.0
+        return float(np.sqrt(2 * self.squared_weights * np.log(2 / (1 - confidence))) / self.n)
+
+
+def sketch_blocks(values, k=SKETCH_K, block_rows=SKETCH_BLOCK_ROWS, seed=SEED):
+    """KLLSketch of values (an array or memory map) fed block by block, one
+    sketch per block merged into the first as separate workers would."""
+    n_rows = len(values)
+    sketch = KLLSketch(k, seed, stream=0)
+    for block, start in enumerate(range(0, n_rows, block_rows)):
+        block_sketch = KLLSketch(k, seed, stream=block).update(values[start:start + block_rows])
+        sketch = block_sketch if block == 0 else sketch.merge(block_sketch)
+    return sketch
@@ -0,0 +1,150 @@
+"""
+Result Cache - Blind Study (Approach Two)
+Content-addressed memoization of the pipeline's case results and figures.
+A stage's key is the SHA-256 of
+    - the code version: the source of the stage's module and of every module
+      in src/ it imports, transitively (so N_BINS, N_SYNTHETIC, ALPHA, seeds
+      and filters, which live in that source, are covered), plus the numpy,
+      scipy, pandas and matplotlib versions
+    - the content hashes of its inputs: source data files, upstream results
+    - its run parameters
+A stage whose key is in the cache is not rerun: its results JSON is read
+back. Figures are keyed the same way on the visualization module and the
+files it reads; the PNGs a render wrote are recorded with their hashes, and
+the render is skipped while the key matches and those files are unchanged.
+
+Layout:
+    <root>/<stage>-<key>.json          cached results of one stage
+    <root>/figures-<name>.json         key and PNG hashes of the last render
+"""
+
+import ast
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from data_store import CACHE_DIR, file_hash
+
+RESULT_CACHE_DIR = os.path.join(CACHE_DIR, 'results')
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _library_versions():
+    versions = {"numpy": np.__version__, "scipy": scipy.__version__, "pandas": pd.__version__}
+    try:
+        import matplotlib
+        versions["matplotlib"] = matplotlib.__version__
+    except ImportError:
+        pass
+    return versions
+
+
+def local_imports(source):
+    """Top-level names of the modules imported by a module's source."""
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split('.')[0])
+    return names
+
+
+def code_digest(module_name, src_dir=SRC_DIR):
+    """SHA-256 of the source of module_name and of every module of src_dir it
+    imports, directly or transitively, and of the numerical library versions."""
+    sources = {}
+    pending = [module_name]
+    while pending:
+        name = pending.pop()
+        path = os.path.join(src_dir, f"{name}.py")
+        if name in sources or not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            sources[name] = f.read()
+        pending.extend(local_imports(sources[name]))
+    digest = hashlib.sha256()
+    for name in sorted(sources):
+        digest.update(name.encode('utf-8') + b'\0' + sources[name] + b'\0')
+    digest.update(json.dumps(_library_versions(), sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def json_digest(obj):
+    """SHA-256 of a JSON-serializable object, independent of key order."""
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=float).encode('utf-8')).hexdigest()
+
+
+def stage_key(module_name, inputs, params):
+    """Cache key of one stage: code version, {input name: content digest}, parameters."""
+    return json_digest({"code": code_digest(module_name), "inputs": inputs, "params": params})
+
+
+def file_inputs(paths):
+    """{file name: SHA-256} of the existing files among paths."""
+    return {os.path.basename(path): file_hash(path) for path in paths if os.path.exists(path)}
+
+
+def _write_json(path, obj, indent=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.json', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(obj, f, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class ResultCache:
+    """Results and figure manifests under root, addressed by stage_key."""
+
+    def __init__(self, root=RESULT_CACHE_DIR):
+        self.root = root
+
+    def _results_path(self, stage, key):
+        return os.path.join(self.root, f"{stage}-{key}.json")
+
+    def get(self, stage, key):
+        """Cached results of stage for key, or None."""
+        return _read_json(self._results_path(stage, key))
+
+    def put(self, stage, key, results):
+        _write_json(self._results_path(stage, key), results)
+
+    def _figures_path(self, name):
+        return os.path.join(self.root, f"figures-{name}.json")
+
+    def figures_current(self, name, key):
+        """Whether the figures of name were rendered for key and are unchanged on disk."""
+        manifest = _read_json(self._figures_path(name))
+        if manifest is None or manifest['key'] != key or not manifest['files']:
+            return False
+        return all(os.path.exists(path) and file_hash(path) == digest
+                   for path, digest in manifest['files'].items())
+
+    def render(self, name, key, render, output_dir):
+        """Call render() unless the figures of name are current for key, and
+        record the PNGs it wrote under output_dir. Returns True if it rendered."""
+        if self.figures_current(name, key):
+            return False
+
+        def snapshot():
+            return {entry.path: entry.stat().st_mtime_ns for entry in os.scandir(output_dir)
+                    if entry.name.endswith('.png')} if os.path.isdir(output_dir) else {}
+        before = snapshot()
+        render()
+        written = [path for path, mtime in snapshot().items() if before.get(path) != mtime]
+        _write_json(self._figures_path(name),
+                    {"key": key, "files": {path: file_hash(path) for path in sorted(written)}}, indent=2)
+        return True
@@ -0,0 +1,39 @@
+"""
+RNG Streams - Blind Study (Approach Two)
+Keyed random streams for the synthetic null generators of cases 3A, 3B, 4A and 4B.
+Every block of CATALOG_CHUNK_SIZE catalogs for a given (case, stratum, variable)
+draws from its own SeedSequence, keyed by
+    (case, stratum, variable, catalog chunk)
+so catalog i of z_val no longer depends on how many draws x_val and y_val
+consumed first. Chunks can be generated in any order, on any number of workers,
+or resumed midway, and the catalogs come out identical.
+"""
+
+import numpy as np
+
+SEED = 42
+CATALOG_CHUNK_SIZE = 100
+FULL_POPULATION = 0
+
+
+def _name_key(name):
+    """Stable non-negative integer for a string key component."""
+    return int.from_bytes(str(name).encode('utf-8'), 'big')
+
+
+def stream_seed(case, stratum, variable, chunk, seed=SEED):
+    """SeedSequence for one catalog chunk.
+    stratum is FULL_POPULATION (0) for unstratified cases, 1..n otherwise."""
+    return np.random.SeedSequence(seed, spawn_key=(_name_key(case), int(stratum), _name_key(variable), int(chunk)))
+
+
+def chunk_rng(case, stratum, variable, chunk, seed=SEED):
+    """Generator for one catalog chunk."""
+    return np.random.default_rng(stream_seed(case, stratum, variable, chunk, seed))
+
+
+def catalog_chunks(n_synthetic, chunk_size=CATALOG_CHUNK_SIZE):
+    """(chunk index, first catalog, stop) for every chunk covering n_synthetic catalogs.
+    chunk_size is part of the stream key: changing it changes the catalogs."""
+    return [(k, start, min(start + chunk_size, n_synthetic))
+            for k, start in enumerate(range(0, n_synthetic, chunk_size))]
@@ -0,0 +1,279 @@
+"""
+Pipeline Runner - Blind Study (Approach Two)
+Runs the eight analysis cases in one process, in dependency order:
+    0 -> 1 -> 3a -> 3b -> 4a -> 4b, with 2 and 2b on an independent branch.
+The record and timestamp data are loaded once, independent cases run
+concurrently, and upstream results are handed to later cases in memory.
+Results JSON files are written only after every selected stage has finished,
+and only where they changed. Stage results are memoized in a content-addressed
+result cache keyed on code, inputs and parameters (see result_cache): a stage
+whose key is cached is read back instead of rerun, and with --figures a
+case's PNGs are re-rendered only when its visualization code or inputs changed.
+
+Usage:
+    python src/run_pipeline.py                 # all stages
+    python src/run_pipeline.py --only 3b       # one stage, upstream read from output/
+    python src/run_pipeline.py --since 4a      # 4a and everything downstream of it
+    python src/run_pipeline.py --cube          # record stages from the count cube (see count_cube)
+    python src/run_pipeline.py --memory-limit 2G # stages 0, 1, 3a as chunked scans (see chunked_scan)
+    python src/run_pipeline.py --figures       # also render the figures of the selected stages
+    python src/run_pipeline.py --no-cache      # recompute every stage and figure
+"""
+
+import argparse
+import importlib
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import case_0_population_analysis as case_0
+import case_1_blind_analysis as case_1
+import case_2_blind_analysis as case_2
+import case_2b_blind_analysis as case_2b
+import case_3a_blind_analysis as case_3a
+import case_3b_blind_analysis as case_3b
+import case_4a_blind_analysis as case_4a
+import case_4b_blind_analysis as case_4b
+from chunked_scan import parse_memory_limit
+from count_cube import load_cube
+from data_store import RECORDS_PATH, TIMESTAMPS_PATH, load_records, load_timestamps
+from result_cache import ResultCache, file_inputs, json_digest, stage_key
+
+# stage -> (module, ordering dependencies, upstream results passed as keyword arguments, data source)
+STAGES = {
+    '0': (case_0, (), {}, 'records'),
+    '1': (case_1, ('0',), {}, 'records'),
+    '2': (case_2, (), {}, 'timestamps'),
+    '2b': (case_2b, (), {}, 'timestamps'),
+    '3a': (case_3a, ('1',), {}, 'records'),
+    '3b': (case_3b, ('3a',), {}, 'records'),
+    '4a': (case_4a, ('3b',), {'case_3a': '3a'}, 'records'),
+    '4b': (case_4b, ('4a',), {'case_3b': '3b', 'case_4a': '4a'}, 'records'),
+}
+STAGE_ORDER = list(STAGES)
+# Record stages that can scan the records block by block within a memory limit
+CHUNKED_STAGES = ('0', '1', '3a')
+DATA_PATHS = {'records': RECORDS_PATH, 'timestamps': TIMESTAMPS_PATH}
+# stage -> visualization module, imported only when figures are rendered
+FIGURES = {
+    '0': 'visualization_case_0',
+    '1': 'visualization_case_1_blind',
+    '2': 'visualization_case_2_blind',
+    '2b': 'visualization_case_2b_blind',
+    '3a': 'visualization_case_3a_blind',
+    '3b': 'visualization_case_3b_blind',
+    '4a': 'visualization_case_4a_blind',
+    '4b': 'visualization_case_4b_blind',
+}
+
+
+class _StageOutput(io.TextIOBase):
+    """sys.stdout replacement that gives each worker thread its own buffer,
+    so concurrently running stages print their logs as whole blocks."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.buffer = io.StringIO()
+
+    def end(self):
+        buffer = self._local.buffer
+        del self._local.buffer
+        return buffer.getvalue()
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        return (buffer or self._stream).write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+
+def descendants(stage):
+    """stage plus every stage that depends on it, directly or transitively."""
+    selected = {stage}
+    changed = True
+    while changed:
+        changed = False
+        for name, (_, deps, _, _) in STAGES.items():
+            if name not in selected and selected.intersection(deps):
+                selected.add(name)
+                changed = True
+    return selected
+
+
+def select_stages(only=None, since=None):
+    """Stages to run, in pipeline order."""
+    if only:
+        selected = set(only)
+    elif since:
+        selected = descendants(since)
+    else:
+        selected = set(STAGE_ORDER)
+    return [name for name in STAGE_ORDER if name in selected]
+
+
+def load_upstream(stage):
+    """Read a stage's previously written results from output/."""
+    module = STAGES[stage][0]
+    try:
+        with open(module.OUTPUT_PATH, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def stage_cache_key(stage, kwargs, cube=False):
+    """Result cache key of a stage: its code, the hash of its data file and of
+    the upstream results it is handed, and whether it runs on the count cube."""
+    module, _, _, source = STAGES[stage]
+    inputs = file_inputs([DATA_PATHS[source]])
+    inputs.update({arg: json_digest(value) for arg, value in kwargs.items()})
+    return stage_key(module.__name__, inputs, {"cube": bool(cube and source == 'records')})
+
+
+def run_pipeline(stages, max_workers=4, cube=False, cache=None, memory_limit=None):
+    """Run the selected stages, honouring dependencies among them.
+    With cube set, the record stages run on the count cube of the records
+    instead of the records themselves. With memory_limit (bytes) and no cube,
+    the CHUNKED_STAGES scan the records block by block within it; their results
+    are identical, so they share the cache entries of the in-memory stages.
+    With cache set to a ResultCache, stages whose key is cached are read back
+    instead of run, and the results of the others are added to it. Data is
+    loaded only if some stage has to run.
+    Returns {stage: results dict}. Nothing is written to disk except the cache."""
+    data = {}
+    data_lock = threading.Lock()
+
+    def source_data(source):
+        with data_lock:
+            if source not in data:
+                if source == 'records':
+                    data[source] = load_cube() if cube else load_records()
+                else:
+                    data[source] = load_timestamps()
+            return data[source]
+
+    results = {}
+    pending = list(stages)
+    running = {}
+    output = _StageOutput(sys.stdout)
+    original_stdout = sys.stdout
+    sys.stdout = output
+
+    def execute(stage):
+        module, _, upstream, source = STAGES[stage]
+        kwargs = {}
+        for arg, upstream_stage in upstream.items():
+            kwargs[arg] = results[upstream_stage] if upstream_stage in results else load_upstream(upstream_stage)
+        start = time.perf_counter()
+        key = None
+        if cache is not None:
+            key = stage_cache_key(stage, kwargs, cube)
+            cached = cache.get(stage, key)
+            if cached is not None:
+                log = f"  [pipeline] stage {stage} unchanged: results read from the result cache\n"
+                return cached, log, time.perf_counter() - start
+        output.begin()
+        try:
+            if cube and source == 'records':
+                stage_results = module.run(cube=source_data(source), **kwargs)
+            elif memory_limit is not None and stage in CHUNKED_STAGES:
+                stage_results = module.run(memory_limit=memory_limit, **kwargs)
+            else:
+                stage_results = module.run(df=source_data(source), **kwargs)
+        finally:
+            log = output.end()
+        if cache is not None:
+            cache.put(stage, key, stage_results)
+        return stage_results, log, time.perf_counter() - start
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while pending or running:
+                for stage in list(pending):
+                    deps = [d for d in STAGES[stage][1] if d in stages]
+                    if all(d in results for d in deps):
+                        pending.remove(stage)
+                        running[pool.submit(execute, stage)] = stage
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    stage_results, log, elapsed = future.result()
+                    results[stage] = stage_results
+                    original_stdout.write(log)
+                    original_stdout.write(f"\n  [pipeline] stage {stage} finished in {elapsed:.2f}s\n\n")
+    finally:
+        sys.stdout = original_stdout
+
+    return results
+
+
+def write_all(results):
+    """Serialize every stage's results to its usual output path, leaving
+    files that already hold the same results untouched."""
+    for stage in STAGE_ORDER:
+        if stage in results:
+            if load_upstream(stage) == json.loads(json.dumps(results[stage])):
+                print(f"Results unchanged: {STAGES[stage][0].OUTPUT_PATH}")
+                continue
+            STAGES[stage][0].write_results(results[stage])
+
+
+def figure_key(module):
+    """Result cache key of a visualization: its code and every *_PATH file it reads."""
+    paths = [getattr(module, name) for name in dir(module) if name.endswith('_PATH')]
+    return stage_key(module.__name__, file_inputs(paths), {})
+
+
+def render_figures(stages, cache=None):
+    """Run the visualization of each stage, skipping those whose figures are
+    current in cache. Run after write_all: the figures read the results files."""
+    for stage in stages:
+        module = importlib.import_module(FIGURES[stage])
+        if cache is None:
+            module.main()
+        elif not cache.render(module.__name__, figure_key(module), module.main, module.OUTPUT_DIR):
+            print(f"Figures unchanged: stage {stage} ({module.__name__})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the blind-study analysis cases in one process")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--only', nargs='+', choices=STAGE_ORDER, metavar='STAGE',
+                       help=f"run only these stages ({', '.join(STAGE_ORDER)})")
+    group.add_argument('--since', choices=STAGE_ORDER, metavar='STAGE',
+                       help="run this stage and every stage downstream of it")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="maximum number of stages run concurrently (default 4)")
+    parser.add_argument('--cube', action='store_true',
+                        help="run the record stages on the count cube built from the records")
+    parser.add_argument('--memory-limit', type=parse_memory_limit, metavar='SIZE',
+                        help=f"run stages {', '.join(CHUNKED_STAGES)} as chunked scans of the records sized "
+                             "to stay within SIZE (e.g. 512M, 2G); results are identical")
+    parser.add_argument('--figures', action='store_true',
+                        help="render the figures of the selected stages after writing their results")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="ignore the result cache: rerun every stage and re-render every figure")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stages = select_stages(only=args.only, since=args.since)
+    print(f"Pipeline stages: {', '.join(stages)}")
+    cache = None if args.no_cache else ResultCache()
+    results = run_pipeline(stages, max_workers=args.workers, cube=args.cube, cache=cache,
+                           memory_limit=args.memory_limit)
+    write_all(results)
+    if args.figures:
+        render_figures(stages, cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Sliding Windows - Blind Study (Approach Two)
+Rolling Case 3A clustering statistics over consecutive a_val windows: when
+does clustering of x_val, y_val or z_val appear or disappear? A window of
+width w starting at group value a holds the groups a <= a_val < a + w; one
+window starts at each group value with the whole window inside the observed
+range. Every window is a difference of two prefix sums over the groups, so
+it costs O(bins) whatever its width, never a rescan of the records:
+    - bin counts: prefix sums of the (group, variable, bin) count matrix of
+      group_stats, exact in int64
+    - Rayleigh test: prefix sums of each group's sums of cos(theta) and
+      sin(theta)
+Per window: chi-square against uniform, p-value, Cramér's V, Rayleigh Z and
+its p-value. Bins are the full population's [0, max] and theta maps the full
+population's [min, max] of each variable, so all windows share one scale.
+The windows of several widths are evaluated together, in one call.
+
+Usage:
+    python src/sliding_windows.py                    # widths 5, 10 and 20
+    python src/sliding_windows.py --widths 3 8 15
+Outputs results to output/sliding_windows_blind.json.
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+
+from data_store import load_record_columns
+from group_stats import GROUP_COLUMN, VARIABLES, group_statistics, uniformity_statistics
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
+OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'sliding_windows_blind.json')
+
+WINDOW_WIDTHS = (5, 10, 20)
+ALPHA = 0.05
+
+
+def prefix_sums(rows):
+    """Sums of the first 0..n_groups rows of a (n_groups, ...) array, shape (n_groups + 1, ...)."""
+    return np.concatenate([np.zeros_like(rows[:1]), np.cumsum(rows, axis=0)])
+
+
+def window_bounds(groups, width):
+    """(lo, hi) row ranges of groups, sorted group values, for the windows
+    [a, a + width) starting at each group value a with a + width - 1 not past
+    the last group."""
+    if width < 1:
+        raise ValueError(f"Window width must be at least 1, got {width}")
+    starts = groups[groups + (width - 1) <= groups[-1]]
+    return np.searchsorted(groups, starts), np.searchsorted(groups, starts + width)
+
+
+def rayleigh_statistics(C, S, n):
+    """Case 3A's rayleigh_statistic, vectorized: Rayleigh Z and p-value from
+    arrays of cos(theta) sums, sin(theta) sums and counts."""
+    Z = (C**2 + S**2) / n
+    # Approximation with correction (Greenwood & Durand, 1955)
+    p_value = np.exp(-Z) * (1 + (2 * Z - Z**2) / (4 * n)
+                            - (24 * Z - 132 * Z**2 + 76 * Z**3 - 9 * Z**4) / (288 * n**2))
+    return Z, np.clip(p_value, 0.0, 1.0)
+
+
+def window_statistics(table, widths=WINDOW_WIDTHS):
+    """Statistics of every window of each width over the groups of a GroupTable
+    built with rayleigh=True. Returns {width: {statistic: array}}: 'first' and
+    'last' group value, 'n_groups' and 'count' per window, and (n_windows,
+    n_variables) chi_square, p_value, cramers_v, rayleigh_z and rayleigh_p.
+    All widths share one set of prefix sums and one vectorized evaluation."""
+    bounds = [window_bounds(table.groups, width) for width in widths]
+    lo = np.concatenate([b[0] for b in bounds])
+    hi = np.concatenate([b[1] for b in bounds])
+
+    count_prefix = prefix_sums(table['bin_counts'])
+    cos_prefix = prefix_sums(table['cos_sum'])
+    sin_prefix = prefix_sums(table['sin_sum'])
+    bin_counts = count_prefix[hi] - count_prefix[lo]
+    n = bin_counts.sum(axis=-1)
+    chi2, p_value, cramers_v = uniformity_statistics(bin_counts)
+    rayleigh_z, rayleigh_p = rayleigh_statistics(cos_prefix[hi] - cos_prefix[lo], sin_prefix[hi] - sin_prefix[lo], n)
+
+    results = {}
+    stops = np.cumsum([len(b[0]) for b in bounds])
+    for width, stop, (width_lo, width_hi) in zip(widths, stops, bounds):
+        rows = slice(stop - len(width_lo), stop)
+        results[width] = {
+            'first': table.groups[width_lo],
+            'last': table.groups[width_hi - 1],
+            'n_groups': width_hi - width_lo,
+            'count': n[rows, 0],
+            'chi_square': chi2[rows],
+            'p_value': p_value[rows],
+            'cramers_v': cramers_v[rows],
+            'rayleigh_z': rayleigh_z[rows],
+            'rayleigh_p': rayleigh_p[rows],
+        }
+    return results
+
+
+def window_results(table, windows):
+    """JSON form of window_statistics: per width, the windows and, per
+    variable, each statistic in window order."""
+    results = {}
+    for width, stats in windows.items():
+        width_results = {
+            "windows": {
+                "first": stats['first'].tolist(),
+                "last": stats['last'].tolist(),
+                "n_groups": stats['n_groups'].tolist(),
+                "count": stats['count'].tolist(),
+            },
+        }
+        for j, var in enumerate(table.variables):
+            p_value = stats['p_value'][:, j]
+            width_results[var] = {
+                "chi_square": [round(float(c), 4) for c in stats['chi_square'][:, j]],
+                "p_value": p_value.tolist(),
+                "cramers_v": [round(float(v), 6) for v in stats['cramers_v'][:, j]],
+                "rayleigh_z": [round(float(z), 4) for z in stats['rayleigh_z'][:, j]],
+                "rayleigh_p": stats['rayleigh_p'][:, j].tolist(),
+                "significant_windows": int(np.sum(p_value < ALPHA)),
+            }
+        results[str(width)] = width_results
+    return results
+
+
+def sliding_windows(columns, widths=WINDOW_WIDTHS, group_column=GROUP_COLUMN, variables=VARIABLES):
+    """Sliding-window results of the records, from one grouped pass over them."""
+    table = group_statistics(columns, group_column, variables, rayleigh=True)
+    return {
+        "group_column": group_column,
+        "n_groups": len(table),
+        "binning_approach": "max(variable) / 16 over the full population",
+        "widths": window_results(table, window_statistics(table, widths)),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sliding a_val-window clustering analysis (blind study)")
+    parser.add_argument('--widths', type=int, nargs='+', default=list(WINDOW_WIDTHS), metavar='W',
+                        help=f"window widths in a_val units (default {' '.join(map(str, WINDOW_WIDTHS))})")
+    return parser.parse_args(argv)
+
+
+def write_results(results, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    columns = load_record_columns(DATA_PATH, [GROUP_COLUMN, *VARIABLES])
+    results = sliding_windows(columns, args.widths)
+    for width, width_results in results['widths'].items():
+        windows = width_results['windows']
+        print(f"Width {width}: {len(windows['first'])} windows")
+        if not windows['first']:
+            continue
+        for var in VARIABLES:
+            cramers_v = width_results[var]['cramers_v']
+            peak = int(np.argmax(cramers_v))
+            print(f"  {var}: {width_results[var]['significant_windows']} windows non-uniform at p < {ALPHA}, "
+                  f"peak Cramér's V {cramers_v[peak]} for {windows['first'][peak]}-{windows['last'][peak]}")
+    write_results(results)
+
+
+if __name__ == '__main__':
+    main()
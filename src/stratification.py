@@ -0,0 +1,189 @@
+"""
+Stratification - Blind Study (Approach Two)
+Stratification engine of the stratified cases (3B, 4B and their figures).
+A spec names one or more keys, joined by '*' into a composite key whose
+strata are every combination of the keys' intervals:
+    v_val:q4                  v_val quartiles (the default)
+    v_val:q10                 v_val deciles, or any number of equal-probability quantiles
+    v_val:q0.1,0.5,0.9        v_val quantiles at arbitrary levels
+    v_val:e6.0,6.5,7.0        fixed v_val edges
+    v_val:q4*a_val:e1980,2000 v_val quartiles within each a_val era
+Intervals are closed on the right, (-inf, e_1], (e_1, e_2], ..., (e_m, inf),
+as in the original quartile conditions. Every record gets its stratum index
+once, by one searchsorted per key; strata are kept as that code array and as
+index arrays into the records, never as copies. Edges that would leave an
+interval of a key empty (quantiles repeated by tied values, or interpolated
+between two of them) are dropped, merging the interval into its neighbour.
+Records too many to hold are stratified without the quantiles of all of
+them: sketch_strata lays the strata out from mergeable quantile sketches of
+the key columns (see quantile_sketch), and Strata.assign codes each block.
+"""
+
+import numpy as np
+
+from count_cube import quantile
+from histogram_kernels import group_members
+
+DEFAULT_SPEC = 'v_val:q4'
+QUANTILE_NAMES = {2: 'halves', 3: 'terciles', 4: 'quartiles', 5: 'quintiles', 10: 'deciles', 100: 'percentiles'}
+
+
+def parse_spec(spec):
+    """[(column, kind, levels, n_quantiles)] of each key of spec: kind 'q' with
+    quantile levels or 'e' with edges; n_quantiles is n for a q<n> key, else None."""
+    keys = []
+    for part in spec.split('*'):
+        column, sep, rule = part.strip().partition(':')
+        if not sep or not column or rule[:1] not in ('q', 'e'):
+            raise ValueError(f"Invalid strata key {part!r}: expected column:q<n>, column:q<levels> "
+                             f"or column:e<edges>")
+        kind, body = rule[0], rule[1:]
+        n_quantiles = None
+        try:
+            if kind == 'q' and body.isdigit():
+                n_quantiles = int(body)
+                levels = [i / n_quantiles for i in range(1, n_quantiles)]
+            else:
+                levels = [float(level) for level in body.split(',')]
+        except ValueError:
+            raise ValueError(f"Invalid strata key {part!r}: levels must be numbers") from None
+        if n_quantiles == 0 or (kind == 'q' and not all(0 < q < 1 for q in levels)):
+            raise ValueError(f"Invalid strata key {part!r}: quantile levels must lie in (0, 1)")
+        if any(b <= a for a, b in zip(levels, levels[1:])):
+            raise ValueError(f"Invalid strata key {part!r}: levels must increase")
+        if column in [key[0] for key in keys]:
+            raise ValueError(f"Invalid strata spec {spec!r}: column {column} appears twice")
+        keys.append((column, kind, levels, n_quantiles))
+    return keys
+
+
+def key_edges(values, kind, levels, counts=None):
+    """Interval edges of one key: the levels themselves, or the quantiles of
+    values at the levels (of the values weighted by counts, as on a CountCube)."""
+    if kind == 'e':
+        return np.asarray(levels, dtype=float)
+    if counts is None:
+        return np.quantile(values, levels)
+    return np.array([quantile(values, counts, q) for q in levels])
+
+
+def _format_edge(edge):
+    return f"{edge:g}"
+
+
+def _interval_names(kind, levels, edges):
+    """Name of each interval of one key: percentage range of a quantile key,
+    value range of an edge key."""
+    if kind == 'q':
+        bounds = [f"{round(q * 100, 2):g}" for q in [0.0, *levels, 1.0]]
+        return [f"{lo}_{hi}pct" for lo, hi in zip(bounds, bounds[1:])]
+    bounds = ['min', *map(_format_edge, edges), 'max']
+    return [f"{lo}_{hi}" for lo, hi in zip(bounds, bounds[1:])]
+
+
+def _describe(column, kind, levels, n_quantiles, edges):
+    if n_quantiles is not None:
+        return f"{column} {QUANTILE_NAMES.get(n_quantiles, f'{n_quantiles}-quantiles')}"
+    if kind == 'q':
+        return f"{column} quantiles at {levels}"
+    return f"{column} edges {[float(e) for e in edges]}"
+
+
+class Strata:
+    """Stratum index of every record (codes, -1 for records in no stratum, such
+    as NaN keys), one label per stratum, and the merged edges of each key.
+    Strata laid out from sketches have no codes: assign gives those of each block."""
+
+    def __init__(self, codes, labels, edges, spec, description, rank_error=None):
+        self.codes = codes
+        self.labels = labels
+        self.edges = edges
+        self.spec = spec
+        self.description = description
+        # Bound on the rank error of sketched quantile edges, None if exact
+        self.rank_error = rank_error
+
+    @property
+    def n_strata(self):
+        return len(self.labels)
+
+    def sizes(self):
+        return np.bincount(self.codes[self.codes >= 0], minlength=self.n_strata)
+
+    def members(self):
+        """Record indices of each stratum, in record order."""
+        return group_members(self.codes, self.n_strata)
+
+    def assign(self, columns):
+        """Stratum index of the records given by columns (all of them or any block)."""
+        codes = None
+        valid = None
+        for column, column_edges in self.edges.items():
+            values = np.asarray(columns[column], dtype=float)
+            key_codes = np.searchsorted(column_edges, values, side='left')
+            codes = key_codes if codes is None else codes * (len(column_edges) + 1) + key_codes
+            valid = ~np.isnan(values) if valid is None else valid & ~np.isnan(values)
+        return np.where(valid, codes, -1)
+
+
+def _layout(spec, samples):
+    """Labels, merged edges and description of spec, given the non-NaN values
+    of each key column and their weights (None for one record each)."""
+    keys = parse_spec(spec)
+    key_names = []
+    edges = {}
+    descriptions = []
+    for column, kind, levels, n_quantiles in keys:
+        values, weights = samples[column]
+        column_edges = key_edges(values, kind, levels, weights)
+        # Of repeated edges keep the last level, then keep the upper edge of
+        # every non-empty interval but the last
+        unique = np.flatnonzero(np.append(np.diff(column_edges) > 0, True))[:len(column_edges)]
+        sizes = np.bincount(np.searchsorted(column_edges[unique], values, side='left'),
+                            weights=weights, minlength=len(unique) + 1)
+        kept = unique[np.flatnonzero(sizes > 0)[:-1]]
+        column_edges = column_edges[kept]
+        names = _interval_names(kind, [levels[k] for k in kept], column_edges)
+        key_names.append(names if len(keys) == 1 else [f"{column}_{name}" for name in names])
+        edges[column] = column_edges
+        descriptions.append(_describe(column, kind, levels, n_quantiles, column_edges))
+
+    labels = ['_'.join(parts) for parts in _product(key_names)]
+    labels = [f"group_{i + 1}_{label}" for i, label in enumerate(labels)]
+    description = f"{' x '.join(descriptions)} ({len(labels)} groups)"
+    return labels, edges, description
+
+
+def stratify(columns, spec=DEFAULT_SPEC, counts=None):
+    """Strata of the records given by columns (a DataFrame or a mapping of
+    column name to array) under spec. counts weights each record in the
+    quantiles, for columns that list the distinct values of a CountCube."""
+    samples = {}
+    for column, *_ in parse_spec(spec):
+        values = np.asarray(columns[column], dtype=float)
+        key_valid = ~np.isnan(values)
+        samples[column] = (values[key_valid], None if counts is None else np.asarray(counts)[key_valid])
+    labels, edges, description = _layout(spec, samples)
+    strata = Strata(None, labels, edges, spec, description)
+    strata.codes = strata.assign(columns)
+    return strata
+
+
+def sketch_strata(sketches, spec=DEFAULT_SPEC):
+    """Strata of spec laid out from a KLLSketch of each key column (see
+    quantile_sketch) instead of the records: quantile edges are the sketch's,
+    with its rank error bound, and records are assigned block by block with
+    Strata.assign."""
+    keys = parse_spec(spec)
+    samples = {column: sketches[column].weighted_items() for column, *_ in keys}
+    labels, edges, description = _layout(spec, samples)
+    rank_error = max([sketches[column].rank_error() for column, kind, *_ in keys if kind == 'q'], default=0.0)
+    return Strata(None, labels, edges, spec, description, rank_error)
+
+
+def _product(key_names):
+    """Combinations of one name per key, the first key varying slowest."""
+    combinations = [[]]
+    for names in key_names:
+        combinations = [parts + [name] for parts in combinations for name in names]
+    return combinations
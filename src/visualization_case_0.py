@@ -11,12 +11,14 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
+from data_store import load_records
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output')
 
 
 def load_data(path=DATA_PATH):
-    return pd.read_csv(path)
+    return load_records(path)
 
 
 def bin_column(series, n_bins=16):
@@ -16,6 +16,8 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from scipy import stats
 
+from data_store import load_timestamps
+
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'timestamp_vals.csv')
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_2b_results_blind.json')
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output')
@@ -32,9 +34,7 @@ def load_results(path=RESULTS_PATH):
 
 def load_intervals(path=DATA_PATH):
     """Load, filter to v_val 6.0-6.9, and compute intervals from raw timestamp data."""
-    import pandas as pd
-    df = pd.read_csv(path)
-    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    df = load_timestamps(path)
     df = df[(df['v_val'] >= V_VAL_MIN) & (df['v_val'] <= V_VAL_MAX)].copy()
     df = df.sort_values('timestamp').reset_index(drop=True)
     deltas = df['timestamp'].diff().dropna()
@@ -8,11 +8,12 @@ All outputs saved to output/ directory.
 import json
 import os
 import numpy as np
-import pandas as pd
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
+from data_store import load_records
+
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_3a_results_blind.json')
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output')
@@ -24,7 +25,7 @@ def load_results(path=RESULTS_PATH):
 
 
 def load_data(path=DATA_PATH):
-    return pd.read_csv(path)
+    return load_records(path)
 
 
 def make_histogram(var_name, var_results, output_dir):
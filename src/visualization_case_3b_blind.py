@@ -5,18 +5,22 @@ Generates:
   - Effect size comparison across strata
   - Significance comparison across strata
   - Sequential heatmaps per stratum and variable (12 total)
+Results of other stratifications (see stratification) get one column and
+three heatmaps per stratum.
 All outputs saved to output/ directory.
 """
 
 import json
 import os
 import numpy as np
-import pandas as pd
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from matplotlib.patches import Patch
 
+from data_store import load_records
+from stratification import DEFAULT_SPEC, Strata, stratify
+
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_3b_results_blind.json')
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output')
@@ -32,31 +36,38 @@ def load_results(path=RESULTS_PATH):
 
 
 def load_data(path=DATA_PATH):
-    return pd.read_csv(path)
+    return load_records(path)
+
+
+def stratum_layout(results):
+    """Result keys, titles and short tick labels of the strata in results."""
+    if 'stratum_labels' not in results:
+        return STRATUM_NUMS, STRATUM_LABELS, ['Q1', 'Q2', 'Q3', 'Q4']
+    n_strata = len(results['stratum_labels'])
+    return ([f"stratum_{i + 1}" for i in range(n_strata)], results['stratum_labels'],
+            [f"S{i + 1}" for i in range(n_strata)])
 
 
 def create_strata(df, results):
-    """Recreate strata from quartile boundaries in results."""
-    q = results['v_val_quartiles']
-    conditions = [
-        df['v_val'] <= q[0],
-        (df['v_val'] > q[0]) & (df['v_val'] <= q[1]),
-        (df['v_val'] > q[1]) & (df['v_val'] <= q[2]),
-        df['v_val'] > q[2],
-    ]
-    strata = {}
-    for s_num, cond in zip(STRATUM_NUMS, conditions):
-        strata[s_num] = df[cond].copy()
-    return strata
+    """Recreate the strata of results from the data: record indices per stratum number.
+    Sketched edges are not the data's exact quantiles, so they are taken as recorded."""
+    if 'stratum_boundaries' in results:
+        edges = {column: np.array(column_edges) for column, column_edges in results['stratum_edges'].items()}
+        strata = Strata(None, results['stratum_labels'], edges, results['strata_spec'], results['stratification'])
+        strata.codes = strata.assign(df)
+    else:
+        strata = stratify(df, results.get('strata_spec', DEFAULT_SPEC))
+    return dict(zip(stratum_layout(results)[0], strata.members()))
 
 
 def make_histogram_grid(results, output_dir):
     """3 rows (variables) × 4 columns (strata) histogram grid."""
-    fig, axes = plt.subplots(3, 4, figsize=(20, 12))
+    stratum_nums, stratum_labels, _ = stratum_layout(results)
+    fig, axes = plt.subplots(3, len(stratum_nums), figsize=(5 * len(stratum_nums), 12), squeeze=False)
     bin_labels = [str(i) for i in range(1, 17)]
 
     for row, var in enumerate(VARIABLES):
-        for col, (s_num, s_label) in enumerate(zip(STRATUM_NUMS, STRATUM_LABELS)):
+        for col, (s_num, s_label) in enumerate(zip(stratum_nums, stratum_labels)):
             ax = axes[row, col]
             vr = results[s_num][var]
             counts = vr['bin_counts']
@@ -110,17 +121,18 @@ def make_histogram_grid(results, output_dir):
 
 def make_effect_size_comparison(results, output_dir):
     """Three subplots showing Cramér's V across strata for each variable."""
+    stratum_nums, _, ticks = stratum_layout(results)
     fig, axes = plt.subplots(1, 3, figsize=(14, 5))
 
-    x_pos = range(4)
+    x_pos = range(len(stratum_nums))
 
     for ax, var in zip(axes, VARIABLES):
-        cramers = [results[s_num][var]['cramers_v'] for s_num in STRATUM_NUMS]
+        cramers = [results[s_num][var]['cramers_v'] for s_num in stratum_nums]
         colors = ['#c0392c' if results[s_num][var]['p_value'] < 0.05 else '#2ecc71'
-                  for s_num in STRATUM_NUMS]
+                  for s_num in stratum_nums]
         bars = ax.bar(x_pos, cramers, color=colors, edgecolor='black', linewidth=0.5)
         ax.set_xticks(x_pos)
-        ax.set_xticklabels(['Q1', 'Q2', 'Q3', 'Q4'])
+        ax.set_xticklabels(ticks)
         ax.set_ylabel("Cramér's V")
         ax.set_title(f'{var}')
         ax.set_ylim(0, max(max(cramers) * 1.3, 0.05))
@@ -148,12 +160,13 @@ def make_effect_size_comparison(results, output_dir):
 
 def make_significance_comparison(results, output_dir):
     """Three subplots showing p-values (log scale) across strata with synthetic percentiles."""
+    stratum_nums, _, ticks = stratum_layout(results)
     fig, axes = plt.subplots(1, 3, figsize=(14, 5))
 
-    x_pos = range(4)
+    x_pos = range(len(stratum_nums))
 
     for ax, var in zip(axes, VARIABLES):
-        p_values = [results[s_num][var]['p_value'] for s_num in STRATUM_NUMS]
+        p_values = [results[s_num][var]['p_value'] for s_num in stratum_nums]
         p_plot = [max(p, 1e-300) for p in p_values]
         colors = ['#c0392c' if p < 0.05 else '#2ecc71' for p in p_values]
 
@@ -163,7 +176,7 @@ def make_significance_comparison(results, output_dir):
                    label='p = 0.05')
 
         # Overlay 10th/90th percentiles from synthetic distributions
-        for i, s_num in enumerate(STRATUM_NUMS):
+        for i, s_num in enumerate(stratum_nums):
             synth_p = results[s_num][var].get('synthetic_p_values', [])
             if synth_p:
                 p10 = np.percentile(synth_p, 10)
@@ -172,7 +185,7 @@ def make_significance_comparison(results, output_dir):
                 ax.plot(i, p90, marker='^', color='#3498db', markersize=8, zorder=5)
 
         ax.set_xticks(x_pos)
-        ax.set_xticklabels(['Q1', 'Q2', 'Q3', 'Q4'])
+        ax.set_xticklabels(ticks)
         ax.set_ylabel('p-value (log scale)')
         ax.set_title(f'{var}')
 
@@ -200,14 +213,15 @@ def make_significance_comparison(results, output_dir):
     print(f"  Saved: {path}")
 
 
-def make_heatmaps(results, strata, output_dir):
+def make_heatmaps(results, df, strata, output_dir):
     """Sequential heatmaps: 12 total (4 strata × 3 variables)."""
-    for s_num, s_label in zip(STRATUM_NUMS, STRATUM_LABELS):
-        sdf = strata[s_num]
-        a_vals = sdf['a_val'].values
+    stratum_nums, stratum_labels, _ = stratum_layout(results)
+    for s_num, s_label in zip(stratum_nums, stratum_labels):
+        members = strata[s_num]
+        a_vals = df['a_val'].values[members]
 
         for var in VARIABLES:
-            values = sdf[var].values
+            values = df[var].values[members]
             bin_size = results[s_num][var]['bin_size']
 
             bin_indices = np.minimum(np.floor(values / bin_size).astype(int), 15)
@@ -267,7 +281,7 @@ def main():
     make_significance_comparison(results, OUTPUT_DIR)
 
     print("Generating Case 3B heatmaps...")
-    make_heatmaps(results, strata, OUTPUT_DIR)
+    make_heatmaps(results, df, strata, OUTPUT_DIR)
 
     print("All Case 3B visualizations complete.")
 
@@ -8,12 +8,13 @@ All outputs saved to output/ directory.
 import json
 import os
 import numpy as np
-import pandas as pd
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from matplotlib.patches import Patch
 
+from data_store import load_records
+
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_4a_results_blind.json')
 CASE_3A_RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_3a_results_blind.json')
 DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'record_vals.csv')
@@ -31,7 +32,7 @@ def load_case_3a_results(path=CASE_3A_RESULTS_PATH):
 
 
 def load_data(path=DATA_PATH):
-    return pd.read_csv(path)
+    return load_records(path)
 
 
 def make_energy_histogram(var_name, var_results, output_dir):
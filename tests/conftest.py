@@ -0,0 +1,42 @@
+"""
+Shared pytest configuration: makes the analysis modules in src/ importable
+so engine-level tests can exercise them directly, and provides the synthetic
+record catalogue shared by the grouped-statistics test modules and the small
+record set shared by the Case 3A, 4A and 4B engine tests.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+def synthetic_records(seed, n, a_range=(1950, 2022)):
+    """Random records with the dtypes and value ranges of record_vals.csv."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'a_val': rng.integers(*a_range, size=n).astype(np.int16),
+        'v_val': np.round(rng.normal(6.3, 0.6, size=n), 2),
+        'x_val': rng.integers(0, 50000, size=n).astype(np.int32),
+        'y_val': rng.integers(100, 2_500_000, size=n).astype(np.int32),
+        'z_val': rng.integers(1, 90_000, size=n).astype(np.int32),
+    })
+
+
+@pytest.fixture(scope='module')
+def small_df():
+    """400 uniform x_val, y_val, z_val in [0, 50000) with v_val in 0.0-0.5, for engine comparisons."""
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({var: rng.integers(0, 50000, size=400) for var in ('x_val', 'y_val', 'z_val')})
+    df['v_val'] = np.round(rng.uniform(0.0, 0.5, size=400), 1)
+    return df
+
+
+@pytest.fixture(scope='module')
+def records(request):
+    """synthetic_records parametrised by the test module's RECORDS keyword arguments."""
+    return synthetic_records(**request.module.RECORDS)
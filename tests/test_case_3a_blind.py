@@ -8,6 +8,10 @@ import json
 import os
 import numpy as np
 import pytest
+from scipy import stats
+
+import case_3a_blind_analysis as case_3a
+from synthetic_ranks import p_values, percentile_rank
 
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_3a_results_blind.json')
 
@@ -176,13 +180,55 @@ class TestCase3ASyntheticCatalogs:
             assert 0 <= val <= 100, f"{var} percentile rank out of range: {val}"
 
     def test_percentile_rank_correct(self, results):
-        """Verify percentile rank calculation is consistent with synthetic p-values."""
+        """Verify the percentile rank recomputes from the chi-square statistics."""
         synth = results['synthetic_null_hypothesis']
         pct = synth['percentile_rank_analysis']
         for var in VARIABLES:
-            real_p = results[var]['chi_square']['p_value']
-            synthetic_p = np.array(synth[f'{var}_synthetic_p_values'])
-            expected_pct = float(np.sum(synthetic_p <= real_p) / len(synthetic_p) * 100)
-            actual_pct = pct[f'{var}_real_p_percentile']
-            assert abs(actual_pct - expected_pct) < 0.15, \
-                f"{var}: percentile {actual_pct} != expected {expected_pct:.2f}"
+            real_stat = synth[f'{var}_real_chi_square']
+            synthetic_stats = synth[f'{var}_synthetic_chi_square']
+            assert len(synthetic_stats) == N_SYNTHETIC
+            assert round(real_stat, 4) == results[var]['chi_square']['statistic']
+            np.testing.assert_array_equal(
+                np.round(p_values(synthetic_stats, N_BINS - 1), 6), synth[f'{var}_synthetic_p_values'])
+            expected = round(percentile_rank(real_stat, synthetic_stats), 2)
+            assert pct[f'{var}_real_p_percentile'] == expected, \
+                f"{var}: percentile {pct[f'{var}_real_p_percentile']}, recomputed {expected}"
+
+
+class TestCase3ASyntheticEngine:
+    """Validate the batched synthetic catalog engine against the reference loop."""
+
+    def test_batch_matches_loop(self, small_df):
+        max_vals, n = case_3a.null_parameters(small_df)
+        loop_stats = case_3a.run_synthetic_catalogs(max_vals, n, 25, engine='loop', chunk_size=7)
+        batch_stats = case_3a.run_synthetic_catalogs(max_vals, n, 25, engine='batch', chunk_size=7)
+        for var in VARIABLES:
+            np.testing.assert_allclose(batch_stats[var], loop_stats[var], rtol=1e-12, atol=0)
+
+    def test_batch_binning_matches_single(self):
+        rng = np.random.default_rng(11)
+        block = rng.uniform(0, 1000.0, size=(4, 300))
+        counts = case_3a.bin_observations_batch(block)
+        for row, row_counts in zip(block, counts):
+            expected, _, _ = case_3a.bin_observations(row)
+            np.testing.assert_array_equal(row_counts, expected)
+
+    def test_multinomial_matches_batch_in_distribution(self, small_df):
+        max_vals, n = case_3a.null_parameters(small_df)
+        batch_p, _ = case_3a.synthetic_values(
+            case_3a.run_synthetic_catalogs(max_vals, n, 2000, engine='batch', chunk_size=500), n)
+        multi_p, _ = case_3a.synthetic_values(
+            case_3a.run_synthetic_catalogs(max_vals, n, 2000, engine='multinomial', chunk_size=500), n)
+        for var in VARIABLES:
+            ks = stats.ks_2samp(batch_p[var], multi_p[var])
+            assert ks.pvalue > 0.01, \
+                f"{var}: multinomial and batch synthetic p-values differ (KS p={ks.pvalue:.4g})"
+            assert abs(np.mean(batch_p[var]) - np.mean(multi_p[var])) < 0.03
+
+    def test_multinomial_cramers_v_consistent(self, small_df):
+        max_vals, n = case_3a.null_parameters(small_df)
+        multi_p, multi_v = case_3a.synthetic_values(
+            case_3a.run_synthetic_catalogs(max_vals, n, 50, engine='multinomial'), n)
+        for var in VARIABLES:
+            chi2 = np.array(multi_v[var]) ** 2 * n * (N_BINS - 1)
+            np.testing.assert_allclose(stats.chi2.sf(chi2, N_BINS - 1), multi_p[var], rtol=1e-9)
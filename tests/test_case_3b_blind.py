@@ -6,9 +6,15 @@ chi-square tests, Cramér's V, and synthetic null hypothesis catalogs.
 
 import json
 import os
+from functools import partial
 import numpy as np
+import pandas as pd
 import pytest
 
+import case_3b_blind_analysis as case_3b
+import exact_null
+from synthetic_ranks import p_values, percentile_rank
+
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_3b_results_blind.json')
 
 VARIABLES = ['x_val', 'y_val', 'z_val']
@@ -24,6 +30,11 @@ def results():
         return json.load(f)
 
 
+@pytest.fixture(scope='module')
+def units():
+    return [(300, 1000.0 * (j + 1), 15, i + 1, var) for i in range(2) for j, var in enumerate(VARIABLES)]
+
+
 class TestCase3BStructure:
     """Verify result structure and completeness."""
 
@@ -165,15 +176,19 @@ class TestCase3BSyntheticCatalogs:
                     assert 0 <= p <= 1
 
     def test_percentile_calculation_correct(self, results):
-        """Verify percentile rank is consistent with synthetic p-values."""
+        """Verify the percentile rank recomputes from the chi-square statistics."""
         for s_num in STRATUM_NUMS:
             for var in VARIABLES:
-                real_p = results[s_num][var]['p_value']
-                synth_p = np.array(results[s_num][var]['synthetic_p_values'])
-                expected_pct = float(np.sum(synth_p <= real_p) / len(synth_p) * 100)
-                actual_pct = results[s_num][var]['synthetic_percentile']
-                assert abs(actual_pct - expected_pct) < 3.0, \
-                    f"{s_num}/{var}: pct {actual_pct} != expected {expected_pct:.2f}"
+                var_result = results[s_num][var]
+                real_stat = var_result['real_chi_square']
+                synthetic_stats = var_result['synthetic_chi_square']
+                assert len(synthetic_stats) == N_SYNTHETIC
+                assert round(real_stat, 4) == var_result['chi_square']
+                np.testing.assert_array_equal(
+                    np.round(p_values(synthetic_stats, N_BINS - 1), 6), var_result['synthetic_p_values'])
+                expected = round(percentile_rank(real_stat, synthetic_stats), 2)
+                assert var_result['synthetic_percentile'] == expected, \
+                    f"{s_num}/{var}: pct {var_result['synthetic_percentile']}, recomputed {expected}"
 
 
 class TestCase3BComparativeSummary:
@@ -186,3 +201,68 @@ class TestCase3BComparativeSummary:
 
     def test_interpretation_present(self, results):
         assert 'interpretation' in results['comparative_summary']
+
+
+class TestCase3BParallelUnits:
+    """Validate that (stratum, variable) synthetic units are independent of worker count."""
+
+    def test_unit_streams_distinct(self):
+        chi2_stats = case_3b.run_synthetic_units(
+            [(300, 1000.0, 5, s, var) for s in range(1, 5) for var in VARIABLES])
+        assert len({tuple(s) for s in chi2_stats}) == 12
+
+    def test_chunks_independent_of_catalog_count(self):
+        short = case_3b.run_synthetic_unit(300, 1000.0, 7, 1, 'x_val', chunk_size=4)
+        long = case_3b.run_synthetic_unit(300, 1000.0, 15, 1, 'x_val', chunk_size=4)
+        np.testing.assert_array_equal(long[:7], short)
+
+    def test_worker_count_invariant(self, units):
+        serial = case_3b.run_synthetic_units(units, workers=1)
+        parallel = case_3b.run_synthetic_units(units, workers=3)
+        for a, b in zip(serial, parallel):
+            np.testing.assert_array_equal(a, b)
+
+    def test_store_matches_in_memory(self, tmp_path):
+        unit = case_3b.run_synthetic_unit(300, 1000.0, 15, 1, 'x_val', store=str(tmp_path))
+        np.testing.assert_array_equal(unit.statistics(15),
+                                      case_3b.run_synthetic_unit(300, 1000.0, 15, 1, 'x_val'))
+
+    def test_adaptive_uses_prefix_of_fixed_run(self):
+        fixed = case_3b.run_synthetic_unit(300, 1000.0, 500, 1, 'x_val')
+        rank = case_3b.run_synthetic_unit(300, 1000.0, 500, 1, 'x_val', adaptive='ci', real_stat=1e6)
+        assert rank['settled'] and rank['n_catalogs'] < 500
+        np.testing.assert_array_equal(rank['statistics'], fixed[:rank['n_catalogs']])
+
+    def test_unit_independent_of_other_units(self, units):
+        alone = case_3b.run_synthetic_units(units[4:5])
+        together = case_3b.run_synthetic_units(units)
+        np.testing.assert_array_equal(alone[0], together[4])
+
+
+class TestCase3BExactNull:
+    """Validate the exact multinomial null mode."""
+
+    @pytest.fixture
+    def small_df(self):
+        rng = np.random.default_rng(3)
+        return pd.DataFrame({
+            'v_val': rng.uniform(4.0, 7.0, size=800),
+            **{var: rng.integers(0, 50000, size=800) for var in VARIABLES},
+        })
+
+    def test_exact_replaces_synthetic_units(self, small_df, tmp_path, monkeypatch):
+        monkeypatch.setattr(case_3b, 'exact_null', partial(exact_null.exact_null, cache_dir=str(tmp_path)))
+        results = case_3b.run(df=small_df, n_synthetic=10, null='exact')
+        assert set(results['exact_null_tail_mass']) == set(STRATUM_NUMS)
+        for s_num in STRATUM_NUMS:
+            for var in VARIABLES:
+                var_result = results[s_num][var]
+                assert 0 <= var_result['synthetic_percentile'] <= 100
+                assert 'synthetic_p_values' not in var_result
+
+    def test_too_large_strata_fall_back(self, small_df, monkeypatch):
+        monkeypatch.setattr(exact_null, 'MAX_EXACT_STATES', 10)
+        exact = case_3b.run(df=small_df, n_synthetic=10, null='exact')
+        synthetic = case_3b.run(df=small_df, n_synthetic=10)
+        for s_num in STRATUM_NUMS:
+            assert exact[s_num] == synthetic[s_num]
@@ -8,6 +8,10 @@ import json
 import os
 import numpy as np
 import pytest
+from scipy import stats
+
+import case_4a_blind_analysis as case_4a
+from synthetic_ranks import p_values, percentile_rank
 
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_4a_results_blind.json')
 
@@ -194,13 +198,99 @@ class TestCase4ASyntheticCatalogs:
             assert 0 <= val <= 100, f"{var} percentile rank out of range: {val}"
 
     def test_percentile_rank_correct(self, results):
-        """Verify percentile rank calculation is consistent with synthetic p-values."""
+        """Verify the percentile rank recomputes from the chi-square statistics."""
         synth = results['synthetic_null_hypothesis']
         pct = synth['percentile_rank_analysis']
         for var in VARIABLES:
-            real_p = results[var]['chi_square_energy']['p_value']
-            synthetic_p = np.array(synth[f'{var}_synthetic_p_values'])
-            expected_pct = float(np.sum(synthetic_p <= real_p) / len(synthetic_p) * 100)
-            actual_pct = pct[f'{var}_real_p_percentile']
-            assert abs(actual_pct - expected_pct) < 0.15, \
-                f"{var}: percentile {actual_pct} != expected {expected_pct:.2f}"
+            real_stat = synth[f'{var}_real_chi_square']
+            synthetic_stats = synth[f'{var}_synthetic_chi_square']
+            assert len(synthetic_stats) == N_SYNTHETIC
+            assert round(real_stat, 4) == results[var]['chi_square_energy']['statistic']
+            np.testing.assert_array_equal(
+                np.round(p_values(synthetic_stats, N_BINS - 1), 6), synth[f'{var}_synthetic_p_values'])
+            expected = round(percentile_rank(real_stat, synthetic_stats), 2)
+            assert pct[f'{var}_real_p_percentile'] == expected, \
+                f"{var}: percentile {pct[f'{var}_real_p_percentile']}, recomputed {expected}"
+
+
+class TestCase4ASyntheticEngine:
+    """Validate the permutation-invariant synthetic engines against the reference loop."""
+
+    def test_permute_matches_loop(self, small_df):
+        energy = case_4a.calculate_energy(small_df['v_val'].values)
+        bins = case_4a.variable_bins(small_df)
+        loop_stats = case_4a.run_synthetic_catalogs(bins, energy, 20, engine='loop')
+        perm_stats = case_4a.run_synthetic_catalogs(bins, energy, 20, engine='permute')
+        for var in VARIABLES:
+            np.testing.assert_allclose(perm_stats[var], loop_stats[var], rtol=1e-9)
+
+    def test_batch_matches_permute_in_distribution(self, small_df):
+        energy = case_4a.calculate_energy(small_df['v_val'].values)
+        bins = case_4a.variable_bins(small_df)
+        perm_stats = case_4a.run_synthetic_catalogs(bins, energy, 1000, engine='permute')
+        batch_stats = case_4a.run_synthetic_catalogs(bins, energy, 1000, engine='batch', chunk_size=300)
+        for var in VARIABLES:
+            ks = stats.ks_2samp(perm_stats[var], batch_stats[var])
+            assert ks.pvalue > 0.01, f"{var}: batch and permute engines differ (KS p={ks.pvalue:.4g})"
+
+    def test_patefield_matches_permute_in_distribution(self, small_df):
+        energy = case_4a.calculate_energy(small_df['v_val'].values)
+        bins = case_4a.variable_bins(small_df)
+        perm_stats = case_4a.run_synthetic_catalogs(bins, energy, 1000, engine='permute')
+        table_stats = case_4a.run_synthetic_catalogs(bins, energy, 1000, engine='patefield')
+        for var in VARIABLES:
+            ks = stats.ks_2samp(perm_stats[var], table_stats[var])
+            assert ks.pvalue > 0.01, f"{var}: patefield and permute engines differ (KS p={ks.pvalue:.4g})"
+
+
+class TestCase4ACatalogStore:
+    """Validate the on-disk synthetic catalog store against the in-memory run."""
+
+    def test_store_matches_in_memory(self, small_df, tmp_path):
+        df = small_df.assign(v_val=small_df['v_val'] + 0.1)
+        in_memory = case_4a.run(df=df, case_3a={}, n_synthetic=30)
+        stored = case_4a.run(df=df, case_3a={}, n_synthetic=30, store=str(tmp_path))
+        assert stored['synthetic_null_hypothesis'] == in_memory['synthetic_null_hypothesis']
+
+    def test_patefield_catalogs_independent_of_count(self, small_df):
+        # CatalogStore regenerates a chunk when more of its catalogs are asked
+        # for, and sequential stopping reads chunk prefixes: both need catalog i
+        # to be the same whatever the count
+        df = small_df.assign(v_val=small_df['v_val'] + 0.1)
+        energy = case_4a.calculate_energy(df['v_val'].values)
+        bins = case_4a.variable_bins(df)
+        short = case_4a.run_synthetic_catalogs(bins, energy, 30, engine='patefield')
+        long = case_4a.run_synthetic_catalogs(bins, energy, 130, engine='patefield')
+        for var in VARIABLES:
+            np.testing.assert_array_equal(long[var][:30], short[var])
+
+    def test_large_run_keeps_values_in_store(self, small_df, tmp_path, monkeypatch):
+        monkeypatch.setattr(case_4a, 'INLINE_SYNTHETIC_LIMIT', 10)
+        df = small_df.assign(v_val=small_df['v_val'] + 0.1)
+        in_memory = case_4a.run(df=df, case_3a={}, n_synthetic=30)
+        stored = case_4a.run(df=df, case_3a={}, n_synthetic=30, store=str(tmp_path))
+        synth = stored['synthetic_null_hypothesis']
+        assert synth['synthetic_store'] == str(tmp_path)
+        assert 'x_val_synthetic_p_values' not in synth
+        assert synth['percentile_rank_analysis'] == \
+            in_memory['synthetic_null_hypothesis']['percentile_rank_analysis']
+
+
+class TestCase4AAnalyticNull:
+    """Validate the closed-form permutation null mode."""
+
+    def test_analytic_close_to_permutation(self, small_df):
+        df = small_df.assign(v_val=small_df['v_val'] + 0.1)
+        permutation = case_4a.run(df=df, case_3a={}, n_synthetic=1000)
+        analytic = case_4a.run(df=df, case_3a={}, null='analytic')
+        synth = analytic['synthetic_null_hypothesis']
+        assert synth['null_model'] == 'analytic'
+        assert 'x_val_synthetic_p_values' not in synth
+        for var in VARIABLES:
+            expected = permutation['synthetic_null_hypothesis']['percentile_rank_analysis'][f'{var}_real_p_percentile']
+            actual = synth['percentile_rank_analysis'][f'{var}_real_p_percentile']
+            assert abs(actual - expected) < 6.0, f"{var}: analytic {actual} vs Monte Carlo {expected}"
+
+    def test_analytic_excludes_store(self):
+        with pytest.raises(SystemExit):
+            case_4a.parse_args(['--null', 'analytic', '--adaptive', 'ci'])
@@ -7,7 +7,12 @@ energy calculations, chi-square tests, Cramér's V, and synthetic null hypothesi
 import json
 import os
 import numpy as np
+import pandas as pd
 import pytest
+from scipy import stats
+
+import case_4b_blind_analysis as case_4b
+from synthetic_ranks import p_values, percentile_rank
 
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'output', 'case_4b_results_blind.json')
 
@@ -203,15 +208,19 @@ class TestCase4BSyntheticCatalogs:
                     assert 0 <= p <= 1
 
     def test_percentile_calculation_correct(self, results):
-        """Verify percentile rank is consistent with synthetic p-values."""
+        """Verify the percentile rank recomputes from the chi-square statistics."""
         for s_num in STRATUM_NUMS:
             for var in VARIABLES:
-                real_p = results[s_num][var]['p_value']
-                synth_p = np.array(results[s_num][var]['synthetic_p_values'])
-                expected_pct = float(np.sum(synth_p <= real_p) / len(synth_p) * 100)
-                actual_pct = results[s_num][var]['synthetic_percentile']
-                assert abs(actual_pct - expected_pct) < 3.0, \
-                    f"{s_num}/{var}: pct {actual_pct} != expected {expected_pct:.2f}"
+                var_result = results[s_num][var]
+                real_stat = var_result['real_chi_square']
+                synthetic_stats = var_result['synthetic_chi_square']
+                assert len(synthetic_stats) == N_SYNTHETIC
+                assert round(real_stat, 4) == var_result['chi_square']
+                np.testing.assert_array_equal(
+                    np.round(p_values(synthetic_stats, N_BINS - 1), 6), var_result['synthetic_p_values'])
+                expected = round(percentile_rank(real_stat, synthetic_stats), 2)
+                assert var_result['synthetic_percentile'] == expected, \
+                    f"{s_num}/{var}: pct {var_result['synthetic_percentile']}, recomputed {expected}"
 
 
 class TestCase4BComparativeSummary:
@@ -227,3 +236,60 @@ class TestCase4BComparativeSummary:
 
     def test_energy_pattern_dependency_flag(self, results):
         assert 'energy_pattern_v_val_dependent' in results['comparative_summary']
+
+
+class TestCase4BSyntheticEngine:
+    """Validate the permutation-invariant stratum engines against the reference loop."""
+
+    def test_permute_matches_loop(self, small_df):
+        energy = case_4b.calculate_energy(small_df['v_val'].values)
+        max_vals = {var: float(small_df[var].max()) for var in VARIABLES}
+        loop_stats = case_4b.run_synthetic_catalogs_stratum(small_df, energy, max_vals, 20, engine='loop')
+        perm_stats = case_4b.run_synthetic_catalogs_stratum(small_df, energy, max_vals, 20, engine='permute')
+        for var in VARIABLES:
+            np.testing.assert_allclose(perm_stats[var], loop_stats[var], rtol=1e-9)
+
+    def test_batch_statistics_valid(self, small_df):
+        energy = case_4b.calculate_energy(small_df['v_val'].values)
+        max_vals = {var: float(small_df[var].max()) for var in VARIABLES}
+        batch_stats = case_4b.run_synthetic_catalogs_stratum(small_df, energy, max_vals, 50, engine='batch')
+        # All energy in one bin gives the largest energy chi-square, (k - 1) * total energy
+        max_stat = (N_BINS - 1) * energy.sum()
+        for var in VARIABLES:
+            assert len(batch_stats[var]) == 50
+            assert np.all(np.isfinite(batch_stats[var]))
+            assert np.all(batch_stats[var] >= 0) and np.all(batch_stats[var] <= max_stat * (1 + 1e-12))
+            assert np.ptp(batch_stats[var]) > 0
+
+    def test_patefield_matches_permute_in_distribution(self, small_df):
+        energy = case_4b.calculate_energy(small_df['v_val'].values)
+        max_vals = {var: float(small_df[var].max()) for var in VARIABLES}
+        perm_stats = case_4b.run_synthetic_catalogs_stratum(small_df, energy, max_vals, 500, engine='permute')
+        table_stats = case_4b.run_synthetic_catalogs_stratum(small_df, energy, max_vals, 500, engine='patefield')
+        for var in VARIABLES:
+            ks = stats.ks_2samp(perm_stats[var], table_stats[var])
+            assert ks.pvalue > 0.01, f"{var}: patefield and permute engines differ (KS p={ks.pvalue:.4g})"
+
+    def test_worker_count_invariant(self, small_df):
+        energy = case_4b.calculate_energy(small_df['v_val'].values)
+        units = [((small_df[var].values, energy, float(small_df[var].max()), 10, 1, var), {})
+                 for var in VARIABLES]
+        for serial, pooled in zip(case_4b.run_synthetic_units(units, workers=1),
+                                  case_4b.run_synthetic_units(units, workers=2)):
+            np.testing.assert_array_equal(serial, pooled)
+
+
+class TestCase4BAnalyticNull:
+    """Validate the closed-form permutation null mode."""
+
+    def test_analytic_replaces_synthetic_units(self):
+        rng = np.random.default_rng(9)
+        df = pd.DataFrame({var: rng.integers(0, 50000, size=600) for var in VARIABLES})
+        df['v_val'] = rng.uniform(0.1, 2.0, size=600)
+        results = case_4b.run(df=df, case_3b={}, case_4a={}, null='analytic')
+        for s_num in STRATUM_NUMS:
+            for var in VARIABLES:
+                var_result = results[s_num][var]
+                assert 0 <= var_result['synthetic_percentile'] <= 100
+                assert var_result['null_fit']['dof'] > 0
+                assert 'synthetic_p_values' not in var_result
@@ -0,0 +1,107 @@
+"""
+Catalog Store: Test Suite - Blind Study (Approach Two)
+Validates the append-only synthetic catalog store: chunk checkpointing,
+resume after an interrupted run, configuration checks, and percentile ranks
+counted from the store.
+"""
+
+import json
+import os
+import numpy as np
+import pytest
+from scipy import stats
+
+from catalog_store import CatalogStore, array_digest
+from rng_streams import FULL_POPULATION, stream_seed
+from synthetic_ranks import exceedances
+
+DOF = 15
+CONFIG = {"engine": "test", "n_records": 50}
+
+
+def chunk_statistics(n_catalogs, rng):
+    return rng.chisquare(DOF, size=n_catalogs)
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return CatalogStore(str(tmp_path), 'case_test', FULL_POPULATION, 'x_val', CONFIG, chunk_size=10)
+
+
+class TestCheckpointing:
+
+    def test_fill_writes_every_chunk(self, store):
+        assert store.fill(35, chunk_statistics) == 4
+        assert store.completed_chunks() == {0: 10, 1: 10, 2: 10, 3: 5}
+        assert len(store.statistics(35)) == 35
+
+    def test_refill_generates_nothing(self, store):
+        store.fill(35, chunk_statistics)
+        assert store.fill(35, chunk_statistics) == 0
+
+    def test_resume_after_interruption(self, store, tmp_path):
+        store.fill(40, chunk_statistics)
+        expected = store.statistics(40)
+        # Simulate a crash: chunk 3's shard is gone and its checkpoint line half written
+        os.remove(os.path.join(store.path, 'chunk_00000003.npy'))
+        checkpoint = os.path.join(store.path, 'checkpoint.jsonl')
+        with open(checkpoint, 'r') as f:
+            lines = f.readlines()
+        with open(checkpoint, 'w') as f:
+            f.writelines(lines[:3])
+            f.write(lines[3][:20])
+
+        resumed = CatalogStore(str(tmp_path), 'case_test', FULL_POPULATION, 'x_val', CONFIG, chunk_size=10)
+        assert resumed.fill(40, chunk_statistics) == 1
+        np.testing.assert_array_equal(resumed.statistics(40), expected)
+
+    def test_extension_keeps_prefix(self, store):
+        store.fill(25, chunk_statistics)
+        short = store.statistics(25)
+        assert store.fill(50, chunk_statistics) == 3
+        np.testing.assert_array_equal(store.statistics(50)[:25], short)
+
+    def test_checkpoint_records_stream(self, store):
+        store.fill(10, chunk_statistics)
+        with open(os.path.join(store.path, 'checkpoint.jsonl'), 'r') as f:
+            line = f.readline()
+        entry = json.loads(line)
+        assert entry['spawn_key'] == list(stream_seed('case_test', FULL_POPULATION, 'x_val', 0).spawn_key)
+        assert set(entry) == {'chunk', 'catalogs', 'entropy', 'spawn_key'}
+
+    def test_missing_chunk_raises(self, store):
+        store.fill(10, chunk_statistics)
+        with pytest.raises(ValueError):
+            store.statistics(20)
+
+
+class TestConfiguration:
+
+    def test_mismatched_config_raises(self, store, tmp_path):
+        with pytest.raises(ValueError):
+            CatalogStore(str(tmp_path), 'case_test', FULL_POPULATION, 'x_val', dict(CONFIG, n_records=51),
+                         chunk_size=10)
+
+    def test_mismatched_chunk_size_raises(self, store, tmp_path):
+        with pytest.raises(ValueError):
+            CatalogStore(str(tmp_path), 'case_test', FULL_POPULATION, 'x_val', CONFIG, chunk_size=20)
+
+    def test_array_digest_sensitive_to_values(self):
+        a = np.arange(10)
+        b = a.copy()
+        b[3] = 0
+        assert array_digest(a) != array_digest(b)
+        assert array_digest(a) == array_digest(a.copy())
+
+
+class TestPercentile:
+
+    def test_matches_in_memory_rank(self, store):
+        store.fill(95, chunk_statistics)
+        statistics = store.statistics(95)
+        for real_stat in (0.0, 5.0, stats.chi2.isf(0.5, DOF), 1e6):
+            assert store.exceedances(real_stat, 95) == exceedances(statistics, real_stat)
+
+    def test_p_values_for_reporting(self, store):
+        store.fill(95, chunk_statistics)
+        np.testing.assert_allclose(store.p_values(95, DOF), stats.chi2.sf(store.statistics(95), DOF))
@@ -0,0 +1,111 @@
+"""
+Chunked Scan: Test Suite - Blind Study (Approach Two)
+Validates the out-of-core scan: blocks that follow numpy's pairwise summation
+tree, column statistics equal to pandas' (missing values included), bin
+counts and Rayleigh sums equal to the in-memory ones, memory limits, and
+Cases 0, 1 and 3A giving identical results in chunked mode.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import case_0_population_analysis as case_0
+import case_1_blind_analysis as case_1
+import case_3a_blind_analysis as case_3a
+import run_pipeline
+from chunked_scan import (MIN_BLOCK_ROWS, block_rows_for, pairwise_blocks, pairwise_sum, parse_memory_limit,
+                          scan_records)
+
+VARIABLES = ['x_val', 'y_val', 'z_val']
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.default_rng(21)
+    n = 50_003
+    v_val = np.round(rng.normal(6.3, 0.4, size=n), 2)
+    v_val[rng.random(n) < 0.01] = np.nan
+    return pd.DataFrame({
+        'a_val': rng.integers(1950, 2022, size=n).astype(np.int16),
+        'v_val': v_val,
+        'x_val': rng.integers(1000, 30_000_000, size=n).astype(np.int32),
+        'y_val': rng.integers(0, 9, size=n).astype(np.int32),
+        'z_val': rng.integers(1, 90_000, size=n).astype(np.int32),
+    })
+
+
+def columns_of(df):
+    return {col: df[col].values for col in df.columns}
+
+
+class TestPairwiseBlocks:
+
+    @pytest.mark.parametrize('n, block_rows', [(10_105, 1000), (1_000_003, 4096), (777, 100), (50, 4096)])
+    def test_sum_matches_np_sum(self, n, block_rows):
+        values = np.cos(np.random.default_rng(n).uniform(0, 100, size=n))
+        blocks = pairwise_blocks(n, block_rows)
+        assert blocks[0][0] == 0 and blocks[-1][1] == n
+        assert all(stop == start for (_, stop), (start, _) in zip(blocks, blocks[1:]))
+        assert max(stop - start for start, stop in blocks) <= max(block_rows, 128)
+        assert pairwise_sum([np.sum(values[start:stop]) for start, stop in blocks], n, block_rows) == np.sum(values)
+
+
+class TestRecordScan:
+
+    @pytest.mark.parametrize('block_rows', [1000, 8192, 1 << 20])
+    def test_column_stats_match_pandas(self, df, block_rows):
+        scan = scan_records(columns_of(df), block_rows, medians=True, value_counts=('a_val',))
+        for col in df.columns:
+            assert scan.count(col) == df[col].count()
+            assert scan.missing(col) == df[col].isna().sum()
+            assert scan.extrema(col) == (df[col].min(), df[col].max())
+            assert scan.mean(col) == df[col].mean()
+            assert scan.std(col) == df[col].std()
+            assert scan.median(col) == df[col].median()
+        values, counts = scan.value_counts('a_val')
+        expected = df['a_val'].value_counts().sort_index()
+        assert values.tolist() == expected.index.tolist() and counts.tolist() == expected.tolist()
+
+    def test_bins_and_rayleigh_match_in_memory(self, df):
+        scan = scan_records(columns_of(df), 2000)
+        for var in VARIABLES:
+            values = df[var].values
+            np.testing.assert_array_equal(scan.bin_counts(var), case_3a.bin_observations(values)[0])
+            np.testing.assert_array_equal(scan.bin_counts(var, binning='range'), case_1.bin_observations(df[var])[0])
+            min_val, max_val = values.min(), values.max()
+            theta = 2 * np.pi * (values - min_val) / (max_val - min_val)
+            assert scan.rayleigh_sums(var) == (np.sum(np.cos(theta)), np.sum(np.sin(theta)), len(values))
+
+    def test_memory_limits(self):
+        assert parse_memory_limit('512M') == 512 << 20
+        assert parse_memory_limit('1.5GB') == 3 << 29
+        assert parse_memory_limit('100000') == 100000
+        with pytest.raises(ValueError):
+            parse_memory_limit('lots')
+        assert block_rows_for(1 << 30) > block_rows_for(1 << 20)
+        assert block_rows_for(1) == MIN_BLOCK_ROWS
+
+
+class TestChunkedCases:
+
+    @pytest.mark.parametrize('memory_limit', [1 << 16, 1 << 30])
+    def test_case_0(self, df, memory_limit):
+        assert case_0.run(df=df, memory_limit=memory_limit) == case_0.run(df=df)
+
+    def test_case_1(self, df):
+        assert case_1.run(df=df, memory_limit=1 << 16) == case_1.run(df=df)
+
+    def test_case_3a(self, df):
+        chunked = case_3a.run(df=df, n_synthetic=20, memory_limit=1 << 16)
+        assert json.dumps(chunked) == json.dumps(case_3a.run(df=df, n_synthetic=20))
+
+    def test_pipeline_memory_limit(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("records loaded whole")
+        in_memory = run_pipeline.run_pipeline(['0', '1'])
+        monkeypatch.setattr(run_pipeline, 'load_records', fail)
+        chunked = run_pipeline.run_pipeline(['0', '1'], memory_limit=1 << 20)
+        assert chunked == in_memory
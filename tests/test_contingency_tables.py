@@ -0,0 +1,94 @@
+"""
+Contingency Tables: Test Suite - Blind Study (Approach Two)
+Validates the Patefield fixed-margin table sampler: preserved margins, the
+exact table distribution of a shuffled record set, the sparse-row path,
+tables that do not depend on how many are drawn, and the energy-weighted
+column sums used by Cases 4A and 4B.
+"""
+
+import itertools
+from collections import Counter
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from contingency_tables import level_table, patefield_tables, weighted_column_sums
+
+
+class TestLevelTable:
+
+    def test_table_counts_pairs(self):
+        weights = np.array([2.0, 5.0, 2.0, 2.0, 5.0])
+        cols = np.array([0, 1, 1, 2, 1])
+        levels, table = level_table(weights, cols, 3)
+        np.testing.assert_array_equal(levels, [2.0, 5.0])
+        np.testing.assert_array_equal(table, [[1, 1, 1], [0, 2, 0]])
+
+    def test_weighted_column_sums_match_bincount(self):
+        rng = np.random.default_rng(3)
+        weights = rng.choice([1.0, 10.0, 100.0], size=200)
+        cols = rng.integers(0, 16, size=200)
+        levels, table = level_table(weights, cols, 16)
+        np.testing.assert_allclose(weighted_column_sums(table[None], levels)[0],
+                                   np.bincount(cols, weights=weights, minlength=16))
+
+
+class TestPatefieldTables:
+
+    def test_margins_preserved(self):
+        rng = np.random.default_rng(11)
+        row_totals, col_totals = [40, 3, 0, 120, 1], [30, 0, 50, 44, 40]
+        tables = patefield_tables(row_totals, col_totals, 500, rng)
+        assert tables.shape == (500, 5, 5)
+        assert tables.min() >= 0
+        np.testing.assert_array_equal(tables.sum(axis=2), np.tile(row_totals, (500, 1)))
+        np.testing.assert_array_equal(tables.sum(axis=1), np.tile(col_totals, (500, 1)))
+
+    def test_two_by_two_is_hypergeometric(self):
+        rng = np.random.default_rng(2)
+        tables = patefield_tables([6, 9], [7, 8], 20000, rng)
+        observed = np.bincount(tables[:, 0, 0], minlength=7)
+        expected = stats.hypergeom(15, 7, 6).pmf(np.arange(7)) * 20000
+        chi2 = stats.chisquare(observed, expected)
+        assert chi2.pvalue > 0.001
+
+    def test_matches_enumerated_permutations(self):
+        # Every ordering of the records against fixed column labels is equally likely,
+        # so the table frequencies must match full enumeration. Row 0 (2 records over
+        # 3 columns) takes the sparse record-by-record path.
+        row_labels = [0, 0, 1, 1, 1, 2]
+        col_labels = (0, 1, 1, 2, 2, 2)
+        enumerated = Counter()
+        for perm in itertools.permutations(row_labels):
+            table = np.zeros((3, 3), dtype=int)
+            for r, c in zip(perm, col_labels):
+                table[r, c] += 1
+            enumerated[table.tobytes()] += 1
+        n_tables = 30000
+        tables = patefield_tables([2, 3, 1], [1, 2, 3], n_tables, np.random.default_rng(4))
+        sampled = Counter(t.tobytes() for t in tables)
+        assert set(sampled) <= set(enumerated)
+        keys = list(enumerated)
+        total = sum(enumerated.values())
+        observed = [sampled[k] for k in keys]
+        expected = [enumerated[k] / total * n_tables for k in keys]
+        assert stats.chisquare(observed, expected).pvalue > 0.001
+
+    def test_cell_means(self):
+        rng = np.random.default_rng(8)
+        row_totals, col_totals = np.array([5, 80, 15]), np.array([25, 25, 50])
+        tables = patefield_tables(row_totals, col_totals, 4000, rng)
+        expected = np.outer(row_totals, col_totals) / 100
+        np.testing.assert_allclose(tables.mean(axis=0), expected, atol=0.25)
+
+    def test_prefix_independent_of_count(self):
+        row_totals, col_totals = [40, 3, 0, 120, 1], [30, 0, 50, 44, 40]
+        short = patefield_tables(row_totals, col_totals, 37, np.random.default_rng(5))
+        long = patefield_tables(row_totals, col_totals, 160, np.random.default_rng(5))
+        np.testing.assert_array_equal(long[:37], short)
+        assert patefield_tables(row_totals, col_totals, 0, np.random.default_rng(5)).shape == (0, 5, 5)
+
+    def test_margin_mismatch_rejected(self):
+        with pytest.raises(ValueError, match="Margins disagree"):
+            patefield_tables([3, 4], [2, 2], 10, np.random.default_rng(0))
@@ -0,0 +1,202 @@
+"""
+Count Cube: Test Suite - Blind Study (Approach Two)
+Validates the sufficient-statistics cube against the raw records: bin counts,
+moments, quantiles and Rayleigh sums, block-wise construction, the on-disk
+cache, and that every case run on the cube matches its raw-record run.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+import case_0_population_analysis as case_0
+import case_1_blind_analysis as case_1
+import case_3a_blind_analysis as case_3a
+import case_3b_blind_analysis as case_3b
+import case_4a_blind_analysis as case_4a
+import case_4b_blind_analysis as case_4b
+import count_cube
+from count_cube import CountCube, build_cube, load_cube, quantile
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+VARIABLES = ['x_val', 'y_val', 'z_val']
+
+
+@pytest.fixture(scope='module')
+def df():
+    return pd.read_csv(os.path.join(DATA_DIR, 'record_vals.csv'))
+
+
+@pytest.fixture(scope='module')
+def cube(df):
+    return CountCube(build_cube({col: df[col].values for col in df.columns}))
+
+
+@pytest.fixture(scope='module')
+def small_df():
+    rng = np.random.default_rng(5)
+    n = 800
+    return pd.DataFrame({
+        'a_val': rng.integers(1950, 1960, n),
+        'v_val': np.round(rng.uniform(4.0, 7.0, n), 1),
+        'x_val': rng.integers(0, 10 ** 6, n),
+        'y_val': rng.integers(0, 10 ** 5, n),
+        'z_val': rng.integers(0, 10 ** 4, n),
+    })
+
+
+class TestCubeContents:
+
+    def test_bin_counts_match_records(self, df, cube):
+        for var in VARIABLES:
+            values = df[var].values
+            bin_indices = np.minimum(np.floor(values / (values.max() / 16)).astype(int), 15)
+            np.testing.assert_array_equal(cube.bin_counts(var), np.bincount(bin_indices, minlength=16))
+            range_counts, _ = case_1.bin_observations(df[var])
+            np.testing.assert_array_equal(cube.bin_counts(var, binning='range'), range_counts)
+
+    def test_v_select_matches_record_subset(self, df, cube):
+        v_select = cube.v_values > 6.3
+        sub = df[df['v_val'] > 6.3]
+        assert cube.v_counts(v_select).sum() == len(sub)
+        for var in VARIABLES:
+            counts, _, _ = case_3b.bin_observations(sub[var].values, df[var].max())
+            np.testing.assert_array_equal(cube.bin_counts(var, v_select), counts)
+
+    def test_moments_and_median(self, df, cube):
+        for var in VARIABLES:
+            n, mean, m2 = cube.moments(var)
+            assert n == len(df)
+            assert mean == pytest.approx(df[var].mean(), rel=1e-14)
+            assert np.sqrt(m2 / (n - 1)) == pytest.approx(df[var].std(), rel=1e-12)
+            assert cube.median(var) == df[var].median()
+            assert cube.extrema(var) == (df[var].min(), df[var].max())
+
+    def test_weighted_sums(self, df, cube):
+        v_energy = case_4a.calculate_energy(cube.v_values)
+        energy = case_4a.calculate_energy(df['v_val'].values)
+        for var in VARIABLES:
+            expected, _, _, _ = case_4a.bin_energy(df[var].values, energy)
+            np.testing.assert_allclose(cube.weighted_bin_sums(var, v_energy), expected, rtol=1e-13)
+            values = df[var].values
+            theta = 2 * np.pi * (values - values.min()) / (values.max() - values.min())
+            C, S, W = cube.rayleigh_sums(var, v_weights=v_energy)
+            np.testing.assert_allclose([C, S, W], [np.sum(energy * np.cos(theta)),
+                                                   np.sum(energy * np.sin(theta)), energy.sum()], rtol=1e-12)
+
+    def test_expand_preserves_bin_v_pairs(self, df, cube):
+        for var in VARIABLES:
+            bin_indices, v_codes = cube.expand(var)
+            assert len(bin_indices) == len(df)
+            raw_codes = np.searchsorted(cube.v_values, df['v_val'].values)
+            raw_bins = case_4a.equal_width_bin_indices(df[var].values, df[var].max(), 16)
+            n_pairs = len(cube.v_values) * 16
+            np.testing.assert_array_equal(np.bincount(v_codes * 16 + bin_indices, minlength=n_pairs),
+                                          np.bincount(raw_codes * 16 + raw_bins, minlength=n_pairs))
+        # The record order is the same for every variable, so one energy array serves all three
+        np.testing.assert_array_equal(cube.expand('x_val')[1], cube.expand('z_val')[1])
+
+    def test_blocks_merge_to_single_pass(self, df, cube):
+        columns = {col: df[col].values for col in df.columns}
+        blocked = build_cube(columns, block_rows=777)
+        for name, array in cube.arrays.items():
+            if array.dtype.kind in 'iu':
+                np.testing.assert_array_equal(blocked[name], array)
+            else:
+                np.testing.assert_allclose(blocked[name], array, rtol=1e-9, atol=1e-6)
+
+    def test_missing_v_val_rejected(self):
+        with pytest.raises(ValueError, match="v_val"):
+            build_cube({'a_val': np.array([1, 2]), 'v_val': np.array([5.0, np.nan]),
+                        'x_val': np.array([1, 2]), 'y_val': np.array([1, 2]), 'z_val': np.array([1, 2])})
+
+
+class TestQuantile:
+
+    @pytest.mark.parametrize('q', [0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0])
+    def test_matches_pandas(self, small_df, q):
+        values, counts = np.unique(small_df['v_val'].values, return_counts=True)
+        assert quantile(values, counts, q) == small_df['v_val'].quantile(q)
+
+    def test_median_matches_numpy(self):
+        for n in (5, 6):
+            data = np.array([1.0, 2.0, 2.0, 3.5, 7.0, 7.0][:n])
+            values, counts = np.unique(data, return_counts=True)
+            assert count_cube.median(values, counts) == np.median(data)
+
+
+class TestCubeCache:
+
+    def test_built_once_and_rebuilt_on_change(self, tmp_path, monkeypatch):
+        path = tmp_path / 'record_vals.csv'
+        path.write_text("a_val,v_val,x_val,y_val,z_val\n1950,6.3,100,200,30\n1951,5.1,12,99,7\n")
+        cache_dir = str(tmp_path / 'cache')
+        first = load_cube(str(path), cache_dir=cache_dir)
+        assert first.n_records == 2
+
+        def fail(*args, **kwargs):
+            raise AssertionError("cube rebuilt for an unchanged source")
+        monkeypatch.setattr(count_cube, 'build_cube', fail)
+        assert load_cube(str(path), cache_dir=cache_dir).n_records == 2
+        monkeypatch.undo()
+
+        with open(path, 'a') as f:
+            f.write("1952,4.0,1,2,3\n")
+        assert load_cube(str(path), cache_dir=cache_dir).n_records == 3
+
+
+class TestCasesOnCube:
+    """Each case run on the cube reproduces its raw-record results."""
+
+    def test_case_0_identical(self, df, cube):
+        assert case_0.run(cube=cube) == case_0.run(df=df)
+
+    def test_case_1_matches(self, df, cube):
+        raw, on_cube = case_1.run(df=df), case_1.run(cube=cube)
+        for var in VARIABLES:
+            assert on_cube[var]['bin_counts'] == raw[var]['bin_counts']
+            assert on_cube[var]['chi_square'] == raw[var]['chi_square']
+            assert on_cube[var]['rayleigh']['statistic'] == raw[var]['rayleigh']['statistic']
+            assert on_cube[var]['rayleigh']['p_value'] == pytest.approx(raw[var]['rayleigh']['p_value'], rel=1e-12)
+
+    def test_case_3a_and_3b_ranks_identical(self, df, cube):
+        # Uniform and multinomial nulls depend only on (n, max): same catalogs either way
+        raw, on_cube = case_3a.run(df=df, n_synthetic=50), case_3a.run(cube=cube, n_synthetic=50)
+        assert on_cube['synthetic_null_hypothesis'] == raw['synthetic_null_hypothesis']
+        for var in VARIABLES:
+            assert on_cube[var]['chi_square'] == raw[var]['chi_square']
+        assert case_3b.run(cube=cube, n_synthetic=20) == case_3b.run(df=df, n_synthetic=20)
+
+    def test_case_4a_matches(self, df, cube):
+        raw = case_4a.run(df=df, case_3a={}, null='analytic')
+        on_cube = case_4a.run(cube=cube, case_3a={}, null='analytic')
+        assert on_cube['total_energy'] == pytest.approx(raw['total_energy'], rel=1e-13)
+        for var in VARIABLES:
+            assert on_cube[var]['chi_square_energy']['statistic'] == pytest.approx(
+                raw[var]['chi_square_energy']['statistic'], rel=1e-12)
+            assert on_cube[var]['significant_bins_excess'] == raw[var]['significant_bins_excess']
+            pct = f"{var}_real_p_percentile"
+            assert on_cube['synthetic_null_hypothesis']['percentile_rank_analysis'][pct] == \
+                raw['synthetic_null_hypothesis']['percentile_rank_analysis'][pct]
+
+    def test_case_4a_permutation_null_runs_on_cube(self, cube):
+        results = case_4a.run(cube=cube, case_3a={}, n_synthetic=20)
+        assert len(results['synthetic_null_hypothesis']['x_val_synthetic_p_values']) == 20
+        results = case_4a.run(cube=cube, case_3a={}, n_synthetic=20, engine='patefield')
+        assert len(results['synthetic_null_hypothesis']['x_val_synthetic_p_values']) == 20
+        with pytest.raises(ValueError, match="count cube"):
+            case_4a.run(cube=cube, case_3a={}, n_synthetic=20, engine='loop')
+
+    def test_case_4b_matches(self, df, cube):
+        raw = case_4b.run(df=df, case_3b={}, case_4a={}, null='analytic')
+        on_cube = case_4b.run(cube=cube, case_3b={}, case_4a={}, null='analytic')
+        assert on_cube['stratum_sizes'] == raw['stratum_sizes']
+        assert on_cube['v_val_quartiles'] == raw['v_val_quartiles']
+        for s_num in ['stratum_1', 'stratum_2', 'stratum_3', 'stratum_4']:
+            assert on_cube[s_num]['v_val_range'] == raw[s_num]['v_val_range']
+            for var in VARIABLES:
+                assert on_cube[s_num][var]['chi_square'] == pytest.approx(raw[s_num][var]['chi_square'], rel=1e-12)
+                assert on_cube[s_num][var]['verdict'] == raw[s_num][var]['verdict']
+                assert on_cube[s_num][var]['synthetic_percentile'] == pytest.approx(
+                    raw[s_num][var]['synthetic_percentile'], abs=0.01)
@@ -0,0 +1,93 @@
+"""
+Data Store: Test Suite - Blind Study (Approach Two)
+Validates the columnar CSV cache: typed columns, equality with pandas parsing,
+chunked parsing, and invalidation when the source file changes.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_store
+from data_store import RECORD_DTYPES, TIMESTAMP_DTYPES, TIMESTAMP_COLUMNS, load_columns
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+
+@pytest.fixture()
+def records_csv(tmp_path):
+    path = tmp_path / 'record_vals.csv'
+    path.write_text("a_val,v_val,x_val,y_val,z_val\n"
+                    "1950,6.3,429453,534153,30985\n"
+                    "1951,5.1,12,99,7\n")
+    return str(path)
+
+
+class TestRecordCache:
+
+    def test_matches_read_csv(self, tmp_path):
+        path = os.path.join(DATA_DIR, 'record_vals.csv')
+        cols = load_columns(path, RECORD_DTYPES, cache_dir=str(tmp_path / 'cache'))
+        df = pd.read_csv(path)
+        for col in df.columns:
+            np.testing.assert_array_equal(cols[col], df[col].values)
+
+    def test_column_types(self, records_csv, tmp_path):
+        cols = load_columns(records_csv, RECORD_DTYPES, cache_dir=str(tmp_path / 'cache'))
+        assert cols['a_val'].dtype == np.int16
+        assert cols['x_val'].dtype == np.int32
+        assert cols['v_val'].dtype == np.float64
+        assert isinstance(cols['x_val'], np.memmap)
+
+    def test_overflowing_column_keeps_parsed_type(self, tmp_path):
+        path = tmp_path / 'wide.csv'
+        path.write_text("a_val,x_val\n40000,1\n1,5000000000\n")
+        cols = load_columns(str(path), RECORD_DTYPES, cache_dir=str(tmp_path / 'cache'))
+        assert cols['a_val'].tolist() == [40000, 1]
+        assert cols['x_val'].tolist() == [1, 5000000000]
+
+    def test_chunked_parse_matches_whole(self, tmp_path):
+        path = os.path.join(DATA_DIR, 'record_vals.csv')
+        whole = data_store.build_cache(path, RECORD_DTYPES, cache_dir=str(tmp_path / 'whole'), chunk_rows=1 << 20)
+        chunked = data_store.build_cache(path, RECORD_DTYPES, cache_dir=str(tmp_path / 'chunked'), chunk_rows=777)
+        assert chunked['columns'] == whole['columns'] and chunked['rows'] == whole['rows']
+        cols = load_columns(path, RECORD_DTYPES, cache_dir=str(tmp_path / 'chunked'))
+        for col, values in pd.read_csv(path).items():
+            np.testing.assert_array_equal(cols[col], values.values)
+
+    def test_narrowing_decided_over_all_chunks(self, tmp_path):
+        # Only the last chunk overflows int16 or holds a missing value
+        path = tmp_path / 'chunks.csv'
+        path.write_text("a_val,x_val\n1,1\n2,2\n40000,\n")
+        data_store.build_cache(str(path), RECORD_DTYPES, cache_dir=str(tmp_path / 'cache'), chunk_rows=2)
+        cols = load_columns(str(path), RECORD_DTYPES, cache_dir=str(tmp_path / 'cache'))
+        assert cols['a_val'].dtype == np.int64 and cols['a_val'].tolist() == [1, 2, 40000]
+        assert cols['x_val'].dtype == np.float64 and np.isnan(cols['x_val'][2])
+
+    def test_invalidated_when_source_changes(self, records_csv, tmp_path):
+        cache_dir = str(tmp_path / 'cache')
+        first = load_columns(records_csv, RECORD_DTYPES, cache_dir=cache_dir)
+        assert first['x_val'].tolist() == [429453, 12]
+        with open(records_csv, 'a') as f:
+            f.write("1952,4.0,1,2,3\n")
+        second = load_columns(records_csv, RECORD_DTYPES, cache_dir=cache_dir)
+        assert second['x_val'].tolist() == [429453, 12, 1]
+        assert len([d for d in os.listdir(cache_dir) if os.path.isdir(os.path.join(cache_dir, d))]) == 1
+
+    def test_cache_reused_when_unchanged(self, records_csv, tmp_path, monkeypatch):
+        cache_dir = str(tmp_path / 'cache')
+        load_columns(records_csv, RECORD_DTYPES, cache_dir=cache_dir)
+        monkeypatch.setattr(data_store, 'build_cache', lambda *a, **k: pytest.fail("cache rebuilt"))
+        load_columns(records_csv, RECORD_DTYPES, cache_dir=cache_dir)
+
+
+class TestTimestampCache:
+
+    def test_epoch_seconds_match_to_datetime(self, tmp_path):
+        path = os.path.join(DATA_DIR, 'timestamp_vals.csv')
+        cols = load_columns(path, TIMESTAMP_DTYPES, TIMESTAMP_COLUMNS, cache_dir=str(tmp_path / 'cache'))
+        assert cols['timestamp'].dtype == np.int64
+        parsed = pd.to_datetime(pd.read_csv(path)['timestamp'], utc=True)
+        np.testing.assert_array_equal(
+            pd.to_datetime(np.asarray(cols['timestamp']), unit='s', utc=True), parsed)
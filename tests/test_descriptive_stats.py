@@ -0,0 +1,110 @@
+"""
+Descriptive Stats: Test Suite - Blind Study (Approach Two)
+Validates the fused descriptive statistics kernel against pandas, column by
+column (missing values, odd and even counts, integer and float columns), and
+the mergeable streaming state against the fused values.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import case_0_population_analysis as case_0
+import descriptive_stats
+from descriptive_stats import ColumnStatsState, column_block, describe, describe_block
+from quantile_sketch import KLLSketch
+
+COLUMNS = ['a_val', 'v_val', 'x_val', 'y_val', 'z_val']
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.default_rng(22)
+    n = 40_001
+    v_val = np.round(rng.normal(6.3, 0.4, size=n), 2)
+    v_val[rng.random(n) < 0.02] = np.nan
+    return pd.DataFrame({
+        'a_val': rng.integers(1950, 2022, size=n).astype(np.int16),
+        'v_val': v_val,
+        'x_val': rng.integers(1000, 30_000_000, size=n).astype(np.int32),
+        'y_val': rng.integers(0, 9, size=n).astype(np.int32),
+        'z_val': rng.integers(1, 90_000, size=n).astype(np.int32),
+    })
+
+
+def pandas_stats(df, col):
+    series = df[col]
+    return {'count': int(series.count()), 'missing': int(series.isna().sum()), 'min': float(series.min()),
+            'max': float(series.max()), 'mean': float(series.mean()), 'std': float(series.std()),
+            'median': float(series.median())}
+
+
+class TestFusedStats:
+
+    @pytest.mark.parametrize('n_rows', [40_001, 40_000, 1])
+    def test_matches_pandas_exactly(self, df, n_rows):
+        part = df.iloc[:n_rows]
+        stats = describe(part, COLUMNS)
+        for col in COLUMNS:
+            assert stats[col] == pytest.approx(pandas_stats(part, col), rel=0, abs=0, nan_ok=True)
+
+    def test_all_missing_row(self):
+        stats = describe_block(np.array([[np.nan, np.nan], [1.0, 3.0]]))
+        assert stats['count'].tolist() == [0, 2]
+        assert np.isnan(stats['median'][0]) and stats['median'][1] == 2.0
+
+    def test_case_0_column_stats(self, df):
+        for entry in case_0.compute_column_stats(df, COLUMNS):
+            expected = pandas_stats(df, entry['column_name'])
+            assert entry['median'] == expected['median']
+            assert entry['mean'] == round(expected['mean'], 4)
+            assert entry['std_dev'] == round(expected['std'], 4)
+            assert entry['missing_count'] == expected['missing']
+
+
+class TestStreamingStats:
+
+    def test_blocks_merge_to_fused(self, df):
+        state = ColumnStatsState(COLUMNS)
+        for start in range(0, len(df), 6_000):
+            state.update(df.iloc[start:start + 6_000])
+        fused = describe_block(column_block(df, COLUMNS))
+        streamed = state.result()
+        for stat in ('count', 'missing', 'min', 'max'):
+            np.testing.assert_array_equal(streamed[stat], fused[stat])
+        np.testing.assert_allclose(streamed['mean'], fused['mean'], rtol=1e-12)
+        np.testing.assert_allclose(streamed['std'], fused['std'], rtol=1e-10)
+        # Sketched medians: within the rank error of the true median
+        for i, col in enumerate(COLUMNS):
+            values = np.sort(df[col].dropna().values)
+            low = np.searchsorted(values, streamed['median'][i], side='left') / len(values)
+            high = np.searchsorted(values, streamed['median'][i], side='right') / len(values)
+            error = streamed['median_rank_error'][i] + 1 / len(values)
+            assert low - error <= 0.5 <= high + error
+
+    def test_worker_states_merge(self, df):
+        halves = [ColumnStatsState(COLUMNS, stream=0).update(df.iloc[:15_000]),
+                  ColumnStatsState(COLUMNS, stream=1).update(df.iloc[15_000:])]
+        merged = halves[0].merge(halves[1]).result()
+        single = ColumnStatsState(COLUMNS).update(df).result()
+        np.testing.assert_allclose(merged['mean'], single['mean'], rtol=1e-12)
+        np.testing.assert_allclose(merged['std'], single['std'], rtol=1e-10)
+        with pytest.raises(ValueError):
+            ColumnStatsState(['x_val']).merge(ColumnStatsState(['y_val']))
+
+    def test_sketch_offsets_keyed_per_block(self, df, monkeypatch):
+        # The rank error bound needs independent compaction offsets: no two
+        # sketches of a column, across updates or workers, may share a stream key
+        keys = []
+
+        class RecordingSketch(KLLSketch):
+            def __init__(self, k, stream=0, block=0):
+                keys.append((stream, block))
+                super().__init__(k, stream=stream, block=block)
+
+        monkeypatch.setattr(descriptive_stats, 'KLLSketch', RecordingSketch)
+        for stream in (0, 1):
+            state = ColumnStatsState(COLUMNS, stream=stream)
+            for start in range(0, 30_000, 10_000):
+                state.update(df.iloc[start:start + 10_000])
+        assert len(keys) == 2 * 4 * len(COLUMNS) and len(set(keys)) == len(keys)
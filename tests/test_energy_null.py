@@ -0,0 +1,128 @@
+"""
+Energy Null: Test Suite - Blind Study (Approach Two)
+Validates the closed-form permutation null of the energy-weighted chi-square:
+exact moments against full enumeration of small permutations, and the
+moment-matched percentiles against the Monte Carlo engine of Case 4A, on
+synthetic energies and on the real population, where its error is bounded
+around the real statistics and in the 10% to 1% decision tail.
+"""
+
+import itertools
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+import case_4a_blind_analysis as case_4a
+from energy_null import analytic_null, draw_moments, permutation_moments
+from histogram_kernels import equal_width_bin_indices, weighted_bincount
+from rng_streams import chunk_rng
+from synthetic_ranks import percentile_rank
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+N_BINS = 16
+# Bounds on analytic minus Monte Carlo percentile on the real energies: high
+# mid-distribution, where the real statistics fall, low in the decision tail
+MID_ERROR_BOUND = 15.0
+TAIL_ERROR_BOUND = 3.0
+DECISION_TAILS = (10, 5, 1)
+
+
+def chi_square_energy(energy_per_bin):
+    expected = energy_per_bin.sum() / len(energy_per_bin)
+    return np.sum((energy_per_bin - expected) ** 2 / expected)
+
+
+@pytest.fixture(scope='module')
+def energy_data():
+    rng = np.random.default_rng(5)
+    values = rng.integers(0, 50000, size=400)
+    energy = np.power(10, 1.5 * np.round(rng.uniform(2.5, 5.0, size=400), 1))
+    bin_indices = equal_width_bin_indices(values, np.max(values), N_BINS)
+    return values, bin_indices, energy
+
+
+@pytest.fixture(scope='module')
+def real_null():
+    df = pd.read_csv(os.path.join(DATA_DIR, 'record_vals.csv'))
+    energy = case_4a.calculate_energy(df['v_val'].values)
+    bins = case_4a.variable_bins(df)
+    return bins, energy, case_4a.run_synthetic_catalogs(bins, energy, 5000)
+
+
+class TestExactMoments:
+
+    def test_draw_moments_match_enumeration(self):
+        y = np.array([3.0, -1.0, 0.5, -4.0, 1.5])
+        m = draw_moments(y)
+        perms = np.array(list(itertools.permutations(y, 4)))
+        assert m[(1, 1)] == pytest.approx(np.mean(perms[:, 0] * perms[:, 1]))
+        assert m[(2, 1, 1)] == pytest.approx(np.mean(perms[:, 0] ** 2 * perms[:, 1] * perms[:, 2]))
+        assert m[(1, 1, 1, 1)] == pytest.approx(np.mean(np.prod(perms, axis=1)))
+
+    def test_moments_match_all_permutations(self):
+        # 7 records in 3 bins: every one of the 5040 permutations enumerated
+        bin_indices = np.array([0, 0, 0, 1, 1, 2, 2])
+        energy = np.array([1.0, 3.0, 10.0, 30.0, 2.0, 100.0, 5.0])
+        statistics = np.array([chi_square_energy(np.bincount(bin_indices, weights=energy[list(p)], minlength=3))
+                               for p in itertools.permutations(range(7))])
+        mean, variance = permutation_moments(np.bincount(bin_indices, minlength=3), energy)
+        assert mean == pytest.approx(statistics.mean(), rel=1e-10)
+        assert variance == pytest.approx(statistics.var(), rel=1e-10)
+
+    def test_equal_energies_degenerate(self):
+        # Every permutation gives chi2 = sum((2 n_j - 8)^2) / 8 = 5
+        bin_counts = np.array([5, 3, 2, 6])
+        assert permutation_moments(bin_counts, np.full(16, 2.0)) == (pytest.approx(5.0), 0.0)
+        assert analytic_null(5.0, bin_counts, np.full(16, 2.0))['percentile'] == 100.0
+        assert analytic_null(6.0, bin_counts, np.full(16, 2.0))['percentile'] == 0.0
+
+
+class TestAgainstMonteCarlo:
+
+    def test_moments_match_permute_engine(self, energy_data):
+        values, bin_indices, energy = energy_data
+        statistics = case_4a.synthetic_chunk_statistics(values, bin_indices, energy, 20000,
+                                                        chunk_rng('test', 0, 'x_val', 0))
+        mean, variance = permutation_moments(np.bincount(bin_indices, minlength=N_BINS), energy)
+        assert mean == pytest.approx(statistics.mean(), rel=4 * statistics.std() / np.sqrt(20000) / mean)
+        assert variance == pytest.approx(statistics.var(), rel=0.1)
+
+    def test_percentile_close_to_monte_carlo(self, energy_data):
+        values, bin_indices, energy = energy_data
+        statistics = case_4a.synthetic_chunk_statistics(values, bin_indices, energy, 5000,
+                                                        chunk_rng('test', 0, 'x_val', 1))
+        bin_counts = np.bincount(bin_indices, minlength=N_BINS)
+        for q in (0.5, 0.9, 0.95):
+            real_stat = np.quantile(statistics, q)
+            mc_pct = np.mean(statistics >= real_stat) * 100
+            assert analytic_null(real_stat, bin_counts, energy)['percentile'] == pytest.approx(mc_pct, abs=5.0)
+
+    def test_real_statistic_of_data(self, energy_data):
+        values, bin_indices, energy = energy_data
+        real_stat = chi_square_energy(weighted_bincount(bin_indices, energy, N_BINS))
+        result = analytic_null(real_stat, np.bincount(bin_indices, minlength=N_BINS), energy)
+        assert 0 <= result['percentile'] <= 100
+        assert result['log10_percentile'] == pytest.approx(np.log10(result['percentile']))
+
+
+class TestRealPopulation:
+
+    def test_error_bounded_at_real_statistics(self, real_null):
+        bins, energy, synthetic = real_null
+        for var, (_, bin_indices) in bins.items():
+            real_stat = chi_square_energy(weighted_bincount(bin_indices, energy, N_BINS, summation='kahan'))
+            mc_pct = percentile_rank(real_stat, synthetic[var])
+            analytic_pct = analytic_null(real_stat, np.bincount(bin_indices, minlength=N_BINS), energy)['percentile']
+            assert 0 < analytic_pct - mc_pct < MID_ERROR_BOUND, var
+
+    def test_error_bounded_in_decision_tail(self, real_null):
+        # Anti-conservative here: the analytic rank is the lower one
+        bins, energy, synthetic = real_null
+        for var, (_, bin_indices) in bins.items():
+            bin_counts = np.bincount(bin_indices, minlength=N_BINS)
+            for tail in DECISION_TAILS:
+                stat = np.quantile(synthetic[var], 1 - tail / 100)
+                mc_pct = percentile_rank(stat, synthetic[var])
+                analytic_pct = analytic_null(stat, bin_counts, energy)['percentile']
+                assert -TAIL_ERROR_BOUND < analytic_pct - mc_pct < 0, (var, tail)
@@ -0,0 +1,88 @@
+"""
+Exact Null: Test Suite - Blind Study (Approach Two)
+Validates the exact multinomial null of the equiprobable chi-square statistic:
+the distribution against full enumeration of small multinomials, its moments
+and tail bound, agreement with the synthetic catalogs of Case 3B, the
+on-disk cache, and the size limit.
+"""
+
+from collections import defaultdict
+from math import factorial
+
+import numpy as np
+import pytest
+from scipy import stats
+
+import case_3b_blind_analysis as case_3b
+import exact_null
+from exact_null import ExactNull, compute_exact_null, exact_feasible
+
+
+def enumerated_null(n, k):
+    """{sum of squared counts: probability} over every composition of n into k bins."""
+    pmf = defaultdict(float)
+
+    def place(counts, left):
+        if len(counts) == k - 1:
+            counts = counts + [left]
+            weight = factorial(n) / np.prod([factorial(c) for c in counts]) / k ** n
+            pmf[sum(c * c for c in counts)] += weight
+            return
+        for c in range(left + 1):
+            place(counts + [c], left - c)
+
+    place([], n)
+    return pmf
+
+
+class TestExactDistribution:
+
+    @pytest.mark.parametrize('n, k', [(12, 4), (9, 5), (20, 3)])
+    def test_matches_enumeration(self, n, k):
+        null = ExactNull(compute_exact_null(n, k))
+        expected = enumerated_null(n, k)
+        sum_squares = np.rint((null.statistics + n) * n / k).astype(int)
+        np.testing.assert_allclose(null.pmf, [expected.get(t, 0.0) for t in sum_squares], atol=1e-14)
+        for t, p in expected.items():
+            assert null.sf(k * t / n - n) == pytest.approx(
+                sum(q for s, q in expected.items() if s >= t), abs=1e-13)
+
+    def test_moments_and_tail(self):
+        null = ExactNull(compute_exact_null(400, 16))
+        assert null.mean() == pytest.approx(15, abs=1e-5)
+        assert null.tail_mass < 1e-6
+        assert np.all(np.diff(null.statistics) > 0)
+        assert null.sf(0.0) == pytest.approx(1.0)
+        # Beyond the cap only the bound remains
+        assert null.sf(1e6) == null.tail_mass
+
+    def test_close_to_asymptotic_chi_square(self):
+        null = ExactNull(compute_exact_null(2000, 16))
+        for stat in (10.0, 25.0, 40.0):
+            assert null.sf(stat) == pytest.approx(stats.chi2.sf(stat, 15), rel=0.05)
+
+    def test_matches_synthetic_catalogs(self):
+        null = ExactNull(compute_exact_null(300, 16))
+        synthetic = case_3b.run_synthetic_unit(300, 1000.0, 4000, 1, 'x_val')
+        for stat in np.percentile(synthetic, [10, 50, 90, 99]):
+            mc = np.mean(synthetic >= stat * (1 - 1e-9))
+            assert null.sf(stat) == pytest.approx(mc, abs=4 * np.sqrt(mc * (1 - mc) / 4000) + 1e-3)
+
+
+class TestExactNullCache:
+
+    def test_computed_once(self, tmp_path, monkeypatch):
+        first = exact_null.exact_null(150, 16, cache_dir=str(tmp_path))
+
+        def fail(*args, **kwargs):
+            raise AssertionError("exact null recomputed for a cached (n, k)")
+        monkeypatch.setattr(exact_null, 'compute_exact_null', fail)
+        cached = exact_null.exact_null(150, 16, cache_dir=str(tmp_path))
+        np.testing.assert_array_equal(cached.pmf, first.pmf)
+        assert cached.percentile(20.0) == first.percentile(20.0)
+
+    def test_size_limit(self, monkeypatch):
+        monkeypatch.setattr(exact_null, 'MAX_EXACT_STATES', 1000)
+        assert not exact_feasible(2500, 16)
+        with pytest.raises(ValueError, match="synthetic catalogs"):
+            compute_exact_null(2500, 16)
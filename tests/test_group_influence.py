@@ -0,0 +1,75 @@
+"""
+Group Influence: Test Suite - Blind Study (Approach Two)
+Validates the leave-one-group-out statistics against rebinning the records
+with each group dropped (counts as in Case 3A, energy as in Case 4A), the
+exclusive sums where one group dominates, and the JSON form.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import case_3a_blind_analysis as case_3a
+import case_4a_blind_analysis as case_4a
+from group_influence import exclusive_sums, group_influence, leave_one_out
+from group_stats import group_statistics
+from histogram_kernels import equal_width_bin_indices, weighted_bincount
+
+VARIABLES = ['x_val', 'y_val', 'z_val']
+RECORDS = {'seed': 24, 'n': 8_000, 'a_range': (1990, 2022)}
+
+
+@pytest.fixture(scope='module')
+def table(records):
+    return group_statistics(records, weights=case_4a.calculate_energy(records['v_val'].values))
+
+
+class TestLeaveOneOut:
+
+    def test_counts_match_dropping_each_group(self, records, table):
+        influence = leave_one_out(table['bin_counts'])
+        for j, var in enumerate(VARIABLES):
+            max_val = records[var].max()
+            full, _, _ = case_3a.chi_square_uniformity(case_3a.bin_observations(records[var].values)[0])
+            assert influence['full']['chi_square'][j] == pytest.approx(full, rel=1e-12)
+            for i, group in enumerate(table.groups):
+                kept = records[records['a_val'] != group][var].values
+                counts = np.bincount(equal_width_bin_indices(kept, max_val, 16), minlength=16)
+                chi2, p, _ = case_3a.chi_square_uniformity(counts)
+                assert influence['left_out']['count'][i, j] == len(kept)
+                assert influence['left_out']['chi_square'][i, j] == pytest.approx(chi2, rel=1e-12)
+                assert influence['left_out']['p_value'][i, j] == pytest.approx(p, rel=1e-9)
+                assert influence['left_out']['delta_cramers_v'][i, j] == pytest.approx(
+                    case_3a.cramers_v(chi2, len(kept), 16) - influence['full']['cramers_v'][j], abs=1e-15)
+
+    def test_energy_matches_dropping_each_group(self, records, table):
+        influence = leave_one_out(table['bin_counts'], table['bin_weights'])
+        energy = case_4a.calculate_energy(records['v_val'].values)
+        for j, var in enumerate(VARIABLES):
+            full = case_4a.analyze_variable_energy(records[var].values, energy, len(records))
+            assert round(float(influence['full']['cramers_v'][j]), 6) == full['cramers_v']
+            max_val = records[var].max()
+            for i, group in enumerate(table.groups):
+                kept = (records['a_val'] != group).values
+                bins = equal_width_bin_indices(records[var].values[kept], max_val, 16)
+                chi2, _, _ = case_4a.chi_square_energy(weighted_bincount(bins, energy[kept], 16, summation='kahan'))
+                assert influence['left_out']['chi_square'][i, j] == pytest.approx(chi2, rel=1e-12)
+                assert influence['left_out']['cramers_v'][i, j] == pytest.approx(
+                    case_4a.cramers_v(chi2, kept.sum(), 16), rel=1e-12)
+
+    def test_exclusive_sums_without_cancellation(self):
+        rows = np.array([[1e30, 1.0], [3.0, 2.0], [5.0, 4.0]])
+        np.testing.assert_array_equal(exclusive_sums(rows), [[8.0, 6.0], [1e30, 5.0], [1e30, 3.0]])
+        assert exclusive_sums(rows[:1]).tolist() == [[0.0, 0.0]]
+
+    def test_jackknife_se_and_json(self, records):
+        results = json.loads(json.dumps(group_influence(records)))
+        assert results['n_groups'] == 32 and sum(results['count']) == len(records)
+        for case in ('case_3a', 'case_4a'):
+            x = results[case]['x_val']
+            assert len(x['left_out']['chi_square']) == 32
+            assert x['full']['cramers_v_jackknife_se'] > 0
+            top = x['most_influential_groups'][0]
+            assert abs(top['delta_cramers_v']) == max(abs(d) for d in x['left_out']['delta_cramers_v'])
+            assert all(np.isfinite(x['left_out']['log10_p_value']))
@@ -0,0 +1,63 @@
+"""
+Group Stats: Test Suite - Blind Study (Approach Two)
+Validates the grouped pass against per-group filtering: counts, moments,
+extrema, [0, max] histograms and the chi-square, p-value and Cramér's V of
+Case 3B's stratum analysis, plus missing group values and the table's
+accessors and JSON form.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import case_3b_blind_analysis as case_3b
+from group_stats import GroupTable, group_codes, group_statistics
+
+VARIABLES = ['x_val', 'y_val', 'z_val']
+RECORDS = {'seed': 23, 'n': 20_000}
+
+
+@pytest.fixture(scope='module')
+def table(records):
+    return group_statistics(records)
+
+
+class TestGroupedPass:
+
+    def test_matches_per_group_filtering(self, records, table):
+        assert isinstance(table, GroupTable)
+        np.testing.assert_array_equal(table.groups, np.unique(records['a_val']))
+        max_vals = {var: float(records[var].max()) for var in VARIABLES}
+        for i, group in enumerate(table.groups):
+            members = records[records['a_val'] == group]
+            assert table['count'][i] == len(members)
+            for j, var in enumerate(VARIABLES):
+                values = members[var].values
+                assert table['min'][i, j] == values.min() and table['max'][i, j] == values.max()
+                assert table['mean'][i, j] == pytest.approx(values.mean(), rel=1e-13)
+                assert table['std'][i, j] == pytest.approx(values.std(ddof=1), rel=1e-12)
+                expected = case_3b.analyze_variable_in_stratum(values, max_vals[var])
+                assert table['bin_counts'][i, j].tolist() == expected['bin_counts']
+                assert round(float(table['chi_square'][i, j]), 4) == expected['chi_square']
+                assert table['p_value'][i, j] == pytest.approx(expected['p_value'], rel=1e-12)
+                assert round(float(table['cramers_v'][i, j]), 6) == expected['cramers_v']
+
+    def test_missing_groups_left_out(self):
+        groups, codes = group_codes(np.array([2.0, np.nan, 1.0, 2.0]))
+        assert groups.tolist() == [1.0, 2.0] and codes.tolist() == [1, -1, 0, 1]
+        columns = {'a_val': np.array([2.0, np.nan, 1.0, 2.0]), 'x_val': np.array([4.0, 100.0, 8.0, 6.0])}
+        table = group_statistics(columns, variables=['x_val'], max_vals={'x_val': 8.0})
+        assert table['count'].tolist() == [1, 2]
+        assert table.column('mean', 'x_val').tolist() == [8.0, 5.0]
+        assert table['bin_counts'].sum() == 3
+
+    def test_accessors_and_json(self, records, table):
+        row = table.index(1990)
+        assert table['count'][row] == (records['a_val'] == 1990).sum()
+        with pytest.raises(KeyError):
+            table.index(1900)
+        result = json.loads(json.dumps(table.to_dict()))
+        assert result['n_groups'] == len(table) and sum(result['count']) == len(records)
+        assert len(result['variables']['x_val']['bin_counts']) == len(table)
+        assert result['variables']['x_val']['cramers_v'][row] == round(float(table.column('cramers_v', 'x_val')[row]), 6)
@@ -0,0 +1,138 @@
+"""
+Histogram Kernels: Test Suite - Blind Study (Approach Two)
+Validates the shared weighted binning kernel used by the energy-weighted cases
+against the original per-bin mask loop, exact summation, and its batch form,
+and the stratified kernel that bins every variable of every stratum at once.
+"""
+
+import math
+import numpy as np
+import pytest
+
+from histogram_kernels import (bin_index_block, equal_width_bin_indices, group_members, stratified_bincount,
+                               weighted_bincount, SUMMATION_MODES)
+
+N_BINS = 16
+
+
+@pytest.fixture(scope='module')
+def energy_data():
+    rng = np.random.default_rng(3)
+    values = rng.integers(0, 100000, size=2000)
+    v_vals = np.round(rng.uniform(2.5, 6.0, size=2000), 1)
+    energy = np.power(10, 1.5 * v_vals)
+    return values, energy
+
+
+def mask_loop(bin_indices, energy, n_bins=N_BINS):
+    energy_per_bin = np.zeros(n_bins)
+    for i in range(n_bins):
+        energy_per_bin[i] = np.sum(energy[bin_indices == i])
+    return energy_per_bin
+
+
+class TestBinIndices:
+
+    def test_last_bin_includes_max(self):
+        values = np.array([0, 5, 10, 159, 160])
+        idx = equal_width_bin_indices(values, 160, N_BINS)
+        assert idx.tolist() == [0, 0, 1, 15, 15]
+
+
+class TestWeightedBincount:
+
+    @pytest.mark.parametrize('summation', SUMMATION_MODES)
+    def test_matches_mask_loop(self, energy_data, summation):
+        values, energy = energy_data
+        idx = equal_width_bin_indices(values, values.max(), N_BINS)
+        np.testing.assert_allclose(weighted_bincount(idx, energy, N_BINS, summation=summation),
+                                   mask_loop(idx, energy), rtol=1e-12)
+
+    @pytest.mark.parametrize('summation', ['pairwise', 'kahan'])
+    def test_compensated_close_to_exact(self, summation):
+        # one huge weight followed by many tiny ones in the same bin
+        weights = np.concatenate(([1e16], np.full(10000, 1.0)))
+        idx = np.zeros(len(weights), dtype=np.intp)
+        exact = math.fsum(weights)
+        result = weighted_bincount(idx, weights, 1, summation=summation)[0]
+        naive_error = abs(weighted_bincount(idx, weights, 1)[0] - exact)
+        assert abs(result - exact) < naive_error / 100
+
+    def test_kahan_recovers_absorbed_contributions(self):
+        weights = np.concatenate(([1e16], np.full(10000, 1.0)))
+        idx = np.zeros(len(weights), dtype=np.intp)
+        naive = weighted_bincount(idx, weights, 1, summation='float64')[0]
+        kahan = weighted_bincount(idx, weights, 1, summation='kahan')[0]
+        assert naive == 1e16
+        assert kahan == math.fsum(weights)
+
+    def test_empty_bins_are_zero(self):
+        idx = np.array([0, 0, 3])
+        result = weighted_bincount(idx, np.array([1.0, 2.0, 4.0]), 5, summation='kahan')
+        assert result.tolist() == [3.0, 0.0, 0.0, 4.0, 0.0]
+
+    def test_unknown_summation_rejected(self):
+        with pytest.raises(ValueError):
+            weighted_bincount(np.array([0]), np.array([1.0]), 1, summation='float32')
+
+
+class TestWeightedBincountBatch:
+
+    @pytest.mark.parametrize('summation', SUMMATION_MODES)
+    def test_rows_match_single_catalog(self, energy_data, summation):
+        values, energy = energy_data
+        rng = np.random.default_rng(5)
+        idx = equal_width_bin_indices(values, values.max(), N_BINS)
+        perms = rng.permuted(np.tile(np.arange(len(idx)), (6, 1)), axis=1)
+        batch = weighted_bincount(idx[perms], energy, N_BINS, summation=summation)
+        assert batch.shape == (6, N_BINS)
+        for row, perm in zip(batch, perms):
+            np.testing.assert_allclose(row, mask_loop(idx[perm], energy), rtol=1e-12)
+
+    def test_row_totals_preserved(self, energy_data):
+        values, energy = energy_data
+        idx = equal_width_bin_indices(values, values.max(), N_BINS)
+        batch = weighted_bincount(np.tile(idx, (3, 1)), energy, N_BINS)
+        np.testing.assert_allclose(batch.sum(axis=1), math.fsum(energy), rtol=1e-12)
+
+
+@pytest.fixture(scope='module')
+def stratified_data():
+    rng = np.random.default_rng(8)
+    columns = [rng.integers(0, 100000, size=3000), rng.uniform(0, 50, size=3000), rng.integers(0, 7, size=3000)]
+    max_vals = [float(c.max()) for c in columns]
+    energy = np.power(10, 1.5 * np.round(rng.uniform(2.5, 6.0, size=3000), 1))
+    strata = rng.integers(-1, 5, size=3000)
+    return columns, max_vals, energy, strata
+
+
+class TestStratifiedBincount:
+
+    @pytest.mark.parametrize('summation', SUMMATION_MODES)
+    def test_matches_per_stratum_binning(self, stratified_data, summation):
+        columns, max_vals, energy, strata = stratified_data
+        block = bin_index_block(columns, max_vals, N_BINS)
+        counts, sums = stratified_bincount(strata, block, 5, N_BINS, weights=energy, summation=summation)
+        assert counts.shape == sums.shape == (5, 3, N_BINS)
+        for s in range(5):
+            members = strata == s
+            for j, (values, max_val) in enumerate(zip(columns, max_vals)):
+                idx = equal_width_bin_indices(values[members], max_val, N_BINS)
+                np.testing.assert_array_equal(counts[s, j], np.bincount(idx, minlength=N_BINS))
+                separate = weighted_bincount(idx, energy[members], N_BINS, summation=summation)
+                if summation == 'pairwise':
+                    np.testing.assert_allclose(sums[s, j], separate, rtol=1e-14)
+                else:
+                    # Same records in the same order per cell: bit-identical sums
+                    np.testing.assert_array_equal(sums[s, j], separate)
+
+    def test_records_outside_strata_dropped(self, stratified_data):
+        columns, max_vals, _, strata = stratified_data
+        counts, sums = stratified_bincount(strata, bin_index_block(columns, max_vals, N_BINS), 5, N_BINS)
+        assert sums is None
+        np.testing.assert_array_equal(counts.sum(axis=(0, 2)), [np.sum(strata >= 0)] * 3)
+
+    def test_group_members(self):
+        groups = np.array([2, -1, 0, 2, 1, 0, -1, 2])
+        members = group_members(groups, 4)
+        assert [m.tolist() for m in members] == [[2, 5], [4], [0, 3, 7], []]
@@ -0,0 +1,111 @@
+"""
+Null Library: Test Suite - Blind Study (Approach Two)
+Validates the persistent null-distribution library: sorted entries and their
+binary-search ranks, incremental extension, reuse across runs, agreement with
+the synthetic engines of Cases 3A and 3B, and the cases run on the library.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+import case_3a_blind_analysis as case_3a
+import case_3b_blind_analysis as case_3b
+import null_library
+from null_library import NullLibrary
+from synthetic_ranks import exceedances
+
+VARIABLES = ['x_val', 'y_val', 'z_val']
+
+
+class TestSortedNull:
+
+    def test_entry_sorted_with_count(self, tmp_path):
+        null = NullLibrary(str(tmp_path)).null(500, 16, 250, 'fixed_max')
+        assert null.count == 250
+        assert np.all(np.diff(null.statistics) >= 0)
+
+    def test_exceedances_match_linear_count(self, tmp_path):
+        null = NullLibrary(str(tmp_path)).null(500, 16, 300, 'fixed_max')
+        shuffled = np.random.default_rng(1).permutation(null.statistics)
+        for real_stat in [0.0, 8.0, 15.0, null.statistics[150], 30.0, 1e6]:
+            assert null.exceedances(real_stat) == exceedances(shuffled, real_stat)
+
+    def test_unknown_null_type(self, tmp_path):
+        with pytest.raises(ValueError, match="Unknown null type"):
+            NullLibrary(str(tmp_path)).null(500, 16, 10, 'permutation')
+
+
+class TestLibraryStorage:
+
+    def test_extension_matches_fresh_generation(self, tmp_path):
+        library = NullLibrary(str(tmp_path / 'extended'))
+        library.null(400, 16, 200, 'own_max')
+        # 150 is not a whole number of chunks and cannot serve as a base
+        library.null(400, 16, 150, 'own_max')
+        extended = NullLibrary(str(tmp_path / 'extended')).null(400, 16, 550, 'own_max')
+        fresh = NullLibrary(str(tmp_path / 'fresh')).null(400, 16, 550, 'own_max')
+        np.testing.assert_array_equal(extended.statistics, fresh.statistics)
+        assert library.counts('own_max', 400, 16) == [150, 200, 550]
+
+    def test_reused_across_runs(self, tmp_path, monkeypatch):
+        first = NullLibrary(str(tmp_path)).null(300, 16, 100, 'fixed_max')
+
+        def fail(*args, **kwargs):
+            raise AssertionError("library entry regenerated")
+        monkeypatch.setitem(null_library.NULL_GENERATORS, 'fixed_max', fail)
+        again = NullLibrary(str(tmp_path)).null(300, 16, 100, 'fixed_max')
+        np.testing.assert_array_equal(again.statistics, first.statistics)
+
+    def test_seed_is_part_of_the_key(self, tmp_path):
+        a = NullLibrary(str(tmp_path), seed=1).null(300, 16, 100, 'fixed_max')
+        b = NullLibrary(str(tmp_path), seed=2).null(300, 16, 100, 'fixed_max')
+        assert a.path != b.path
+        assert not np.array_equal(a.statistics, b.statistics)
+
+
+class TestNullTypes:
+
+    def test_own_max_matches_case_3a_catalogs(self, tmp_path):
+        null = NullLibrary(str(tmp_path)).null(400, 16, 2000, 'own_max')
+        synthetic = case_3a.run_synthetic_catalogs({'x_val': 1000.0, 'y_val': 50.0, 'z_val': 7.0}, 400, 2000)
+        ks = stats.ks_2samp(null.statistics, synthetic['x_val'])
+        assert ks.pvalue > 0.01
+
+    def test_fixed_max_matches_case_3b_catalogs(self, tmp_path):
+        null = NullLibrary(str(tmp_path)).null(400, 16, 2000, 'fixed_max')
+        synthetic = case_3b.run_synthetic_unit(400, 1000.0, 2000, 1, 'x_val')
+        ks = stats.ks_2samp(null.statistics, synthetic)
+        assert ks.pvalue > 0.01
+
+
+class TestCasesOnLibrary:
+
+    @pytest.fixture
+    def small_df(self):
+        rng = np.random.default_rng(12)
+        return pd.DataFrame({
+            'v_val': rng.uniform(4.0, 7.0, size=800),
+            **{var: rng.integers(0, 50000, size=800) for var in VARIABLES},
+        })
+
+    def test_case_3a_variables_share_one_null(self, small_df, tmp_path):
+        results = case_3a.run(df=small_df, n_synthetic=200, library=str(tmp_path))
+        synthetic = results['synthetic_null_hypothesis']
+        assert synthetic['x_val_synthetic_p_values'] == synthetic['z_val_synthetic_p_values']
+        assert NullLibrary(str(tmp_path)).counts('own_max', 800, 16) == [200]
+        for var in VARIABLES:
+            assert 0 <= synthetic['percentile_rank_analysis'][f"{var}_real_p_percentile"] <= 100
+
+    def test_case_3b_one_entry_per_stratum_size(self, small_df, tmp_path):
+        results = case_3b.run(df=small_df, n_synthetic=100, library=str(tmp_path))
+        library = NullLibrary(str(tmp_path))
+        for s_num in ['stratum_1', 'stratum_2', 'stratum_3', 'stratum_4']:
+            n = results[s_num]['sample_size']
+            assert library.counts('fixed_max', n, 16) == [100]
+            null = library.null(n, 16, 100, 'fixed_max')
+            for var in VARIABLES:
+                real_stat = results[s_num][var]['chi_square']
+                assert results[s_num][var]['synthetic_percentile'] == pytest.approx(
+                    null.percentile(real_stat), abs=1.0)
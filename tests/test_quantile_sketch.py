@@ -0,0 +1,112 @@
+"""
+Quantile Sketch: Test Suite - Blind Study (Approach Two)
+Validates the KLL quantile sketch: exact quantiles while nothing is compacted,
+rank errors within the reported bound, merges of block sketches, bounded
+size, reproducibility, and Case 3B stratified from sketched edges in a
+blockwise scan against its exact strata.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import case_3b_blind_analysis as case_3b
+from quantile_sketch import KLLSketch, sketch_blocks
+from stratification import sketch_strata, stratify
+
+LEVELS = [0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95]
+VARIABLES = ['x_val', 'y_val', 'z_val']
+
+
+@pytest.fixture(scope='module')
+def values():
+    return np.random.default_rng(20).gamma(2.0, 3.0, size=200_000)
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.default_rng(21)
+    n = 30_000
+    return pd.DataFrame({
+        'a_val': rng.integers(1950, 2022, size=n),
+        'v_val': np.round(rng.uniform(4.0, 7.5, size=n), 3),
+        **{var: rng.integers(0, 50000, size=n) for var in VARIABLES},
+    })
+
+
+def max_rank_error(sketch, values):
+    """Largest |true rank - level| over LEVELS of the sketch's quantiles, as a fraction of n."""
+    ranks = np.searchsorted(np.sort(values), sketch.quantiles(LEVELS)) / len(values)
+    return float(np.max(np.abs(ranks - LEVELS)))
+
+
+class TestSketch:
+
+    def test_exact_before_compaction(self):
+        values = np.random.default_rng(1).normal(size=150)
+        sketch = KLLSketch(k=200).update(values)
+        assert sketch.squared_weights == 0 and sketch.rank_error() == 0
+        np.testing.assert_allclose(sketch.quantiles(LEVELS), np.quantile(values, LEVELS))
+
+    def test_rank_error_within_bound(self, values):
+        sketch = KLLSketch().update(values)
+        assert 0 < sketch.rank_error() < 0.05
+        assert max_rank_error(sketch, values) <= sketch.rank_error()
+
+    def test_block_sketches_merge(self, values):
+        merged = sketch_blocks(values, block_rows=7_000)
+        assert merged.n == len(values)
+        assert max_rank_error(merged, values) <= merged.rank_error()
+        # Merging is order-free up to the random compactions
+        halves = KLLSketch(stream=1).update(values[100_000:]).merge(KLLSketch(stream=0).update(values[:100_000]))
+        assert max_rank_error(halves, values) <= halves.rank_error()
+
+    def test_size_bounded(self, values):
+        sketch = sketch_blocks(values, block_rows=10_000)
+        assert sketch.n_retained < 3 * sketch.k + 2 * len(sketch.levels)
+        assert sum(len(items) * 2 ** h for h, items in enumerate(sketch.levels)) == pytest.approx(len(values), rel=0.01)
+
+    def test_reproducible(self, values):
+        first = sketch_blocks(values, block_rows=50_000)
+        second = sketch_blocks(values, block_rows=50_000)
+        np.testing.assert_array_equal(first.quantiles(LEVELS), second.quantiles(LEVELS))
+
+    def test_nan_skipped_and_empty(self):
+        sketch = KLLSketch().update(np.array([1.0, np.nan, 3.0]))
+        assert sketch.n == 2 and sketch.quantile(0.5) == 2.0
+        with pytest.raises(ValueError):
+            KLLSketch().quantile(0.5)
+        with pytest.raises(ValueError):
+            KLLSketch(k=100).merge(KLLSketch(k=200))
+
+
+class TestSketchedStrata:
+
+    def test_assign_matches_stratify(self, df):
+        exact = stratify(df, 'v_val:q4*a_val:e1990')
+        np.testing.assert_array_equal(exact.assign(df.iloc[:1000]), exact.codes[:1000])
+
+    def test_sketch_strata_sizes(self, df):
+        sketch = sketch_blocks(df['v_val'].values, block_rows=4_000)
+        strata = sketch_strata({'v_val': sketch}, 'v_val:q10')
+        sizes = np.bincount(strata.assign(df), minlength=strata.n_strata) / len(df)
+        # Each decile holds 10% of the records up to twice the rank error
+        assert np.all(np.abs(sizes - 0.1) <= 2 * strata.rank_error)
+
+    def test_case_3b_sketch_mode(self, df, monkeypatch):
+        monkeypatch.setattr(case_3b, 'SKETCH_BLOCK_ROWS', 5_000)
+        exact = case_3b.run(df=df, n_synthetic=10)
+        sketched = case_3b.run(df=df, n_synthetic=10, quantiles='sketch')
+        assert 'v_val_quartiles' in exact and 'stratum_boundaries' not in exact
+        assert sketched['stratum_boundaries']['rank_error'] > 0
+        np.testing.assert_allclose(sketched['stratum_edges']['v_val'], exact['v_val_quartiles'], atol=0.05)
+        assert sum(sketched['stratum_sizes'].values()) == len(df)
+        for i in range(4):
+            stratum = sketched[f"stratum_{i + 1}"]
+            assert abs(stratum['sample_size'] / len(df) - 0.25) <= 2 * sketched['stratum_boundaries']['rank_error']
+            for var in VARIABLES:
+                assert sum(stratum[var]['bin_counts']) == stratum['sample_size']
+
+    def test_sketch_mode_scans_records_only(self, df):
+        with pytest.raises(ValueError, match="count cube"):
+            case_3b.run(df=df, n_synthetic=10, quantiles='sketch', cube=object())
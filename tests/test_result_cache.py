@@ -0,0 +1,109 @@
+"""
+Result Cache: Test Suite - Blind Study (Approach Two)
+Validates the content-addressed result cache: code digests that follow local
+imports, key sensitivity to code, inputs and parameters, stored results, the
+figure manifests that decide whether a visualization re-renders, and the
+pipeline reading unchanged stages back without loading data or rerunning.
+"""
+
+import json
+import os
+
+import pytest
+
+import run_pipeline
+from result_cache import ResultCache, code_digest, json_digest, local_imports, stage_key
+
+
+def write_module(src_dir, name, source):
+    with open(os.path.join(src_dir, f"{name}.py"), 'w') as f:
+        f.write(source)
+
+
+class TestKeys:
+
+    def test_local_imports(self):
+        source = "import os\nimport numpy as np\nfrom data_store import CACHE_DIR\nfrom . import x\n"
+        assert local_imports(source) == {'os', 'numpy', 'data_store'}
+
+    def test_code_digest_follows_imports(self, tmp_path):
+        src_dir = str(tmp_path)
+        write_module(src_dir, 'stage', "import helper\nN_BINS = 16\n")
+        write_module(src_dir, 'helper', "ALPHA = 0.05\n")
+        write_module(src_dir, 'unrelated', "X = 1\n")
+        before = code_digest('stage', src_dir)
+        write_module(src_dir, 'unrelated', "X = 2\n")
+        assert code_digest('stage', src_dir) == before
+        write_module(src_dir, 'helper', "ALPHA = 0.01\n")
+        assert code_digest('stage', src_dir) != before
+
+    def test_stage_key_sensitivity(self):
+        key = stage_key('case_2_blind_analysis', {'timestamps.csv': 'a'}, {'cube': False})
+        assert key == stage_key('case_2_blind_analysis', {'timestamps.csv': 'a'}, {'cube': False})
+        assert key != stage_key('case_2_blind_analysis', {'timestamps.csv': 'b'}, {'cube': False})
+        assert key != stage_key('case_2_blind_analysis', {'timestamps.csv': 'a'}, {'cube': True})
+        assert key != stage_key('case_2b_blind_analysis', {'timestamps.csv': 'a'}, {'cube': False})
+
+    def test_json_digest_ignores_key_order(self):
+        assert json_digest({'a': 1, 'b': [1.5, 2]}) == json_digest({'b': [1.5, 2], 'a': 1})
+
+
+class TestResultCache:
+
+    def test_put_get(self, tmp_path):
+        cache = ResultCache(str(tmp_path))
+        assert cache.get('3a', 'k1') is None
+        cache.put('3a', 'k1', {'chi_square': 12.5, 'bins': [1, 2]})
+        assert cache.get('3a', 'k1') == {'chi_square': 12.5, 'bins': [1, 2]}
+        assert cache.get('3a', 'k2') is None
+
+    def test_figures_render_only_when_changed(self, tmp_path):
+        cache = ResultCache(str(tmp_path / 'cache'))
+        output_dir = tmp_path / 'figures'
+        output_dir.mkdir()
+        calls = []
+
+        def render():
+            calls.append(1)
+            (output_dir / 'plot.png').write_bytes(b'png %d' % len(calls))
+
+        assert cache.render('viz', 'k1', render, str(output_dir))
+        assert not cache.render('viz', 'k1', render, str(output_dir))
+        assert len(calls) == 1
+        # New inputs or code: new key
+        assert cache.render('viz', 'k2', render, str(output_dir))
+        # A figure edited or removed on disk is re-rendered
+        (output_dir / 'plot.png').write_bytes(b'edited')
+        assert cache.render('viz', 'k2', render, str(output_dir))
+        os.remove(output_dir / 'plot.png')
+        assert cache.render('viz', 'k2', render, str(output_dir))
+        assert len(calls) == 4
+
+
+class TestPipelineCache:
+
+    def test_unchanged_stage_read_back(self, tmp_path, monkeypatch):
+        cache = ResultCache(str(tmp_path))
+        first = run_pipeline.run_pipeline(['0'], cache=cache)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("cached stage rerun")
+        monkeypatch.setattr(run_pipeline.case_0, 'run', fail)
+        monkeypatch.setattr(run_pipeline, 'load_records', fail)
+        again = run_pipeline.run_pipeline(['0'], cache=cache)
+        assert again['0'] == json.loads(json.dumps(first['0']))
+
+    def test_key_follows_upstream_results(self):
+        key = run_pipeline.stage_cache_key('4a', {'case_3a_results': {'x': 1}})
+        assert key != run_pipeline.stage_cache_key('4a', {'case_3a_results': {'x': 2}})
+        assert key != run_pipeline.stage_cache_key('4a', {'case_3a_results': {'x': 1}}, cube=True)
+        # Timestamp stages ignore the count cube
+        assert run_pipeline.stage_cache_key('2', {}) == run_pipeline.stage_cache_key('2', {}, cube=True)
+
+    def test_figure_key_covers_inputs(self, tmp_path, monkeypatch):
+        module = pytest.importorskip('visualization_case_1_blind')
+        key = run_pipeline.figure_key(module)
+        results = tmp_path / 'results.json'
+        results.write_text('{}')
+        monkeypatch.setattr(module, 'RESULTS_PATH', str(results))
+        assert run_pipeline.figure_key(module) != key
@@ -0,0 +1,49 @@
+"""
+Pipeline Runner: Test Suite - Blind Study (Approach Two)
+Validates stage selection for the single-process pipeline runner and that
+in-memory stage results match the published results files.
+"""
+
+import json
+import os
+import pytest
+
+import run_pipeline
+
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output')
+
+
+class TestStageSelection:
+
+    def test_all_stages_in_dependency_order(self):
+        stages = run_pipeline.select_stages()
+        assert stages == ['0', '1', '2', '2b', '3a', '3b', '4a', '4b']
+        for stage in stages:
+            for dep in run_pipeline.STAGES[stage][1]:
+                assert stages.index(dep) < stages.index(stage)
+
+    def test_since_selects_downstream(self):
+        assert run_pipeline.select_stages(since='3b') == ['3b', '4a', '4b']
+        assert run_pipeline.select_stages(since='2') == ['2']
+
+    def test_only_selects_named_stages(self):
+        assert run_pipeline.select_stages(only=['4b', '0']) == ['0', '4b']
+
+
+class TestInMemoryResults:
+
+    @pytest.mark.parametrize('stage, filename', [
+        ('0', 'case_0_results.json'),
+        ('2', 'case_2_results_blind.json'),
+    ])
+    def test_matches_published_results(self, stage, filename):
+        results = run_pipeline.run_pipeline([stage])
+        with open(os.path.join(OUTPUT_DIR, filename), 'r') as f:
+            published = json.load(f)
+        assert json.loads(json.dumps(results[stage])) == published
+
+    def test_cube_matches_published_results(self):
+        results = run_pipeline.run_pipeline(['0'], cube=True)
+        with open(os.path.join(OUTPUT_DIR, 'case_0_results.json'), 'r') as f:
+            published = json.load(f)
+        assert json.loads(json.dumps(results['0'])) == published
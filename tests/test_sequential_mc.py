@@ -0,0 +1,89 @@
+"""
+Sequential Monte Carlo: Test Suite - Blind Study (Approach Two)
+Validates the adaptive stopping rules for synthetic percentile ranks and the
+Monte Carlo error reported next to each percentile.
+"""
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from sequential_mc import percentile_interval, percentile_mc_error, rank_summary, sequential_rank
+
+DOF = 15
+
+
+def null_chunks(n_chunks, chunk_size=100, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.chisquare(DOF, size=chunk_size) for _ in range(n_chunks)]
+
+
+class TestMonteCarloError:
+
+    def test_interval_contains_estimate(self):
+        lower, upper = percentile_interval(12, 400)
+        assert lower < 3.0 < upper
+
+    def test_interval_zero_count(self):
+        lower, upper = percentile_interval(0, 100, confidence=0.99)
+        assert lower == 0.0
+        assert upper == pytest.approx((1 - 0.005 ** (1 / 100)) * 100)
+
+    def test_mc_error_binomial(self):
+        assert percentile_mc_error(25, 100) == pytest.approx(100 * np.sqrt(0.25 * 0.75 / 100))
+        assert percentile_mc_error(0, 100) == 0.0
+
+    def test_summary_percentile(self):
+        summary = rank_summary(14, 1000)
+        assert summary['percentile'] == pytest.approx(1.4)
+        assert summary['count'] == 14
+        assert summary['n_catalogs'] == 1000
+
+
+class TestStoppingRules:
+
+    def test_ci_stops_when_clear_of_alpha(self):
+        # Real statistic beyond every synthetic one: percentile 0, settled after two chunks
+        result = sequential_rank(iter(null_chunks(50)), 1e6, rule='ci')
+        assert result['settled']
+        assert result['n_catalogs'] == 200
+        assert result['percentile'] == 0.0
+
+    def test_ci_runs_to_cap_when_borderline(self):
+        chunks = null_chunks(5)
+        real_stat = np.quantile(np.concatenate(chunks), 0.95)
+        result = sequential_rank(iter(chunks), real_stat, rule='ci')
+        assert not result['settled']
+        assert result['n_catalogs'] == 500
+
+    def test_besag_clifford_stops_at_h_hits(self):
+        chunks = null_chunks(20)
+        real_stat = stats.chi2.isf(0.5, DOF)
+        result = sequential_rank(iter(chunks), real_stat, rule='besag-clifford', h=10)
+        hits = np.cumsum(np.concatenate(chunks) >= real_stat)
+        expected_l = int(np.argmax(hits >= 10)) + 1
+        assert result['settled']
+        assert result['count'] == 10
+        assert result['n_catalogs'] == expected_l
+        assert result['percentile'] == pytest.approx(10 / expected_l * 100)
+
+    def test_lazy_generation(self):
+        drawn = []
+
+        def chunks():
+            for chunk in null_chunks(50):
+                drawn.append(chunk)
+                yield chunk
+
+        sequential_rank(chunks(), 1e6, rule='ci')
+        assert len(drawn) == 2
+
+    def test_statistics_are_prefix(self):
+        chunks = null_chunks(10)
+        result = sequential_rank(iter(chunks), DOF, rule='besag-clifford')
+        full = np.concatenate(chunks)
+        np.testing.assert_array_equal(result['statistics'], full[:result['n_catalogs']])
+
+    def test_unknown_rule(self):
+        with pytest.raises(ValueError):
+            sequential_rank(iter(null_chunks(1)), DOF, rule='fixed')
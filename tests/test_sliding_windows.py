@@ -0,0 +1,92 @@
+"""
+Sliding Windows: Test Suite - Blind Study (Approach Two)
+Validates the prefix-sum windows against rescanning each window's records
+with Case 3A's chi-square, Cramér's V and Rayleigh statistics (full
+population bins and angle scale), window placement across gaps in a_val,
+and width sweeps against single-width calls.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import case_3a_blind_analysis as case_3a
+from group_stats import group_statistics
+from histogram_kernels import equal_width_bin_indices
+from sliding_windows import sliding_windows, window_bounds, window_statistics
+
+VARIABLES = ['x_val', 'y_val', 'z_val']
+RECORDS = {'seed': 25, 'n': 12_000, 'a_range': (1980, 2022)}
+
+
+@pytest.fixture(scope='module')
+def df(records):
+    # A gap in a_val: windows over it hold fewer groups
+    a_val = records['a_val'].values
+    return records.assign(a_val=np.where((a_val >= 1995) & (a_val < 1998), 2000, a_val).astype(np.int16))
+
+
+@pytest.fixture(scope='module')
+def table(df):
+    return group_statistics(df, rayleigh=True)
+
+
+class TestWindows:
+
+    def test_matches_rescanning_each_window(self, df, table):
+        stats = window_statistics(table, [4])[4]
+        for w, (first, last) in enumerate(zip(stats['first'], stats['last'])):
+            members = df[(df['a_val'] >= first) & (df['a_val'] < first + 4)]
+            assert members['a_val'].max() == last and stats['count'][w] == len(members)
+            for j, var in enumerate(VARIABLES):
+                values = members[var].values
+                counts = np.bincount(equal_width_bin_indices(values, df[var].max(), 16), minlength=16)
+                chi2, p, _ = case_3a.chi_square_uniformity(counts)
+                assert stats['chi_square'][w, j] == pytest.approx(chi2, rel=1e-12)
+                assert stats['p_value'][w, j] == pytest.approx(p, rel=1e-9)
+                assert stats['cramers_v'][w, j] == pytest.approx(case_3a.cramers_v(chi2, len(values), 16), rel=1e-12)
+                min_val, max_val = df[var].min(), df[var].max()
+                theta = 2 * np.pi * (values - min_val) / (max_val - min_val)
+                z, p_z = case_3a.rayleigh_statistic(np.sum(np.cos(theta)), np.sum(np.sin(theta)), len(values))
+                assert stats['rayleigh_z'][w, j] == pytest.approx(z, rel=1e-9, abs=1e-12)
+                assert stats['rayleigh_p'][w, j] == pytest.approx(p_z, rel=1e-9, abs=1e-12)
+
+    def test_full_range_window_is_case_3a(self, df, table):
+        width = int(df['a_val'].max() - df['a_val'].min() + 1)
+        stats = window_statistics(table, [width])[width]
+        assert len(stats['first']) == 1 and stats['count'][0] == len(df)
+        for j, var in enumerate(VARIABLES):
+            result = case_3a.analyze_variable(df[var].values)
+            assert round(float(stats['chi_square'][0, j]), 4) == result['chi_square']['statistic']
+            assert round(float(stats['cramers_v'][0, j]), 6) == result['cramers_v']
+            assert round(float(stats['rayleigh_z'][0, j]), 4) == result['rayleigh']['statistic']
+
+    def test_bounds_across_gap(self):
+        groups = np.array([1, 2, 3, 6, 7])
+        lo, hi = window_bounds(groups, 3)
+        assert lo.tolist() == [0, 1, 2] and hi.tolist() == [3, 3, 3]
+        assert len(window_bounds(groups, 8)[0]) == 0
+        with pytest.raises(ValueError):
+            window_bounds(groups, 0)
+
+    def test_sweep_matches_single_widths(self, table):
+        sweep = window_statistics(table, [1, 6, 15])
+        for width in (1, 6, 15):
+            single = window_statistics(table, [width])[width]
+            for stat, values in single.items():
+                np.testing.assert_array_equal(sweep[width][stat], values)
+        np.testing.assert_array_equal(sweep[1]['chi_square'], table['chi_square'])
+
+    def test_no_groups_rejected(self, df):
+        all_missing = df.assign(a_val=np.nan)
+        for columns in (df.iloc[:0], all_missing):
+            with pytest.raises(ValueError, match="No a_val groups"):
+                sliding_windows(columns)
+
+    def test_json(self, df):
+        results = json.loads(json.dumps(sliding_windows(df, [5, 100])))
+        assert results['widths']['100']['windows']['first'] == []
+        x = results['widths']['5']['x_val']
+        assert len(x['chi_square']) == len(results['widths']['5']['windows']['first'])
+        assert x['significant_windows'] == sum(p < 0.05 for p in x['p_value'])
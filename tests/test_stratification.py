@@ -0,0 +1,134 @@
+"""
+Stratification: Test Suite - Blind Study (Approach Two)
+Validates the stratification engine: the default quartiles against the
+original boolean conditions, quantile, edge and composite specs, merged tied
+edges, count-weighted quantiles of the count cube, and Cases 3B and 4B run on
+fine and composite strata.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import case_3b_blind_analysis as case_3b
+import case_4b_blind_analysis as case_4b
+from count_cube import CountCube, build_cube
+from stratification import DEFAULT_SPEC, parse_spec, stratify
+
+VARIABLES = ['x_val', 'y_val', 'z_val']
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.default_rng(19)
+    n = 4000
+    return pd.DataFrame({
+        'a_val': rng.integers(1950, 2022, size=n),
+        'v_val': np.round(rng.uniform(4.0, 7.5, size=n), 2),
+        **{var: rng.integers(0, 50000, size=n) for var in VARIABLES},
+    })
+
+
+def interval_codes(values, edges):
+    """Stratum index by explicit right-closed interval conditions."""
+    conditions = ([values <= edges[0]]
+                  + [(values > lo) & (values <= hi) for lo, hi in zip(edges, edges[1:])]
+                  + [values > edges[-1]])
+    return np.select(conditions, range(len(conditions)), default=-1)
+
+
+class TestSpecs:
+
+    def test_default_matches_quartile_conditions(self, df):
+        strata = stratify(df)
+        quartiles = df['v_val'].quantile([0.25, 0.50, 0.75]).values
+        np.testing.assert_array_equal(strata.edges['v_val'], quartiles)
+        np.testing.assert_array_equal(strata.codes, interval_codes(df['v_val'].values, quartiles))
+        assert strata.labels == ['group_1_0_25pct', 'group_2_25_50pct', 'group_3_50_75pct', 'group_4_75_100pct']
+        assert strata.description == "v_val quartiles (4 groups)"
+
+    @pytest.mark.parametrize('spec, levels', [
+        ('v_val:q10', [i / 10 for i in range(1, 10)]),
+        ('v_val:q0.1,0.5,0.9', [0.1, 0.5, 0.9]),
+    ])
+    def test_quantile_specs(self, df, spec, levels):
+        strata = stratify(df, spec)
+        edges = np.quantile(df['v_val'].values, levels)
+        np.testing.assert_array_equal(strata.codes, interval_codes(df['v_val'].values, edges))
+        assert strata.n_strata == len(levels) + 1
+
+    def test_fixed_edges_closed_on_the_right(self):
+        strata = stratify({'v_val': np.array([5.0, 5.5, 5.50001, 6.0, 7.0])}, 'v_val:e5.5,6.0')
+        assert strata.codes.tolist() == [0, 0, 1, 1, 2]
+        assert strata.labels == ['group_1_min_5.5', 'group_2_5.5_6', 'group_3_6_max']
+
+    def test_tied_edges_merged(self):
+        # Deciles repeat 6.0 and fall between the tied values: no empty strata remain
+        values = np.array([6.0] * 60 + [6.1] * 20 + [6.5] * 20)
+        strata = stratify({'v_val': values}, 'v_val:q10')
+        assert strata.sizes().tolist() == [60, 20, 20]
+        assert strata.labels[0] == 'group_1_0_50pct'
+
+    def test_composite_key(self, df):
+        strata = stratify(df, 'v_val:q4*a_val:e1980,2000')
+        v_codes = stratify(df, 'v_val:q4').codes
+        a_codes = interval_codes(df['a_val'].values, [1980, 2000])
+        np.testing.assert_array_equal(strata.codes, v_codes * 3 + a_codes)
+        assert strata.n_strata == 12
+        assert strata.labels[1] == 'group_2_v_val_0_25pct_a_val_1980_2000'
+        members = strata.members()
+        assert sum(len(m) for m in members) == len(df)
+        for code, m in enumerate(members):
+            assert np.all(strata.codes[m] == code)
+
+    def test_missing_values_in_no_stratum(self):
+        strata = stratify({'v_val': np.array([1.0, np.nan, 3.0, 2.0])}, 'v_val:e2.0')
+        assert strata.codes.tolist() == [0, -1, 1, 0]
+
+    def test_count_weighted_quantiles(self, df):
+        distinct, counts = np.unique(df['v_val'].values, return_counts=True)
+        weighted = stratify({'v_val': distinct}, 'v_val:q10', counts=counts)
+        np.testing.assert_allclose(weighted.edges['v_val'], stratify(df, 'v_val:q10').edges['v_val'])
+
+    @pytest.mark.parametrize('spec', ['v_val', 'v_val:x4', 'v_val:q1.5', 'v_val:e7,6', 'v_val:q4*v_val:e6'])
+    def test_invalid_specs(self, spec):
+        with pytest.raises(ValueError):
+            parse_spec(spec)
+
+
+class TestStratifiedCases:
+
+    def test_case_3b_fine_strata(self, df):
+        results = case_3b.run(df=df, n_synthetic=20, strata='v_val:q20')
+        assert results['strata_spec'] == 'v_val:q20'
+        labels = results['stratum_labels']
+        assert len(labels) == 20
+        assert sum(results['stratum_sizes'].values()) == len(df)
+        for i, label in enumerate(labels):
+            stratum = results[f"stratum_{i + 1}"]
+            assert stratum['sample_size'] == results['stratum_sizes'][label]
+            for var in VARIABLES:
+                assert sum(stratum[var]['bin_counts']) == stratum['sample_size']
+        assert len(results['comparative_summary']['x_val_verdicts']) == 20
+
+    def test_case_4b_composite_strata(self, df):
+        spec = 'v_val:q2*a_val:e1990'
+        results = case_4b.run(df=df, case_3b={'strata_spec': 'v_val:q4'}, case_4a={}, n_synthetic=20,
+                              null='analytic', strata=spec)
+        assert results['stratum_edges']['a_val'] == [1990.0]
+        assert len(results['stratum_labels']) == 4
+        energy = case_4b.calculate_energy(df['v_val'].values)
+        np.testing.assert_allclose(sum(results['stratum_total_energies'].values()), energy.sum(), rtol=1e-12)
+        # Case 3B used other strata: no per-stratum comparison
+        assert 'comparison_to_case_3b' not in results['stratum_1']['x_val']
+
+    def test_default_spec_keeps_published_layout(self, df):
+        results = case_3b.run(df=df, n_synthetic=10, strata=DEFAULT_SPEC)
+        assert 'v_val_quartiles' in results and 'strata_spec' not in results
+
+    def test_cube_strata_take_v_val_keys_only(self, df):
+        cube = CountCube(build_cube({col: df[col].values for col in df.columns}))
+        with pytest.raises(ValueError, match="v_val keys"):
+            case_3b.create_cube_strata(cube, 'v_val:q4*a_val:e1990')
+        strata = case_3b.create_cube_strata(cube, 'v_val:q10')
+        np.testing.assert_allclose(strata.edges['v_val'], stratify(df, 'v_val:q10').edges['v_val'])
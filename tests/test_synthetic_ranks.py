@@ -0,0 +1,47 @@
+"""
+Synthetic Ranks: Test Suite - Blind Study (Approach Two)
+Validates percentile ranks counted on chi-square statistics: agreement with
+ranking by p-value, tie handling, and ranks where the p-values underflow.
+"""
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from synthetic_ranks import TIE_RTOL, exceedances, log10_p_value, p_values, percentile_rank
+
+DOF = 15
+
+
+class TestStatisticRanks:
+
+    def test_matches_p_value_rank(self):
+        rng = np.random.default_rng(3)
+        statistics = rng.chisquare(DOF, size=500)
+        for real_stat in (5.0, 15.0, 25.0, 40.0):
+            real_p = stats.chi2.sf(real_stat, DOF)
+            expected = float(np.sum(p_values(statistics, DOF) <= real_p) / len(statistics) * 100)
+            assert percentile_rank(real_stat, statistics) == expected
+
+    def test_ties_count_as_extreme(self):
+        real_stat = 30.0
+        statistics = np.array([real_stat * (1 - TIE_RTOL / 2), real_stat * (1 - 2 * TIE_RTOL), 10.0, 50.0])
+        assert exceedances(statistics, real_stat) == 2
+
+    def test_underflowing_p_values_still_ranked(self):
+        statistics = np.array([2e4, 3e4, 4e4, 5e4])
+        assert np.all(p_values(statistics, DOF) == 0.0)
+        assert percentile_rank(3.5e4, statistics) == 50.0
+
+
+class TestLog10PValue:
+
+    def test_matches_sf(self):
+        assert log10_p_value(30.0, DOF) == pytest.approx(np.log10(stats.chi2.sf(30.0, DOF)))
+
+    def test_finite_beyond_underflow(self):
+        moderate = log10_p_value(1500.0, DOF)
+        assert moderate == pytest.approx(stats.chi2.logsf(1500.0, DOF) / np.log(10))
+        huge = log10_p_value(1e12, DOF)
+        assert np.isfinite(huge)
+        assert huge < log10_p_value(1e6, DOF) < moderate